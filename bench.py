@@ -0,0 +1,199 @@
+"""
+  runs benchmarks written in `.plpbench` files (in the `benchmarks` directory by default)
+
+  the syntax follows the one of `.plptest` files: an expression followed by a line `;bench` is measured,
+  other expressions are executed once before it as a setup and `;;` comments name the benchmark after them
+
+  every benchmark runs in a fresh interpreter (a new python process): its setup is evaluated, then the measured expression
+  `--warmup` times without being timed, `--iterations` times timed and once more under `tracemalloc` for the peak of allocated memory
+
+  - `python3 bench.py [files...] [--engine NAME] [--iterations N] [--warmup K]`
+  - `--output results.json` writes the results as JSON
+  - `--baseline results.json` compares medians with saved results and fails when any benchmark got slower by more than `--threshold` (0.1 = 10 %)
+"""
+
+from typing import Any, Optional
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+
+RESET = "\033[0m"
+GREEN = "\033[92m"
+RED = "\033[91m"
+YELLOW = "\033[93m"
+BLUE = "\033[94m"
+
+BENCHMARKS_DIRECTORY = "benchmarks"
+MARKER = ";bench"
+
+def parse(file_path: str) -> list[tuple[Optional[str], str]]:
+  """
+    returns expressions of a file in order as `(name, code)`, `name` is `None` for setup expressions
+  """
+  with open(file_path) as file:
+    lines = [line.strip() for line in file.readlines()]
+
+  entries: list[tuple[Optional[str], str]] = []
+  comment: Optional[str] = None
+  i = 0
+  while i < len(lines):
+    line = lines[i]
+    if line.startswith(";;"):
+      comment = line[2:].strip()
+    elif line and not line.startswith(";"):
+      if i + 1 < len(lines) and lines[i + 1].startswith(MARKER):
+        entries.append((comment or line, line))
+        comment = None
+        i += 1
+      else:
+        entries.append((None, line))
+    i += 1
+  return entries
+
+def percentile(sorted_times: list[float], share: float) -> float:
+  # nearest-rank percentile, one of the measured times
+  return sorted_times[max(0, math.ceil(share * len(sorted_times)) - 1)]
+
+def run_benchmark(file_path: str, index: int, engine: str, iterations: int, warmup: int) -> dict[str, Any]:
+  """
+    runs the benchmark at position `index` of the file's expressions in this process, the worker side of `measure`
+  """
+  import lib.reader as reader
+  import lib.rep as rep_module
+  import time
+  import tracemalloc
+  rep_module.set_default_engine(engine)
+
+  entries = parse(file_path)
+  for name, code in entries[:index]:
+    if name is None:
+      rep_module.evaluate_form(reader.read_raw_string(code))
+  form = reader.read_raw_string(entries[index][1])
+
+  for _ in range(warmup):
+    rep_module.evaluate_form(form)
+  times: list[float] = []
+  for _ in range(iterations):
+    start = time.perf_counter()
+    rep_module.evaluate_form(form)
+    times.append(time.perf_counter() - start)
+  # measured separately, tracing allocations slows the evaluation down several times
+  tracemalloc.start()
+  rep_module.evaluate_form(form)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  times.sort()
+  return {
+    "iterations": iterations,
+    "min_ms": times[0] * 1000,
+    "median_ms": (times[(len(times) - 1) // 2] + times[len(times) // 2]) / 2 * 1000,
+    "p95_ms": percentile(times, 0.95) * 1000,
+    "peak_kib": peak / 1024,
+  }
+
+def measure(file_path: str, index: int, engine: str, iterations: int, warmup: int) -> dict[str, Any]:
+  """
+    runs one benchmark in a new python process, so nothing defined or cached by the other benchmarks affects it
+  """
+  command = [
+    sys.executable, os.path.abspath(__file__), "--worker", file_path, str(index),
+    "--engine", engine, "--iterations", str(iterations), "--warmup", str(warmup),
+  ]
+  completed = subprocess.run(command, capture_output=True, text=True)
+  if completed.returncode != 0:
+    raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}")
+  # the benchmark itself may print, the results are on the last line
+  return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]], threshold: float) -> list[str]:
+  """
+    prints how the medians changed against the baseline and returns names of the benchmarks that got slower than allowed
+  """
+  regressions: list[str] = []
+  print(f"\nComparison with the baseline (threshold {threshold:.0%}):")
+  for name, result in results.items():
+    if name not in baseline:
+      print(YELLOW, f"[new]  {name}", RESET)
+      continue
+    ratio = result["median_ms"] / baseline[name]["median_ms"] if baseline[name]["median_ms"] else 1.0
+    change = f"{baseline[name]['median_ms']:.3f} ms -> {result['median_ms']:.3f} ms ({ratio - 1:+.1%})"
+    if ratio > 1 + threshold:
+      regressions.append(name)
+      print(RED, f"[slower]  {name}: {change}", RESET)
+    else:
+      print(GREEN, f"[ok]  {name}: {change}", RESET)
+  return regressions
+
+def main() -> None:
+  arguments = sys.argv[1:]
+  options: dict[str, str] = {}
+  for option in ("--engine", "--iterations", "--warmup", "--output", "--baseline", "--threshold"):
+    if option in arguments:
+      position = arguments.index(option)
+      options[option] = arguments[position + 1]
+      del arguments[position:position + 2]
+  engine = options.get("--engine", "tree")
+  iterations = int(options.get("--iterations", 10))
+  warmup = int(options.get("--warmup", 2))
+  threshold = float(options.get("--threshold", 0.1))
+  if iterations < 1 or warmup < 0:
+    print(RED, "[invalid options]: there has to be at least one iteration and the warmup can't be negative", RESET)
+    sys.exit(1)
+
+  if arguments and arguments[0] == "--worker":
+    print(json.dumps(run_benchmark(arguments[1], int(arguments[2]), engine, iterations, warmup)))
+    return
+
+  if arguments:
+    files = arguments
+  elif os.path.isdir(BENCHMARKS_DIRECTORY):
+    files = sorted(os.path.join(BENCHMARKS_DIRECTORY, file) for file in os.listdir(BENCHMARKS_DIRECTORY) if file.endswith(".plpbench"))
+  else:
+    print(RED, f"[path error]: benchmarks' directory '{BENCHMARKS_DIRECTORY}' doesn't exist", RESET)
+    sys.exit(1)
+
+  results: dict[str, dict[str, Any]] = {}
+  failed = 0
+  print(f"engine {engine}, {warmup} warmup and {iterations} timed iterations")
+  print(f"{'':<2}{'benchmark':<48} {'min ms':>10} {'median ms':>10} {'p95 ms':>10} {'peak KiB':>10}")
+  for file_path in files:
+    print(f"\n{BLUE}{file_path}{RESET}")
+    for index, (name, _) in enumerate(parse(file_path)):
+      if name is None:
+        continue
+      key = f"{os.path.basename(file_path)}: {name}"
+      try:
+        result = measure(file_path, index, engine, iterations, warmup)
+      except Exception as e:
+        failed += 1
+        print(RED, f"[failed]  {name} -> {e}", RESET)
+        continue
+      results[key] = result
+      print(f"  {name:<48} {result['min_ms']:>10.3f} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['peak_kib']:>10.1f}")
+
+  if "--output" in options:
+    with open(options["--output"], "w") as file:
+      report = {
+        "engine": engine,
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "warmup": warmup,
+        "benchmarks": results,
+      }
+      json.dump(report, file, indent=2)
+
+  regressions: list[str] = []
+  if "--baseline" in options:
+    with open(options["--baseline"]) as file:
+      regressions = compare(results, json.load(file)["benchmarks"], threshold)
+    if regressions:
+      print(RED, f"\n{len(regressions)} benchmark(s) got slower by more than {threshold:.0%}", RESET)
+  if failed or regressions:
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
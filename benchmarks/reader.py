@@ -0,0 +1,46 @@
+"""
+  benchmark of `lib/reader.py` on a generated data file (nested hashmaps, vectors, lists, numbers, strings, keywords and comments)
+
+  run it from the root of the repository with `python3 benchmarks/reader.py [number of records]`
+"""
+
+from timeit import default_timer
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lib.reader as reader
+
+def generate(records: int) -> str:
+  random.seed(42)
+  words = ["alpha", "beta", "gamma", "delta", "some text", "with \\\"quotes\\\"", "line\\nbreak"]
+  lines: list[str] = []
+  for i in range(records):
+    if i % 10 == 0:
+      lines.append(f"; record {i}")
+    values = " ".join(str(random.randint(-1000, 1000)) for _ in range(8))
+    floats = " ".join(f"{random.uniform(-1, 1):.6f}" for _ in range(4))
+    lines.append(
+      f'(define record-{i} {{:id {i} :name "{random.choice(words)}" :values [{values}] '
+      f':floats ({floats}) :tags [:a :b :c] :nested {{:ok true :missing nil :quoted \'(x y z)}}}})'
+    )
+  return "\n".join(lines) + "\n"
+
+def measure(name: str, function, size: int, repeat: int = 5) -> None:
+  best = float("inf")
+  for _ in range(repeat):
+    start = default_timer()
+    forms = function()
+    best = min(best, default_timer() - start)
+  print(f"{name:<24}{best:8.3f}s {size / best / 2**20:8.2f} MiB/s  ({forms} forms)")
+
+if __name__ == "__main__":
+  records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  text = generate(records)
+  lines = text.splitlines(keepends=True)
+  size = len(text.encode())
+  print(f"corpus: {records} records, {size / 2**20:.2f} MiB")
+  measure("read_forms (string)", lambda: sum(1 for _ in reader.read_forms([text])), size)
+  measure("read_forms (lines)", lambda: sum(1 for _ in reader.read_forms(lines)), size)
@@ -0,0 +1,42 @@
+"""
+  startup time of the interpreter: from launching `python main.py file.plp` to the first evaluated form of the file
+  (the form prints `(time)`) and until the process ends, `python -c pass` is measured as well for comparison
+
+  run it from the root of the repository with `python3 benchmarks/startup.py [number of runs]`
+"""
+
+from statistics import median
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+def launch(arguments: list[str]) -> tuple[float, float]:
+  """
+    returns seconds until the first line of output (the time printed by the first form) and until the process ended
+  """
+  start = time.time_ns()
+  output = subprocess.run([sys.executable, *arguments], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+  end = time.time_ns()
+  lines = output.split()
+  first_form = int(lines[0]) if lines and lines[0].isdigit() else end
+  return (first_form - start) / 1e9, (end - start) / 1e9
+
+def report(name: str, times: list[tuple[float, float]]) -> None:
+  first, total = [t[0] for t in times], [t[1] for t in times]
+  print(f"{name:<22} first form: min {min(first) * 1000:6.1f} ms, median {median(first) * 1000:6.1f} ms   "
+        f"exit: min {min(total) * 1000:6.1f} ms, median {median(total) * 1000:6.1f} ms")
+
+if __name__ == "__main__":
+  runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  with tempfile.NamedTemporaryFile("w", suffix=".plp", delete=False) as file:
+    file.write("(println (time))\n(define x (+ 1 2))\n")
+  try:
+    report("python -c pass", [launch(["-c", "import time; print(time.time_ns())"]) for _ in range(runs)])
+    for engine in ("tree", "closure", "vm"):
+      report(f"main.py ({engine})", [launch(["main.py", "--engine", engine, file.name]) for _ in range(runs)])
+  finally:
+    os.remove(file.name)
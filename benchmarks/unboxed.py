@@ -0,0 +1,43 @@
+"""
+  microbenchmark of plain `int`/`float` numbers against the `int`/`float` subclasses PLP used to wrap them in
+
+  the boxed variants replay what `+`, `=` and reading a number did before: build a subclass instance for every result
+  run it from the root of the repository with `python3 benchmarks/unboxed.py`
+"""
+
+from timeit import timeit
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lib.core as core
+
+class BoxedInteger(int): pass
+class BoxedFloat(float): pass
+
+def boxed(var):
+  if isinstance(var, int): return BoxedInteger(var)
+  return BoxedFloat(var)
+
+def boxed_plus(*items):
+  if all(isinstance(n, (BoxedInteger, BoxedFloat)) for n in items):
+    return boxed(sum(items))
+  raise TypeError("+")
+
+NUMBER = 1000000
+
+def measure(name, statement, setup):
+  seconds = timeit(statement, setup, number=NUMBER, globals=globals())
+  print(f"{name:<28}{seconds / NUMBER * 1e9:7.1f} ns")
+
+for kind, a, b in [("int", 12345, 678), ("float", 12.5, 0.25)]:
+  print(f"[{kind}]")
+  measure("  + boxed", "boxed_plus(x, y)", f"x, y = boxed({a!r}), boxed({b!r})")
+  measure("  + unboxed", "core.plus_sign(x, y)", f"x, y = {a!r}, {b!r}")
+  measure("  < boxed", "x < y", f"x, y = boxed({a!r}), boxed({b!r})")
+  measure("  < unboxed", "x < y", f"x, y = {a!r}, {b!r}")
+  measure("  = boxed", "core.eq(x, y)", f"x, y = boxed({a!r}), boxed({b!r})")
+  measure("  = unboxed", "core.eq(x, y)", f"x, y = {a!r}, {b!r}")
+  measure("  read boxed", f"boxed({kind}(token))", f"token = {str(a)!r}")
+  measure("  read unboxed", f"{kind}(token)", f"token = {str(a)!r}")
@@ -0,0 +1,133 @@
+"""
+  stores parsed forms of source files in `__plpcache__` directories next to them (like python's `__pycache__`),
+  so files that didn't change since the last run are not parsed again
+
+  a cache file keeps the path and `(mtime_ns, size)` of its source together with a hash of the content,
+  when the stamp differs (e.g. the file was touched or checked out again) but the content is the same, the cache is still used
+  forms are stored with `pickle` (hashmaps are rebuilt when they're loaded, hashes of strings differ between runs),
+  unpickling objects in C is several times faster than parsing, while `lib/serialize.py` would rebuild them in python
+
+  `read-string` caches only long strings (see `MIN_STRING_LENGTH`) by their content hash,
+  parsing a short string is cheaper than looking it up on the disk
+"""
+
+from lib.helper import create_relative_path_for_file
+from lib.plp_types import PLPType
+from typing import Iterator, Optional
+import lib.reader as reader
+import os
+import pickle
+
+MAGIC = b"PLPA"
+# bumped whenever the format of the cache or the serialized forms changes
+VERSION = 1
+DIRECTORY_NAME = "__plpcache__"
+MIN_STRING_LENGTH = 16384
+
+# set by `--no-ast-cache`, forms are then always parsed and no cache files are written
+enabled = True
+
+def digest(content: bytes) -> bytes:
+  # imported here, files whose stamp didn't change are never hashed
+  import hashlib
+  return hashlib.blake2b(content, digest_size=16).digest()
+
+def cache_path_for_file(file_path: str) -> str:
+  directory, name = os.path.split(os.path.abspath(file_path))
+  return os.path.join(directory, DIRECTORY_NAME, name + ".ast")
+
+def cache_path_for_string(content_digest: bytes) -> str:
+  return os.path.join(os.path.abspath(create_relative_path_for_file(DIRECTORY_NAME)), "strings", content_digest.hex() + ".ast")
+
+def load(cache_path: str) -> Optional[tuple[str, tuple[int, int], bytes, tuple]]:
+  """
+    returns `(path, stamp, digest, forms)` of a cache file, `None` when it's missing or not of the current version
+  """
+  try:
+    with open(cache_path, "rb") as file:
+      data = file.read()
+  except OSError:
+    return None
+  if not data.startswith(MAGIC):
+    return None
+  try:
+    version, path, stamp, content_digest, forms = pickle.loads(data[len(MAGIC):])
+  except Exception:
+    return None # e.g. written by an older version of the interpreter with different classes
+  if version != VERSION:
+    return None
+  return path, tuple(stamp), content_digest, forms # type: ignore
+
+def store(cache_path: str, path: str, stamp: tuple[int, int], content_digest: bytes, forms: tuple) -> None:
+  try:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # written under another name first, so a run reading the cache at the same time never sees half of the file
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+      file.write(MAGIC + pickle.dumps((VERSION, path, stamp, content_digest, forms), pickle.HIGHEST_PROTOCOL))
+    os.replace(temporary_path, cache_path)
+  except (OSError, pickle.PicklingError, AttributeError, TypeError, RecursionError):
+    pass # the cache is only an optimization, e.g. the directory might be read-only or a form nested too deep
+
+def read_file_forms(file_path: str) -> Iterator[PLPType]:
+  """
+    yields top-level forms of a file, from its cache file when the source didn't change
+
+    without a valid cache the file is parsed form by form as it's read and the cache is written once all forms were taken,
+    so a file whose evaluation failed halfway is parsed again next time
+  """
+  if not enabled:
+    with open(file_path) as file:
+      yield from reader.read_forms(file)
+    return
+
+  path = os.path.abspath(file_path)
+  stat = os.stat(path)
+  stamp = (stat.st_mtime_ns, stat.st_size)
+  cache_path = cache_path_for_file(path)
+  cached = load(cache_path)
+  if cached is not None and cached[0] == path and cached[1] == stamp:
+    yield from cached[3]
+    return
+
+  with open(path, "rb") as file:
+    content = file.read()
+  content_digest = digest(content)
+  if cached is not None and cached[0] == path and cached[2] == content_digest:
+    store(cache_path, path, stamp, content_digest, cached[3])
+    yield from cached[3]
+    return
+
+  forms: list[PLPType] = []
+  for form in reader.read_forms(content.decode().splitlines(keepends=True)):
+    forms.append(form)
+    yield form
+  store(cache_path, path, stamp, content_digest, tuple(forms))
+
+def read_string(input: str) -> PLPType:
+  """
+    `reader.read_raw_string` reusing the parsed form of long strings read before
+  """
+  if not enabled or len(input) < MIN_STRING_LENGTH:
+    return reader.read_raw_string(input)
+  content_digest = digest(input.encode())
+  cache_path = cache_path_for_string(content_digest)
+  cached = load(cache_path)
+  if cached is not None and cached[2] == content_digest and cached[3]:
+    return cached[3][0]
+  form = reader.read_raw_string(input)
+  store(cache_path, "", (0, 0), content_digest, (form,))
+  return form
+
+def clear(root: Optional[str] = None) -> int:
+  """
+    removes all `__plpcache__` directories under `root` (the directory of the main script by default), returns how many were removed
+  """
+  import shutil
+  removed = 0
+  for directory, subdirectories, _ in os.walk(root if root is not None else create_relative_path_for_file("")):
+    if DIRECTORY_NAME in subdirectories:
+      shutil.rmtree(os.path.join(directory, DIRECTORY_NAME), ignore_errors=True)
+      subdirectories.remove(DIRECTORY_NAME)
+      removed += 1
+  return removed
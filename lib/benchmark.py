@@ -0,0 +1,83 @@
+"""
+  the `(bench expr :iterations n :warmup k :allocations true)` special form, every engine evaluates the expression
+  in the current environment through a python callable and leaves the measuring to `bench`
+"""
+
+from lib.plp_types import PLPType
+from typing import Callable
+import lib.plp_types as plp
+import math
+import time
+
+# options in the order `bench` takes them, with their defaults (which evaluate to themselves)
+OPTIONS: dict[str, PLPType] = {"iterations": 10, "warmup": 2, "allocations": plp.FALSE}
+
+def options(args: list[PLPType]) -> list[PLPType]:
+  """
+    returns expressions of all options in the order of `OPTIONS` from the arguments following the measured expression,
+    options that weren't given are replaced by their defaults
+  """
+  if len(args) % 2 != 0:
+    raise SyntaxError(f"operator 'bench' expects options as pairs of a keyword and a value (got {len(args)} arguments after the expression)")
+  given: dict[str, PLPType] = {}
+  for i in range(0, len(args), 2):
+    name = args[i]
+    if not isinstance(name, plp.Keyword) or str(name) not in OPTIONS:
+      raise SyntaxError(f"operator 'bench' expects options {', '.join(':' + o for o in OPTIONS)} (got {name})")
+    given[str(name)] = args[i + 1]
+  return [given.get(name, default) for name, default in OPTIONS.items()]
+
+def bench(evaluate: Callable[[], PLPType], iterations: PLPType, warmup: PLPType, allocations: PLPType) -> plp.HashMap:
+  """
+    evaluates an expression (`evaluate`) `warmup` times, then `iterations` times measuring every evaluation
+    and returns the times in nanoseconds, with `allocations` it's evaluated once more under `tracemalloc`
+  """
+  if type(iterations) is not int or iterations < 1:
+    raise TypeError(f"operator 'bench' expects :iterations to be a positive integer (got {iterations})")
+  if type(warmup) is not int or warmup < 0:
+    raise TypeError(f"operator 'bench' expects :warmup to be a non-negative integer (got {warmup})")
+
+  for _ in range(warmup):
+    evaluate()
+  clock = time.perf_counter_ns
+  times: list[int] = []
+  for _ in range(iterations):
+    start = clock()
+    evaluate()
+    times.append(clock() - start)
+
+  total = sum(times)
+  mean = total / iterations
+  items: list[PLPType] = [
+    plp.Keyword("iterations"), iterations,
+    plp.Keyword("mean"), mean,
+    plp.Keyword("min"), min(times),
+    plp.Keyword("max"), max(times),
+    plp.Keyword("std-dev"), math.sqrt(sum((t - mean) ** 2 for t in times) / iterations),
+    plp.Keyword("total"), total,
+  ]
+  if plp.is_defined_or_true(allocations):
+    items.extend(measure_allocations(evaluate))
+  return plp.HashMap(items)
+
+def measure_allocations(evaluate: Callable[[], PLPType]) -> list[PLPType]:
+  """
+    the peak of memory allocated during one evaluation and how many memory blocks it left allocated (e.g. for its result)
+  """
+  # imported here, only `:allocations` needs it
+  import sys
+  import tracemalloc
+  tracing = tracemalloc.is_tracing()
+  blocks = sys.getallocatedblocks()
+  if not tracing:
+    tracemalloc.start()
+  tracemalloc.reset_peak()
+  base = tracemalloc.get_traced_memory()[0]
+  value = evaluate()
+  peak = tracemalloc.get_traced_memory()[1] - base
+  if not tracing:
+    tracemalloc.stop()
+  # counted while the value is still alive, but after the traces of `tracemalloc` were freed
+  blocks = sys.getallocatedblocks() - blocks
+  del value
+  return [plp.Keyword("peak-bytes"), peak, plp.Keyword("blocks"), blocks]
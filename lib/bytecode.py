@@ -0,0 +1,457 @@
+"""
+  compiles PLP forms into compact bytecode for the stack based VM in `lib/vm.py`
+
+  instructions are stored in a flat list of integers, every opcode is followed by its operands (see `OPERANDS`)
+  symbols are resolved with the same `Scope` analysis the closure engine uses,
+  so locals are addressed by slot and only free symbols are looked up in the global environment by name
+
+  code objects can be serialized into `.plpc` files and disassembled for debugging
+"""
+
+from lib.compiler import new_scope
+from lib.env import Scope
+from lib.plp_types import PLPType
+from typing import Any, Optional
+import lib.ast_cache as ast_cache
+import lib.benchmark as benchmark
+import lib.plp_types as plp
+import lib.serialize as serialize
+import marshal
+import os
+import sys
+
+# opcodes
+CONST = 0           # const_index                -> pushes a constant
+LOAD_FAST = 1       # slot, name_index           -> pushes a slot of the current frame, falls back to a global
+LOAD_LOCAL = 2      # ref_index                  -> pushes a slot of an enclosing frame (see `Code.refs`)
+LOAD_GLOBAL = 3     # name_index                 -> pushes a global
+STORE_LOCAL = 4     # slot                       -> stores top of the stack into a slot of the current frame (keeps it on the stack)
+STORE_GLOBAL = 5    # name_index                 -> defines a global (keeps the value on the stack)
+POP = 6             #                            -> discards top of the stack
+JUMP = 7            # target                     -> continues at `target`
+JUMP_IF_FALSE = 8   # target                     -> pops a condition and jumps if it is `false` or `nil`
+CALL = 9            # argc, operator_index       -> calls a function with `argc` arguments from the stack
+TAIL_CALL = 10      # argc, operator_index       -> same as `CALL` but replaces the current activation
+RETURN = 11         #                            -> returns top of the stack to the caller
+MAKE_LAMBDA = 12    # code_index                 -> creates a lambda closing over the current frame
+BUILD_VECTOR = 13   # count                      -> pops `count` items into a vector
+BUILD_HASHMAP = 14  # count                      -> pops `count` key-value pairs into a hashmap
+ENTER_FRAME = 15    # size                       -> pushes a new frame with `size` unset slots (`let*`, `while`)
+LEAVE_FRAME = 16    #                            -> returns to the enclosing frame
+WRITE_BACK = 17     # write_back_index           -> copies `while` definitions into the enclosing frame (see `Code.write_backs`)
+FAIL = 18           # const_index                -> raises an error deferred from compile time
+JUMP_IF_FALSE_OR_POP = 19 # target               -> jumps keeping the condition on the stack if it is `false` or `nil`, pops it otherwise
+JUMP_IF_TRUE_OR_POP = 20  # target               -> jumps keeping the condition on the stack unless it is `false` or `nil`, pops it otherwise
+PROFILE = 21        # code_index                 -> pops the path of a JSON report and runs a block compiled in the current frame under the profiler
+BENCH = 22          # code_index                 -> pops the options of `bench` and measures a block compiled in the current frame
+
+OPNAMES = [
+  "CONST", "LOAD_FAST", "LOAD_LOCAL", "LOAD_GLOBAL", "STORE_LOCAL", "STORE_GLOBAL", "POP", "JUMP", "JUMP_IF_FALSE",
+  "CALL", "TAIL_CALL", "RETURN", "MAKE_LAMBDA", "BUILD_VECTOR", "BUILD_HASHMAP", "ENTER_FRAME", "LEAVE_FRAME",
+  "WRITE_BACK", "FAIL", "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP", "PROFILE", "BENCH",
+]
+OPERANDS = [1, 2, 1, 1, 1, 1, 0, 1, 1, 2, 2, 0, 1, 1, 1, 1, 0, 1, 1, 1, 1, 1, 1]
+
+# bumped whenever the instruction set or the layout of `Code` changes, old `.plpc` files are then recompiled
+VERSION = 4
+MAGIC = b"PLPC"
+# `.plpc` files are named after the interpreter and the version of the format, marshal's format differs between python versions
+TAG = f"{sys.implementation.cache_tag or sys.implementation.name}-{VERSION}"
+
+class Code:
+  """
+    compiled body of a top-level form or of a lambda
+  """
+  def __init__(self, arity: int = 0, ast: PLPType = None, scopes: Optional[list[list[plp.Symbol]]] = None):
+    self.instructions: list[int] = []
+    self.constants: list[PLPType] = []
+    self.names: list[plp.Symbol] = []
+    # symbol together with the coordinates of every enclosing slot carrying its name (innermost first)
+    self.refs: list[tuple[plp.Symbol, tuple[tuple[int, int], ...]]] = []
+    # bodies of lambdas (`MAKE_LAMBDA`) and blocks run in the current frame (`PROFILE`, `BENCH`)
+    self.codes: list[Code] = []
+    # for every `while`: whether it is on the top level and pairs of (slot in the loop frame, slot in the enclosing frame or global name index)
+    self.write_backs: list[tuple[bool, tuple[tuple[int, int], ...]]] = []
+    self.arity = arity
+    self.ast = ast
+    # names of the slots of the lambda frame and of the frames it closes over (innermost first)
+    self.scopes: list[list[plp.Symbol]] = scopes if scopes is not None else []
+
+  def scope(self) -> Optional[Scope]:
+    scope: Optional[Scope] = None
+    for names in reversed(self.scopes):
+      scope = Scope(names, scope)
+    return scope
+
+  def add(self, table: list[Any], value: Any) -> int:
+    # equal integers and strings are shared, other values only when they are the very same object
+    for i, item in enumerate(table):
+      if item is value or (type(item) is type(value) and isinstance(value, (int, str)) and item == value):
+        return i
+    table.append(value)
+    return len(table) - 1
+
+  def emit(self, opcode: int, *operands: int) -> int:
+    self.instructions.append(opcode)
+    self.instructions.extend(operands)
+    return len(self.instructions) - 1
+
+  def patch(self, position: int, target: int) -> None:
+    self.instructions[position] = target
+
+  def position(self) -> int:
+    return len(self.instructions)
+
+def compile_ast(ast: PLPType) -> Code:
+  """
+    compiles a top-level form, the result is evaluated by `vm.run` in the global environment
+  """
+  code = Code()
+  compile_expr(code, ast, None, False)
+  code.emit(RETURN)
+  return code
+
+def compile_expr(code: Code, ast: PLPType, scope: Optional[Scope], tail: bool) -> None:
+  """
+    appends instructions leaving the value of `ast` on the stack
+
+    forms in `tail` position of a lambda body are followed by `RETURN`, calls there become `TAIL_CALL`
+  """
+  match ast:
+    case plp.Symbol():
+      compile_symbol(code, ast, scope)
+    case plp.Vector():
+      for a in ast:
+        compile_expr(code, a, scope, False)
+      code.emit(BUILD_VECTOR, len(ast))
+    case plp.HashMap():
+      for key, value in ast.items():
+        code.emit(CONST, code.add(code.constants, key))
+        compile_expr(code, value, scope, False)
+      code.emit(BUILD_HASHMAP, len(ast.items()))
+    case plp.List():
+      if len(ast) == 0:
+        code.emit(CONST, code.add(code.constants, ast))
+        return
+      operator = ast[0]
+      args = ast[1:]
+      if isinstance(operator, plp.Symbol):
+        match operator:
+          case "define":
+            return compile_define(code, args, scope)
+          case "do":
+            return compile_do(code, args, scope, tail)
+          case "fn":
+            return compile_fn(code, args, scope)
+          case "if":
+            return compile_if(code, args, scope, tail)
+          case "let*":
+            return compile_let(code, args, scope, tail)
+          case "while":
+            return compile_while(code, args, scope)
+          case "quote":
+            if len(args) == 0:
+              return fail(code, IndexError("list index out of range"))
+            code.emit(CONST, code.add(code.constants, args[0]))
+            return
+          case "and" | "or":
+            return compile_and_or(code, operator, args, scope, tail)
+          case "cond":
+            return compile_cond(code, args, scope, tail)
+          case "profile":
+            return compile_profile(code, args, scope)
+          case "bench":
+            return compile_bench(code, args, scope)
+          case _: pass
+      compile_call(code, operator, args, scope, tail)
+    case _:
+      code.emit(CONST, code.add(code.constants, ast))
+
+def fail(code: Code, exception: Exception) -> None:
+  code.emit(FAIL, code.add(code.constants, plp.List([plp.String(type(exception).__name__), plp.String(str(exception))])))
+
+def compile_symbol(code: Code, symbol: plp.Symbol, scope: Optional[Scope]) -> None:
+  coordinates = scope.resolve(symbol) if scope is not None else []
+  if len(coordinates) == 0:
+    code.emit(LOAD_GLOBAL, code.add(code.names, symbol))
+  elif len(coordinates) == 1 and coordinates[0][0] == 0:
+    code.emit(LOAD_FAST, coordinates[0][1], code.add(code.names, symbol))
+  else:
+    code.refs.append((symbol, tuple(coordinates)))
+    code.emit(LOAD_LOCAL, len(code.refs) - 1)
+
+def compile_call(code: Code, operator: PLPType, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  compile_expr(code, operator, scope, False)
+  for a in args:
+    compile_expr(code, a, scope, False)
+  code.emit(TAIL_CALL if tail else CALL, len(args), code.add(code.constants, operator))
+
+def compile_define(code: Code, args: list[PLPType], scope: Optional[Scope]) -> None:
+  if len(args) != 2:
+    return fail(code, SyntaxError(f"operator 'define' expects 2 arguments (got {len(args)})"))
+
+  key = args[0]
+  if isinstance(key, plp.Symbol):
+    compile_expr(code, args[1], scope, False)
+    if scope is None:
+      code.emit(STORE_GLOBAL, code.add(code.names, key))
+    else:
+      code.emit(STORE_LOCAL, scope.index[key])
+  elif isinstance(key, plp.Keyword):
+    fail(code, SyntaxError(f"operator 'define' can't use keyword ':{key}'"))
+  else:
+    fail(code, SyntaxError(f"operator 'define' can't redefine atom '{key}'"))
+
+def compile_let(code: Code, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  if len(args) != 2:
+    return fail(code, SyntaxError(f"operator 'let*' expects 2 arguments (got {len(args)})"))
+
+  new_bindings = args[0]
+  if not isinstance(new_bindings, plp.List):
+    return fail(code, SyntaxError("operator 'let*' expects first paramater to be a list for bindings"))
+
+  keys: list[plp.Symbol] = []
+  exprs: list[PLPType] = []
+  for i in range(0, len(new_bindings) - 1, 2):
+    key = new_bindings[i]
+    if not isinstance(key, plp.Symbol):
+      break
+    keys.append(key)
+    exprs.append(new_bindings[i + 1])
+  let_scope = new_scope(keys, exprs + [args[1]], scope)
+
+  code.emit(ENTER_FRAME, len(let_scope.names))
+  for key, expr in zip(keys, exprs):
+    compile_expr(code, expr, let_scope, False)
+    code.emit(STORE_LOCAL, let_scope.index[key])
+    code.emit(POP)
+  if len(keys) < (len(new_bindings) // 2):
+    return fail(code, SyntaxError("operator 'let*' expects odd bindings to be a symbol"))
+  compile_expr(code, args[1], let_scope, tail)
+  code.emit(LEAVE_FRAME)
+
+def compile_do(code: Code, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  if len(args) == 0:
+    return fail(code, SyntaxError("operator 'do' expects at least 1 argument (got 0)"))
+
+  for expr in args[:-1]:
+    compile_expr(code, expr, scope, False)
+    code.emit(POP)
+  compile_expr(code, args[-1], scope, tail)
+
+def compile_if(code: Code, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  if len(args) not in [2, 3]:
+    return fail(code, SyntaxError(f"operator 'if' expects either 2 or 3 arguments (got {len(args)})"))
+
+  compile_expr(code, args[0], scope, False)
+  jump_to_else = code.emit(JUMP_IF_FALSE, 0)
+  compile_expr(code, args[1], scope, tail)
+  jump_to_end = code.emit(JUMP, 0)
+  code.patch(jump_to_else, code.position())
+  if len(args) == 3:
+    compile_expr(code, args[2], scope, tail)
+  else:
+    code.emit(CONST, code.add(code.constants, plp.NIL))
+  code.patch(jump_to_end, code.position())
+
+def compile_and_or(code: Code, operator: plp.Symbol, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  if len(args) == 0:
+    code.emit(CONST, code.add(code.constants, plp.TRUE if operator == "and" else plp.NIL))
+    return
+
+  jumps_to_end: list[int] = []
+  for expr in args[:-1]:
+    compile_expr(code, expr, scope, False)
+    jumps_to_end.append(code.emit(JUMP_IF_FALSE_OR_POP if operator == "and" else JUMP_IF_TRUE_OR_POP, 0))
+  compile_expr(code, args[-1], scope, tail)
+  for jump in jumps_to_end:
+    code.patch(jump, code.position())
+
+def compile_cond(code: Code, args: list[PLPType], scope: Optional[Scope], tail: bool) -> None:
+  if len(args) % 2 != 0:
+    return fail(code, SyntaxError(f"operator 'cond' expects pairs of a condition and an expression (got {len(args)} arguments)"))
+
+  jumps_to_end: list[int] = []
+  for i in range(0, len(args), 2):
+    compile_expr(code, args[i], scope, False)
+    jump_to_next = code.emit(JUMP_IF_FALSE, 0)
+    compile_expr(code, args[i + 1], scope, tail)
+    jumps_to_end.append(code.emit(JUMP, 0))
+    code.patch(jump_to_next, code.position())
+  code.emit(CONST, code.add(code.constants, plp.NIL))
+  for jump in jumps_to_end:
+    code.patch(jump, code.position())
+
+def compile_fn(code: Code, args: list[PLPType], scope: Optional[Scope]) -> None:
+  if len(args) != 2:
+    return fail(code, SyntaxError(f"operator 'fn' expects 2 arguments (got {len(args)})"))
+
+  fn_args = args[0]
+  if not isinstance(fn_args, plp.List):
+    return fail(code, SyntaxError("operator 'fn' expects arguments to be in a list"))
+  for arg in fn_args:
+    if not isinstance(arg, plp.Symbol):
+      return fail(code, SyntaxError(f"opeartor 'fn' expects arguments to not be atoms; found: {arg}"))
+
+  body = args[1]
+  fn_scope = new_scope(fn_args, [body], scope) # type: ignore
+  fn_code = Code(len(fn_args), body, scope_names(fn_scope))
+  compile_expr(fn_code, body, fn_scope, True)
+  fn_code.emit(RETURN)
+  code.codes.append(fn_code)
+  code.emit(MAKE_LAMBDA, len(code.codes) - 1)
+
+def compile_profile(code: Code, args: list[PLPType], scope: Optional[Scope]) -> None:
+  if len(args) not in [1, 2]:
+    return fail(code, SyntaxError(f"operator 'profile' expects either 1 or 2 arguments (got {len(args)})"))
+
+  if len(args) == 2:
+    compile_expr(code, args[1], scope, False)
+  else:
+    code.emit(CONST, code.add(code.constants, plp.NIL))
+  code.emit(PROFILE, compile_block(code, args[0], scope))
+
+def compile_bench(code: Code, args: list[PLPType], scope: Optional[Scope]) -> None:
+  if len(args) == 0:
+    return fail(code, SyntaxError("operator 'bench' expects an expression to measure"))
+  try:
+    options = benchmark.options(args[1:])
+  except SyntaxError as e:
+    return fail(code, e)
+
+  for option in options:
+    compile_expr(code, option, scope, False)
+  code.emit(BENCH, compile_block(code, args[0], scope))
+
+def compile_block(code: Code, ast: PLPType, scope: Optional[Scope]) -> int:
+  """
+    compiles an expression evaluated by python code in the current frame (see `PROFILE`) and returns its index in `code.codes`
+  """
+  # the block runs in the same frame, so it's compiled in the same scope (it's not a lambda, nothing calls it with arguments)
+  block = Code(0, ast, scope_names(scope))
+  compile_expr(block, ast, scope, False)
+  block.emit(RETURN)
+  code.codes.append(block)
+  return len(code.codes) - 1
+
+def scope_names(scope: Optional[Scope]) -> list[list[plp.Symbol]]:
+  scopes: list[list[plp.Symbol]] = []
+  while scope is not None:
+    scopes.append(scope.names)
+    scope = scope.outer
+  return scopes
+
+def compile_while(code: Code, args: list[PLPType], scope: Optional[Scope]) -> None:
+  if len(args) < 2:
+    return fail(code, SyntaxError(f"operator 'while' expects at least 2 arguments (got {(len(args))})"))
+
+  while_scope = new_scope([], args, scope)
+  # symbols defined inside the loop are written back only if they are already defined in the enclosing frame
+  if scope is None:
+    pairs = tuple((i, code.add(code.names, key)) for key, i in while_scope.index.items())
+    code.write_backs.append((True, pairs))
+  else:
+    pairs = tuple((i, scope.index[key]) for key, i in while_scope.index.items() if key in scope.index)
+    code.write_backs.append((False, pairs))
+
+  code.emit(ENTER_FRAME, len(while_scope.names))
+  start = code.position()
+  compile_expr(code, args[0], while_scope, False)
+  jump_to_end = code.emit(JUMP_IF_FALSE, 0)
+  for expr in args[1:]:
+    compile_expr(code, expr, while_scope, False)
+    code.emit(POP)
+  code.emit(JUMP, start)
+  code.patch(jump_to_end, code.position())
+  code.emit(WRITE_BACK, len(code.write_backs) - 1)
+  code.emit(LEAVE_FRAME)
+  code.emit(CONST, code.add(code.constants, plp.NIL))
+
+def disassemble(code: Code, indent: str = "") -> str:
+  """
+    returns human readable listing of the instructions (nested lambdas included)
+  """
+  lines: list[str] = []
+  instructions = code.instructions
+  position = 0
+  while position < len(instructions):
+    opcode = instructions[position]
+    operands = instructions[position + 1:position + 1 + OPERANDS[opcode]]
+    line = f"{indent}{position:>5} {OPNAMES[opcode]:<14} {' '.join(str(o) for o in operands)}"
+    if opcode in (CONST, FAIL):
+      line += f"  ; {describe(code.constants[operands[0]])}"
+    elif opcode == LOAD_FAST:
+      line += f"  ; {code.names[operands[1]]}"
+    elif opcode in (LOAD_GLOBAL, STORE_GLOBAL):
+      line += f"  ; {code.names[operands[0]]}"
+    elif opcode == LOAD_LOCAL:
+      symbol, coordinates = code.refs[operands[0]]
+      line += f"  ; {symbol} at {list(coordinates)}"
+    elif opcode in (CALL, TAIL_CALL):
+      line += f"  ; {describe(code.constants[operands[1]])}"
+    lines.append(line.rstrip())
+    if opcode == MAKE_LAMBDA:
+      fn_code = code.codes[operands[0]]
+      lines.append(f"{indent}      lambda ({' '.join(fn_code.scopes[0][:fn_code.arity])}):")
+      lines.append(disassemble(fn_code, indent + "    "))
+    elif opcode in (PROFILE, BENCH):
+      lines.append(f"{indent}      block:")
+      lines.append(disassemble(code.codes[operands[0]], indent + "    "))
+    position += 1 + OPERANDS[opcode]
+  return "\n".join(lines)
+
+def describe(value: PLPType) -> str:
+  # imported here since the printer is only needed for debugging output
+  import lib.printer as printer
+  return printer.format(value)
+
+def encode_code(code: Code) -> tuple[Any, ...]:
+  return (
+    code.arity,
+    code.instructions,
+    tuple(serialize.encode(constant) for constant in code.constants),
+    tuple(str(name) for name in code.names),
+    tuple((str(symbol), coordinates) for symbol, coordinates in code.refs),
+    tuple(encode_code(fn_code) for fn_code in code.codes),
+    tuple(code.write_backs),
+    serialize.encode(code.ast) if code.ast is not None else None,
+    tuple(tuple(str(name) for name in names) for names in code.scopes),
+  )
+
+def decode_code(encoded: tuple[Any, ...]) -> Code:
+  arity, instructions, constants, names, refs, codes, write_backs, ast, scopes = encoded
+  code = Code(arity, serialize.decode(ast) if ast is not None else None, [[plp.Symbol(name) for name in names] for names in scopes])
+  code.instructions = list(instructions)
+  code.constants = [serialize.decode(constant) for constant in constants]
+  code.names = [plp.Symbol(name) for name in names]
+  code.refs = [(plp.Symbol(symbol), tuple(coordinates)) for symbol, coordinates in refs]
+  code.codes = [decode_code(fn_code) for fn_code in codes]
+  code.write_backs = list(write_backs)
+  return code
+
+def cache_path_for_file(file_path: str) -> str:
+  """
+    path of the `.plpc` file of a source, in the `__plpcache__` directory next to it (see `lib/ast_cache.py`)
+  """
+  directory, name = os.path.split(os.path.abspath(file_path))
+  return os.path.join(directory, ast_cache.DIRECTORY_NAME, f"{name}.{TAG}.plpc")
+
+def dumps(codes: list[Code], source_stamp: tuple[int, int]) -> bytes:
+  """
+    serializes top-level codes of a file, `source_stamp` is `(mtime_ns, size)` of the source they were compiled from
+  """
+  return MAGIC + marshal.dumps((VERSION, source_stamp, tuple(encode_code(code) for code in codes)))
+
+def loads(data: bytes, source_stamp: tuple[int, int]) -> Optional[list[Code]]:
+  """
+    returns `None` when the data is not a valid `.plpc` of the current version compiled from the same source
+  """
+  if not data.startswith(MAGIC):
+    return None
+  try:
+    version, stamp, codes = marshal.loads(data[len(MAGIC):])
+  except (EOFError, ValueError, TypeError):
+    return None
+  if version != VERSION or tuple(stamp) != tuple(source_stamp):
+    return None
+  return [decode_code(code) for code in codes]
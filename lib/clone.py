@@ -0,0 +1,259 @@
+"""
+  copying values of one global environment into another one for `Interpreter.clone` (see `lib/rep.py`)
+
+  values that can't reach the original global environment (numbers, strings, builtins, collections of them, ...) are shared,
+  everything that can is copied so that it looks globals up in the copy instead:
+  - lambdas of every engine together with the local environments and slot frames they close over (`let*`, enclosing lambdas),
+    the trees of python closures the closure engine compiled their bodies into are copied with the new environment in place
+    of the original one once the lambda is first called, nothing is compiled again
+  - collections containing such values, lazy sequences included (their items are produced again by the copy)
+  - python closures (e.g. the source of a lazy `map`) with the values they hold
+  - memoized functions, which also get a new empty cache
+  - builtins of the interpreter itself (`eval`, `load-file`, `runtime-stats`), replaced by the ones of the copy
+
+  anything else that might reach the original (e.g. a lambda wrapped by a running profiler or a python object of unknown type
+  held by a closure) can't be copied, `copy_values` then raises `Uncopyable` naming the global it was reached from
+"""
+
+from lib.env import Env, Frame, FrameEnv, GlobalEnv, Unset
+from lib.plp_types import PLPType
+from types import BuiltinMethodType, CellType, FunctionType, MethodWrapperType, ModuleType
+from typing import Any
+import lib.eval as evaluator
+import lib.memo as memo
+import lib.plp_types as plp
+import operator
+import sys
+
+class Uncopyable(TypeError):
+  """
+    raised for a value that might reach the original global environment but can't be copied
+  """
+
+# values that never reach any environment
+IMMUTABLE_TYPES = (int, float, str, bool, range, type(None), plp.String, plp.Keyword, plp.Symbol, plp.NumVector, plp.Boolean, plp.Null, Unset)
+
+def unpacked(cells: tuple[CellType, ...]) -> list[Any]:
+  return [cell.cell_contents for cell in cells]
+
+class Copier:
+  """
+    copies values reaching `source` (a global environment) so they reach `target` instead,
+    `builtins` maps builtins of the interpreter owning `source` to the ones of the interpreter owning `target`
+  """
+  def __init__(self, source: GlobalEnv, target: GlobalEnv, builtins: dict[FunctionType, FunctionType]):
+    self.source = source
+    self.target = target
+    self.builtins = builtins
+    # id of the original -> (original, copy), the original is kept alive so its id isn't reused, shared values map to themselves
+    self.copies: dict[int, tuple[Any, Any]] = {}
+    self.bodies = Bodies(source, target)
+
+  def remember(self, original: Any, copy: Any) -> Any:
+    self.copies[id(original)] = (original, copy)
+    return copy
+
+  def copy(self, value: Any) -> Any:
+    if type(value) in IMMUTABLE_TYPES:
+      return value
+    copied = self.copies.get(id(value))
+    if copied is not None:
+      return copied[1]
+    return self.remember(value, self.copy_new(value))
+
+  def copy_new(self, value: Any) -> Any:
+    value_type = type(value)
+    if value_type is plp.List or value_type is plp.Vector or value_type is tuple:
+      # tuples come from python closures (e.g. the arguments of `map`)
+      items = [self.copy(item) for item in value]
+      return value if all(a is b for a, b in zip(items, value)) else value_type(items)
+    if value_type is plp.PersistentList or value_type is plp.ListView:
+      items = [self.copy(item) for item in value]
+      # a plain list behaves (and prints) the same
+      return value if all(a is b for a, b in zip(items, value)) else plp.List(items)
+    if value_type is plp.HashMap:
+      items = [(key, self.copy(item)) for key, item in value.items()]
+      if all(item is original for (_, item), (_, original) in zip(items, value.items())):
+        return value
+      return plp.HashMap([x for pair in items for x in pair])
+    if value_type is plp.LazySeq:
+      # the source produces the items, they can't reach anything the source itself doesn't
+      source = self.copy(value.source)
+      item = self.copy(value.item)
+      if source is value.source and item is value.item:
+        return value
+      return plp.LazySeq(source, value.length, item, value.start, value.stop)
+    if value_type is FunctionType:
+      return self.copy_function(value)
+    if value_type is MethodWrapperType or value_type is BuiltinMethodType:
+      # methods of python's objects (e.g. of the `range` behind a lazy range) are shared with them
+      if type(value.__self__) is ModuleType or self.copy(value.__self__) is value.__self__:
+        return value
+      raise Uncopyable(f"{value_type.__name__} of {type(value.__self__).__name__} can't be copied")
+    if value_type is plp.Lambda or value_type is GlobalEnv or value_type is Env or value_type is FrameEnv or value_type is Frame:
+      return self.copy_linked(value)
+    compiler = sys.modules.get("lib.compiler")
+    vm = sys.modules.get("lib.vm")
+    if (compiler is not None and value_type is compiler.CompiledLambda) or (vm is not None and value_type is vm.VMLambda):
+      return self.copy_linked(value)
+    raise Uncopyable(f"{value_type.__name__} can't be copied")
+
+  def copy_function(self, function: FunctionType) -> Any:
+    if function in self.builtins:
+      return self.builtins[function]
+    if hasattr(function, "profiled_original"):
+      raise Uncopyable("a lambda wrapped by a running profiler can't be copied")
+    cache = getattr(function, "cache", None)
+    if isinstance(cache, memo.Cache) and hasattr(function, "function"):
+      memoized = memo.memoize(self.copy(function.function), evaluator.call_function, memo.Cache(cache.max_size, cache.ttl)) # type: ignore
+      memoized.__name__ = function.__name__
+      return memoized
+    # builtins are module level functions, a closure is shared only when nothing it holds has to be copied
+    if function.__closure__ is None:
+      return function
+    # the copy is remembered before its cells are filled since they may lead back to it (e.g. a recursive local function),
+    # it's thrown away again when none of the values changed
+    cells = tuple(CellType() for _ in function.__closure__)
+    copy = FunctionType(function.__code__, function.__globals__, function.__name__, function.__defaults__, cells)
+    self.remember(function, copy)
+    for cell, original in zip(cells, function.__closure__):
+      cell.cell_contents = self.copy(original.cell_contents)
+    if not any(map(operator.is_not, unpacked(cells), unpacked(function.__closure__))):
+      return self.remember(function, function)
+    return copy
+
+  def reaches_source(self, env: Any) -> bool:
+    while env is not None:
+      if type(env) is FrameEnv:
+        return env.global_env is self.source
+      if env is self.source:
+        return True
+      env = env.outer
+    return False
+
+  def copy_linked(self, value: Any) -> Any:
+    """
+      copies environments, frames and lambdas reaching the original global environment
+
+      environments and frames are mutable, so they're copied whenever they reach it, the copy is remembered before their contents
+      are copied since they may lead back to it (e.g. a recursive lambda defined in a `let*`), and so is a lambda
+      once it's looked up again after copying its environment
+    """
+    value_type = type(value)
+    if value_type is GlobalEnv:
+      return self.target if value is self.source else value
+    if value_type is FrameEnv:
+      if value.global_env is not self.source:
+        return value
+      return FrameEnv(self.copy(value.frame), value.scope, self.target)
+    if value_type is Env:
+      if not self.reaches_source(value):
+        return value
+      outer = self.copy(value.outer)
+      copied = self.copies.get(id(value))
+      if copied is not None:
+        return copied[1]
+      env = Env.__new__(Env)
+      env.outer = outer
+      env.root = self.target if value.root is self.source else value.root
+      env.data = {}
+      self.remember(value, env)
+      env.data.update((key, self.copy(item)) for key, item in value.data.items())
+      return env
+    if value_type is Frame:
+      outer = self.copy(value.outer)
+      copied = self.copies.get(id(value))
+      if copied is not None:
+        return copied[1]
+      frame = Frame([], outer)
+      self.remember(value, frame)
+      frame.values.extend(self.copy(item) for item in value.values)
+      return frame
+    if value_type is plp.Lambda:
+      if not self.reaches_source(value.env):
+        return value
+      env = self.copy(value.env)
+      copied = self.copies.get(id(value))
+      if copied is not None:
+        return copied[1]
+      return evaluator.eval_fn([value.params, value.ast], env)
+    # lambdas compiled by the closure engine or into bytecode
+    if value.global_env is not self.source:
+      return value
+    outer = self.copy(value.outer)
+    copied = self.copies.get(id(value))
+    if copied is not None:
+      return copied[1]
+    if hasattr(value, "code"):
+      return value_type(value.code, outer, self.target)
+    body = value.body
+    if hasattr(body, "copied"):
+      body = body.copied()
+    function = value_type(value.ast, body, value.scope, value.arity, outer, self.target)
+    function.body = self.bodies.deferred(function, body)
+    return function
+
+class Bodies:
+  """
+    copies of bodies compiled by the closure engine for `target`, the trees of python closures hold `source` (and its bindings)
+    directly, so they're copied with `target` in its place, the rest of them (ASTs, scopes, ...) doesn't depend on it
+
+    copying a body costs about as much as compiling it, so a lambda copies it only once it's called (most of the lambdas
+    of a loaded library usually never are), lambdas created by the same `fn` share the copy
+  """
+  def __init__(self, source: GlobalEnv, target: GlobalEnv):
+    self.source = source
+    self.target = target
+    # id of the original closure -> (original, copy)
+    self.copies: dict[int, tuple[Any, Any]] = {}
+
+  def deferred(self, function: Any, body: Any) -> Any:
+    """
+      body of a copied lambda that replaces itself with the copy of `body` when it's first called,
+      its `copied` does the same without calling it (a copy of a copy needs the body right away)
+    """
+    def copied() -> Any:
+      function.body = self.copy(body)
+      return function.body
+    def copy_and_run(frame: Frame) -> Any:
+      return copied()(frame)
+    copy_and_run.copied = copied # type: ignore
+    return copy_and_run
+
+  def copy(self, value: Any) -> Any:
+    if value is self.source:
+      return self.target
+    if value is self.source.data:
+      return self.target.data
+    value_type = type(value)
+    if value_type is FunctionType:
+      closure = value.__closure__
+      if closure is None:
+        return value
+      copied = self.copies.get(id(value))
+      if copied is not None:
+        return copied[1]
+      # the closures are created bottom-up when the body is compiled, none of them can lead back to itself
+      contents = [self.copy(item) for item in unpacked(closure)]
+      copy = value
+      if any(map(operator.is_not, contents, unpacked(closure))):
+        copy = FunctionType(value.__code__, value.__globals__, value.__name__, value.__defaults__, tuple(map(CellType, contents)))
+      self.copies[id(value)] = (value, copy)
+      return copy
+    if value_type is list or value_type is tuple:
+      items = [self.copy(item) for item in value]
+      return value_type(items) if any(map(operator.is_not, items, value)) else value
+    return value
+
+def copy_values(source: GlobalEnv, target: GlobalEnv, builtins: dict[FunctionType, FunctionType]) -> dict[plp.Symbol, PLPType]:
+  """
+    returns bindings of `source` copied for `target`, raises `Uncopyable` if some of them can't be copied
+  """
+  copier = Copier(source, target, builtins)
+  data = {}
+  for key, value in source.data.items():
+    try:
+      data[key] = copier.copy(value)
+    except Uncopyable as e:
+      raise Uncopyable(f"can't copy the value of '{key}': {e}") from e
+  return data
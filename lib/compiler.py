@@ -0,0 +1,488 @@
+"""
+  alternative engine to the tree-walking `EVAL`
+
+  every form is analyzed exactly once and turned into a tree of python closures,
+  special forms, symbol references and calls are therefore resolved ahead of time
+  and running a compiled lambda body never dispatches on the shape of the AST again
+
+  the behavior (including the error messages) mirrors `EVAL`,
+  malformed special forms are compiled into closures that raise the same error once they are reached
+"""
+
+from lib.env import Env, Frame, FrameEnv, Scope, UNSET, Unset
+from lib.eval import EVAL, EVAL_RETURN_TYPE, TailCall
+from lib.plp_types import PLPType
+from types import FunctionType
+from typing import Callable, Optional
+import lib.benchmark as benchmark
+import lib.exceptions as exceptions
+import lib.plp_types as plp
+import lib.profiler as profiler
+import sys
+
+# every level of recursion that isn't a tail call costs about three python frames (the body, the call and the form
+# the call is an argument of), with python's default limit of 1000 frames recursion would stop at a depth of about 300
+RECURSION_LIMIT = 20000
+
+# compiled forms take the slot frame they run in, `None` stands for the top level (the global environment)
+Compiled = Callable[[Optional[Frame]], EVAL_RETURN_TYPE]
+
+class CompiledLambda(plp.Lambda):
+  """
+    lambda whose body has already been compiled into a closure
+
+    it still carries its `ast` and `get_env` so `EVAL` and other engines can call it as any other lambda
+  """
+  def __init__(self, ast: PLPType, body: Compiled, scope: Scope, arity: int, outer: Optional[Frame], global_env: Env):
+    super().__init__(ast, self.get_frame_env, self.call)
+    self.body = body
+    self.scope = scope
+    self.arity = arity
+    self.outer = outer
+    self.global_env = global_env
+    self.padding: list[PLPType | Unset] = [UNSET] * arity
+    self.locals: list[PLPType | Unset] = [UNSET] * (len(scope.names) - arity)
+
+  def frame(self, args: list[PLPType | Unset]) -> Frame:
+    """
+      builds the frame of a call, the list of arguments is reused as its storage
+    """
+    if len(args) != self.arity:
+      # missing parameters stay unset and are looked up in the outer scopes, extra arguments are ignored (same as `Env`)
+      args = (args + self.padding)[:self.arity]
+    if self.locals:
+      args.extend(self.locals)
+    return Frame(args, self.outer)
+
+  def get_frame_env(self, args: list[PLPType]) -> Env:
+    return FrameEnv(self.frame(args), self.scope, self.global_env) # type: ignore
+
+  def call(self, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+    return run(self.body(self.frame(args))) # type: ignore
+
+  def step(self, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+    return self.body(self.frame(args)) # type: ignore
+
+def run(result: EVAL_RETURN_TYPE) -> EVAL_RETURN_TYPE:
+  while type(result) is TailCall:
+    function = result.function
+    if type(function) is CompiledLambda:
+      result = function.body(function.frame(result.args)) # type: ignore
+    elif function.invoke is not None:
+      return function.invoke(result.args)
+    else:
+      # lambda created by `EVAL` (e.g. in the prelude)
+      return EVAL(function.ast, function.get_env(result.args))
+  return result
+
+def evaluate(ast: PLPType, env: Env) -> EVAL_RETURN_TYPE:
+  """
+    compiles and runs a top-level form, `env` is the global environment
+
+    python's recursion limit is raised to `RECURSION_LIMIT` while it runs, calls between closures don't use the C stack
+  """
+  limit = sys.getrecursionlimit()
+  if limit >= RECURSION_LIMIT:
+    return analyze(ast, None, env)(None)
+  sys.setrecursionlimit(RECURSION_LIMIT)
+  try:
+    return analyze(ast, None, env)(None)
+  finally:
+    sys.setrecursionlimit(limit)
+
+def collect_defines(ast: PLPType, names: list[plp.Symbol]) -> None:
+  """
+    appends symbols that `ast` defines into the frame it is evaluated in
+
+    forms creating their own frame (`fn`, `let*`, `while`) and quoted data are skipped
+  """
+  match ast:
+    case plp.Vector():
+      for a in ast:
+        collect_defines(a, names)
+    case plp.HashMap():
+      for _, value in ast.items():
+        collect_defines(value, names)
+    case plp.List():
+      if len(ast) == 0:
+        return
+      operator = ast[0]
+      if isinstance(operator, plp.Symbol):
+        if operator in ("fn", "let*", "while", "quote"):
+          return
+        if operator == "define" and len(ast) == 3 and isinstance(ast[1], plp.Symbol):
+          if ast[1] not in names:
+            names.append(ast[1])
+      for a in ast:
+        collect_defines(a, names)
+    case _: pass
+
+def new_scope(names: list[plp.Symbol], exprs: list[PLPType], outer: Optional[Scope]) -> Scope:
+  names = list(names)
+  for expr in exprs:
+    collect_defines(expr, names)
+  return Scope(names, outer)
+
+def analyze(ast: PLPType, scope: Optional[Scope], global_env: Env, tail: bool = False) -> Compiled:
+  """
+    turns an AST into a closure taking the frame it runs in
+
+    `tail` marks forms in tail position of a lambda body, calls there return `TailCall` instead of recursing
+  """
+  match ast:
+    case plp.Symbol():
+      return analyze_symbol(ast, scope, global_env)
+    case plp.Vector():
+      items = [analyze(a, scope, global_env) for a in ast]
+      return lambda frame: plp.Vector([item(frame) for item in items])
+    case plp.HashMap():
+      keys = [key for key, _ in ast.items()]
+      values = [analyze(value, scope, global_env) for _, value in ast.items()]
+      def hash_map(frame: Optional[Frame]) -> plp.HashMap:
+        items: list[PLPType] = []
+        for key, value in zip(keys, values):
+          items.extend((key, value(frame)))
+        return plp.HashMap(items)
+      return hash_map
+    case plp.List():
+      if len(ast) == 0:
+        return lambda frame: ast
+      operator = ast[0]
+      args = ast[1:]
+      if isinstance(operator, plp.Symbol):
+        match operator:
+          case "define":
+            return analyze_define(args, scope, global_env)
+          case "do":
+            return analyze_do(args, scope, global_env, tail)
+          case "fn":
+            return analyze_fn(args, scope, global_env)
+          case "if":
+            return analyze_if(args, scope, global_env, tail)
+          case "let*":
+            return analyze_let(args, scope, global_env, tail)
+          case "while":
+            return analyze_while(args, scope, global_env)
+          case "quote":
+            return analyze_quote(args)
+          case "and" | "or":
+            return analyze_and_or(operator, args, scope, global_env, tail)
+          case "cond":
+            return analyze_cond(args, scope, global_env, tail)
+          case "profile":
+            return analyze_profile(args, scope, global_env)
+          case "bench":
+            return analyze_bench(args, scope, global_env)
+          case _: pass
+      return analyze_call(operator, args, scope, global_env, tail)
+    case _:
+      return lambda frame: ast
+
+def fail(exception: Exception) -> Compiled:
+  def raise_exception(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    # the traceback of the previous time it was raised would grow with every raise
+    raise exception.with_traceback(None)
+  return raise_exception
+
+def analyze_symbol(symbol: plp.Symbol, scope: Optional[Scope], global_env: Env) -> Compiled:
+  data = global_env.data
+  def global_value() -> EVAL_RETURN_TYPE:
+    value = data.get(symbol)
+    if value is None:
+      raise exceptions.UndefinedSymbolError(symbol)
+    return value
+
+  coordinates = scope.resolve(symbol) if scope is not None else []
+  if len(coordinates) == 0:
+    def lookup_global(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+      value = data.get(symbol)
+      if value is None:
+        raise exceptions.UndefinedSymbolError(symbol)
+      return value
+    return lookup_global
+
+  if len(coordinates) == 1 and coordinates[0][0] == 0:
+    index = coordinates[0][1]
+    def lookup_local(frame: Frame) -> EVAL_RETURN_TYPE:
+      value = frame.values[index]
+      if value is UNSET:
+        return global_value()
+      return value # type: ignore
+    return lookup_local # type: ignore
+
+  if len(coordinates) == 1 and coordinates[0][0] == 1:
+    index = coordinates[0][1]
+    def lookup_enclosing(frame: Frame) -> EVAL_RETURN_TYPE:
+      value = frame.outer.values[index] # type: ignore
+      if value is UNSET:
+        return global_value()
+      return value # type: ignore
+    return lookup_enclosing # type: ignore
+
+  def lookup(frame: Frame) -> EVAL_RETURN_TYPE:
+    for depth, index in coordinates:
+      outer = frame
+      for _ in range(depth):
+        outer = outer.outer # type: ignore
+      value = outer.values[index]
+      if value is not UNSET:
+        return value # type: ignore
+    return global_value()
+  return lookup # type: ignore
+
+def apply(operator: PLPType, function: EVAL_RETURN_TYPE, values: list[PLPType], tail: bool) -> EVAL_RETURN_TYPE:
+  if type(function) is FunctionType:
+    return function(*values)
+  elif isinstance(function, plp.Lambda):
+    if tail:
+      return TailCall(function, values)
+    if function.invoke is not None:
+      return function.invoke(values)
+    return EVAL(function.ast, function.get_env(values))
+  raise SyntaxError(f"'{operator}' is not a function; can't apply '{operator}' on given arguments")
+
+def analyze_call(operator: PLPType, args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  function_c = analyze(operator, scope, global_env)
+  args_c = [analyze(a, scope, global_env) for a in args]
+
+  # the most common arities get their own closure so evaluating the arguments doesn't need a loop,
+  # a compiled lambda called outside of a tail position runs its body right in the closure (`run` only unwinds what it returns),
+  # so every level of recursion costs python frames only for the call and the forms around it, not for `apply` and `call` too
+  match len(args_c):
+    case 1:
+      [a1] = args_c
+      def call(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+        function = function_c(frame)
+        if type(function) is FunctionType:
+          return function(a1(frame))
+        if type(function) is CompiledLambda and not tail:
+          return run(function.body(function.frame([a1(frame)])))
+        return apply(operator, function, [a1(frame)], tail)
+    case 2:
+      a1, a2 = args_c
+      def call(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+        function = function_c(frame)
+        if type(function) is FunctionType:
+          return function(a1(frame), a2(frame))
+        if type(function) is CompiledLambda and not tail:
+          return run(function.body(function.frame([a1(frame), a2(frame)])))
+        return apply(operator, function, [a1(frame), a2(frame)], tail)
+    case 3:
+      a1, a2, a3 = args_c
+      def call(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+        function = function_c(frame)
+        if type(function) is FunctionType:
+          return function(a1(frame), a2(frame), a3(frame))
+        if type(function) is CompiledLambda and not tail:
+          return run(function.body(function.frame([a1(frame), a2(frame), a3(frame)])))
+        return apply(operator, function, [a1(frame), a2(frame), a3(frame)], tail)
+    case _:
+      def call(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+        function = function_c(frame)
+        if type(function) is CompiledLambda and not tail:
+          return run(function.body(function.frame([a(frame) for a in args_c])))
+        return apply(operator, function, [a(frame) for a in args_c], tail)
+  return call
+
+def analyze_define(args: list[PLPType], scope: Optional[Scope], global_env: Env) -> Compiled:
+  if len(args) != 2:
+    return fail(SyntaxError(f"operator 'define' expects 2 arguments (got {len(args)})"))
+
+  key = args[0]
+  if isinstance(key, plp.Symbol):
+    value_c = analyze(args[1], scope, global_env)
+    if scope is None:
+      return lambda frame: global_env.set(key, value_c(frame))
+    index = scope.index[key]
+    def define(frame: Frame) -> EVAL_RETURN_TYPE:
+      value = frame.values[index] = value_c(frame)
+      return value
+    return define # type: ignore
+  elif isinstance(key, plp.Keyword):
+    return fail(SyntaxError(f"operator 'define' can't use keyword ':{key}'"))
+  else:
+    return fail(SyntaxError(f"operator 'define' can't redefine atom '{key}'"))
+
+def analyze_let(args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  if len(args) != 2:
+    return fail(SyntaxError(f"operator 'let*' expects 2 arguments (got {len(args)})"))
+
+  new_bindings = args[0]
+  if not isinstance(new_bindings, plp.List):
+    return fail(SyntaxError("operator 'let*' expects first paramater to be a list for bindings"))
+
+  keys: list[plp.Symbol] = []
+  exprs: list[PLPType] = []
+  for i in range(0, len(new_bindings) - 1, 2):
+    key = new_bindings[i]
+    if not isinstance(key, plp.Symbol):
+      break
+    keys.append(key)
+    exprs.append(new_bindings[i + 1])
+  let_scope = new_scope(keys, exprs + [args[1]], scope)
+
+  # a binding with a non-symbol key is kept as `None` so the error is raised only after the preceding bindings
+  bindings: list[tuple[int, Compiled] | None] = [(let_scope.index[key], analyze(expr, let_scope, global_env)) for key, expr in zip(keys, exprs)]
+  if len(keys) < (len(new_bindings) // 2):
+    bindings.append(None)
+  body_c = analyze(args[1], let_scope, global_env, tail)
+  size = len(let_scope.names)
+
+  def let(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    local_frame = Frame([UNSET] * size, frame)
+    for binding in bindings:
+      if binding is None:
+        raise SyntaxError("operator 'let*' expects odd bindings to be a symbol")
+      index, value_c = binding
+      local_frame.values[index] = value_c(local_frame)
+    return body_c(local_frame)
+  return let
+
+def analyze_do(args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  if len(args) == 0:
+    return fail(SyntaxError("operator 'do' expects at least 1 argument (got 0)"))
+
+  exprs_c = [analyze(expr, scope, global_env) for expr in args[:-1]]
+  last_c = analyze(args[-1], scope, global_env, tail)
+  def do(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    for expr_c in exprs_c:
+      expr_c(frame)
+    return last_c(frame)
+  return do
+
+def analyze_if(args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  if len(args) not in [2, 3]:
+    return fail(SyntaxError(f"operator 'if' expects either 2 or 3 arguments (got {len(args)})"))
+
+  condition_c = analyze(args[0], scope, global_env)
+  then_c = analyze(args[1], scope, global_env, tail)
+  else_c = analyze(args[2], scope, global_env, tail) if len(args) == 3 else lambda frame: plp.NIL
+  def if_(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    # inlined `plp.is_defined_or_true`
+    condition = condition_c(frame)
+    if condition is plp.NIL or condition is plp.FALSE:
+      return else_c(frame)
+    return then_c(frame)
+  return if_
+
+def analyze_and_or(operator: plp.Symbol, args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  if len(args) == 0:
+    empty = plp.TRUE if operator == "and" else plp.NIL
+    return lambda frame: empty
+
+  exprs_c = [analyze(expr, scope, global_env) for expr in args[:-1]]
+  last_c = analyze(args[-1], scope, global_env, tail)
+  if operator == "and":
+    def and_(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+      for expr_c in exprs_c:
+        value = expr_c(frame)
+        if value is plp.NIL or value is plp.FALSE:
+          return value
+      return last_c(frame)
+    return and_
+  def or_(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    for expr_c in exprs_c:
+      value = expr_c(frame)
+      if value is not plp.NIL and value is not plp.FALSE:
+        return value
+    return last_c(frame)
+  return or_
+
+def analyze_cond(args: list[PLPType], scope: Optional[Scope], global_env: Env, tail: bool) -> Compiled:
+  if len(args) % 2 != 0:
+    return fail(SyntaxError(f"operator 'cond' expects pairs of a condition and an expression (got {len(args)} arguments)"))
+
+  clauses = [(analyze(args[i], scope, global_env), analyze(args[i + 1], scope, global_env, tail)) for i in range(0, len(args), 2)]
+  # when no condition holds, `nil` is evaluated in place of the expression as `EVAL` does (and as a missing else of `if`)
+  otherwise_c = analyze(plp.NIL, scope, global_env)
+  def cond(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    for condition_c, expr_c in clauses:
+      condition = condition_c(frame)
+      if condition is not plp.NIL and condition is not plp.FALSE:
+        return expr_c(frame)
+    return otherwise_c(frame)
+  return cond
+
+def analyze_profile(args: list[PLPType], scope: Optional[Scope], global_env: Env) -> Compiled:
+  if len(args) not in [1, 2]:
+    return fail(SyntaxError(f"operator 'profile' expects either 1 or 2 arguments (got {len(args)})"))
+
+  expr_c = analyze(args[0], scope, global_env)
+  json_path_c = analyze(args[1], scope, global_env) if len(args) == 2 else None
+  def profile(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    json_path = json_path_c(frame) if json_path_c is not None else plp.NIL
+    return profiler.profile(global_env, lambda: expr_c(frame), json_path) # type: ignore
+  return profile
+
+def analyze_bench(args: list[PLPType], scope: Optional[Scope], global_env: Env) -> Compiled:
+  if len(args) == 0:
+    return fail(SyntaxError("operator 'bench' expects an expression to measure"))
+  try:
+    options = benchmark.options(args[1:])
+  except SyntaxError as e:
+    return fail(e)
+
+  expr_c = analyze(args[0], scope, global_env)
+  options_c = [analyze(option, scope, global_env) for option in options]
+  def bench(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    return benchmark.bench(lambda: expr_c(frame), *[option_c(frame) for option_c in options_c]) # type: ignore
+  return bench
+
+def analyze_fn(args: list[PLPType], scope: Optional[Scope], global_env: Env) -> Compiled:
+  if len(args) != 2:
+    return fail(SyntaxError(f"operator 'fn' expects 2 arguments (got {len(args)})"))
+
+  fn_args = args[0]
+  if not isinstance(fn_args, plp.List):
+    return fail(SyntaxError("operator 'fn' expects arguments to be in a list"))
+  for arg in fn_args:
+    if not isinstance(arg, plp.Symbol):
+      return fail(SyntaxError(f"opeartor 'fn' expects arguments to not be atoms; found: {arg}"))
+
+  body = args[1]
+  fn_scope = new_scope(fn_args, [body], scope) # type: ignore
+  body_c = analyze(body, fn_scope, global_env, True)
+  arity = len(fn_args)
+  return lambda frame: CompiledLambda(body, body_c, fn_scope, arity, frame, global_env)
+
+def analyze_while(args: list[PLPType], scope: Optional[Scope], global_env: Env) -> Compiled:
+  if len(args) < 2:
+    return fail(SyntaxError(f"operator 'while' expects at least 2 arguments (got {(len(args))})"))
+
+  while_scope = new_scope([], args, scope)
+  condition_c = analyze(args[0], while_scope, global_env)
+  body_c = [analyze(expr, while_scope, global_env) for expr in args[1:]]
+  size = len(while_scope.names)
+
+  # symbols defined inside the loop are written back only if they are already defined in the enclosing frame
+  if scope is None:
+    data = global_env.data
+    written_back_globals = list(while_scope.index.items())
+    def write_back(frame: Optional[Frame], values: list) -> None:
+      for key, i in written_back_globals:
+        if values[i] is not UNSET and key in data:
+          global_env.set(key, values[i])
+  else:
+    written_back = [(i, scope.index[key]) for key, i in while_scope.index.items() if key in scope.index]
+    def write_back(frame: Optional[Frame], values: list) -> None:
+      for i, outer_i in written_back:
+        if values[i] is not UNSET and frame.values[outer_i] is not UNSET: # type: ignore
+          frame.values[outer_i] = values[i] # type: ignore
+
+  def while_(frame: Optional[Frame]) -> EVAL_RETURN_TYPE:
+    while_frame = Frame([UNSET] * size, frame)
+    while True:
+      condition = condition_c(while_frame)
+      if condition is plp.NIL or condition is plp.FALSE:
+        break
+      for expr_c in body_c:
+        expr_c(while_frame)
+    write_back(frame, while_frame.values)
+    return plp.NIL
+  return while_
+
+def analyze_quote(args: list[PLPType]) -> Compiled:
+  if len(args) == 0:
+    return fail(IndexError("list index out of range"))
+  quoted = args[0]
+  return lambda frame: quoted
@@ -1,15 +1,18 @@
-from .plp_types import Float, Integer, ATOMS, String, py_to_plp_type, Null, PLPType, List, Boolean, HashMap, Vector, Symbol, Lambda
+from .plp_types import Float, Integer, ATOMS, String, is_defined_or_true, Null, NIL, TRUE, FALSE, PLPType, List, Boolean, HashMap, Vector, Symbol, Lambda, PersistentList, ListView, LazySeq, NumVector, Keyword
 from .helper import are_numbers, are_strings, create_relative_path_for_file
 from typing import Union, Callable, Any
-import copy
+import lib.ast_cache as ast_cache
 import lib.exceptions as exceptions
+import lib.memo as memo
+import lib.numeric as numeric
 import lib.printer as printer
-import lib.reader as reader
+import itertools
 import math
+import os
 import time
 
 Number = Integer | Float
-Sequence = List | Vector
+Sequence = List | Vector | PersistentList | ListView | LazySeq | NumVector
 
 def check_enough_arguments(args_num: int, *args: PLPType) -> None:
   """
@@ -35,11 +38,14 @@ def plus_sign(*items: ATOMS) -> Union[String, Integer, Float]:
     - `(+ 3.0 7)` -> `10`
     - `(+ "hello" " world")` -> `"hello world"`
     - `(+ "hello" 123)` -> error
+    - `(+ (num-vec [1 2]) 10)` -> `#num[11 12]`
   """
   if are_numbers(*items):
-    return py_to_plp_type(sum(items)) # type: ignore
+    return sum(items) # type: ignore
   if are_strings(*items):
     return String("".join(items)) # type: ignore
+  if any(isinstance(a, NumVector) for a in items):
+    return numeric.fold("+", items)
   raise TypeError("+")
 
 def number_subtraction(*items: ATOMS) -> Union[Integer, Float]:
@@ -52,10 +58,14 @@ def number_subtraction(*items: ATOMS) -> Union[Integer, Float]:
     - `(- 10 5)` -> `5`
     - `(- 10.0 5)` -> `5.0`
     - `(- 1.23 1)` -> `0.23`
+    - `(- (num-vec [5 6]) (num-vec [1 2]))` -> `#num[4 4]`
   """
   if are_numbers(*items):
     check_enough_arguments(2, *items)
-    return py_to_plp_type(items[0] - items[1]) # type: ignore
+    return items[0] - items[1] # type: ignore
+  if any(isinstance(a, NumVector) for a in items):
+    check_enough_arguments(2, *items)
+    return numeric.elementwise("-", items[0], items[1])
   raise TypeError("-")
 
 def asterisk_sign(*items: ATOMS) -> Union[String, Integer, Float]:
@@ -71,9 +81,11 @@ def asterisk_sign(*items: ATOMS) -> Union[String, Integer, Float]:
     - `(* 0 "hello world")` -> `""`
   """
   if are_numbers(*items):
-    return py_to_plp_type(math.prod(items)) # type: ignore
+    return math.prod(items) # type: ignore
   elif len(items) == 2 and isinstance(items[0], Integer) and isinstance(items[1], String):
     return String(items[0] * items[1])
+  elif any(isinstance(a, NumVector) for a in items):
+    return numeric.fold("*", items)
   raise TypeError("*")
 
 def division_sign(*items: ATOMS) -> Float:
@@ -89,20 +101,62 @@ def division_sign(*items: ATOMS) -> Float:
     if items[1] == 0:
       raise ZeroDivisionError
     # items are either integer or float in this case
-    return Float(items[0] / items[1]) # type: ignore
+    return items[0] / items[1] # type: ignore
+  if any(isinstance(a, NumVector) for a in items):
+    check_enough_arguments(2, *items)
+    return numeric.elementwise("/", items[0], items[1])
   raise TypeError("/")
 
 def modulo_sign(a: Integer, b: Integer) -> Integer:
   """
     wrapper for the python `%` operator
     
-    takes 2 integers, returns `a % b`
+    takes 2 integers, returns `a % b`, the result is always an integer (for floats its fractional part is dropped)
     
     @examples
     - `(% 100 4)` -> `0`
     - `(% 4 17)` -> `4`
+    - `(% 7.5 2)` -> `1`
+  """
+  return int(a % b)
+
+def power(a: Number, b: Integer) -> Number:
   """
-  return Integer(a % b)
+    raises `a` to the power of a non-negative integer `b` by repeated multiplication (`*`), so it works on numeric vectors too
+
+    @examples
+    - `(** 2 10)` -> `1024`
+    - `(** 1.5 2)` -> `2.25`
+    - `(** 7 0)` -> `1`
+  """
+  if type(b) is not int or b < 0:
+    raise ValueError(f"'**' expects a non-negative integer exponent (got {printer.format(b)})")
+  if b == 1:
+    return a
+  if b == 0:
+    return 1
+  if type(a) is int:
+    return a ** b
+  # multiplied from the right, the same order as `(* a (** a (- b 1)))`, so floats are rounded the same way
+  result = a
+  for _ in range(b - 1):
+    result = asterisk_sign(a, result) # type: ignore
+  return result
+
+def floor_division(a: Number, b: Number) -> Integer:
+  """
+    divides `a` by `b` and rounds the result down, same as `(floor (/ a b))`
+
+    two integers are divided exactly, without going through a float
+
+    @examples
+    - `(// 7 2)` -> `3`
+    - `(// -7 2)` -> `-4`
+    - `(// 7.5 2)` -> `3`
+  """
+  if type(a) is int and type(b) is int and b != 0:
+    return a // b
+  return floor(division_sign(a, b)) # type: ignore
 
 def pr_str(*args: PLPType) -> String:
   """
@@ -137,7 +191,7 @@ def prn(*args: PLPType) -> Null:
     - `(prn (list 1 4 2) "hello world" (do (+ 10 20)))` -> `nil` (but prints out `(1 4 2) "hello world" 30`)
   """
   print(printer.format_sequence([arg for arg in args]))
-  return Null()
+  return NIL
 
 def println(*args: PLPType) -> Null:
   """
@@ -150,7 +204,7 @@ def println(*args: PLPType) -> Null:
     - `(println (list 1 4 2) "hello world" (do (+ 10 20)))` -> `nil` (but prints out `(1 4 2) hello world 30`)
   """
   print(printer.format_sequence([arg for arg in args], " ", False))
-  return Null()
+  return NIL
 
 # endless arguments, groups them to a list that is then returned
 def to_list(*args: PLPType) -> List:
@@ -184,9 +238,9 @@ def count_items(sequence: PLPType) -> Integer:
     - `(count)` -> error
     - `(count "hello world")` -> 0
   """
-  if isinstance(sequence, (List, Vector)):
-    return Integer(len(sequence))
-  return Integer(0)
+  if isinstance(sequence, Sequence):
+    return len(sequence)
+  return 0
   
 def eq(arg1: PLPType, arg2: PLPType) -> Boolean:
   """
@@ -197,13 +251,16 @@ def eq(arg1: PLPType, arg2: PLPType) -> Boolean:
     - `(= 5 (+ 3 2))` -> `true`
     - `(= {a (list 1 2 3) b "foo"} {a [1 2 3] b "foo"})` -> `false`
   """
+  if type(arg1) is int or type(arg1) is float:
+    return TRUE if type(arg1) is type(arg2) and arg1 == arg2 else FALSE
+
   if isinstance(arg1, Null) and isinstance(arg2, Null):
-    return Boolean(True)
+    return TRUE
 
-  if isinstance(arg1, (List, Vector)) and isinstance(arg2, (List, Vector)):
-    return Boolean(len(arg1) == len(arg2) and all(eq(a, b) for a, b in zip(arg1, arg2)))
+  if isinstance(arg1, Sequence) and isinstance(arg2, Sequence):
+    return TRUE if len(arg1) == len(arg2) and all(eq(a, b) for a, b in zip(arg1, arg2)) else FALSE
 
-  return Boolean(arg1 == arg2 and type(arg1) is type(arg2))
+  return TRUE if arg1 == arg2 and type(arg1) is type(arg2) else FALSE
 
 def less_than(a: Number, b: Number) -> Boolean:
   """
@@ -212,7 +269,9 @@ def less_than(a: Number, b: Number) -> Boolean:
     @example
     - `(< 10 10)` -> `false`
   """
-  return Boolean(a < b)
+  if type(a) is NumVector or type(b) is NumVector:
+    return numeric.elementwise("<", a, b) # type: ignore
+  return TRUE if a < b else FALSE
 
 def less_than_or_equal(a: Number, b: Number) -> Boolean:
   """
@@ -221,7 +280,9 @@ def less_than_or_equal(a: Number, b: Number) -> Boolean:
     @example
     - `(<= 10 10)` -> `true`
   """
-  return Boolean(a <= b)
+  if type(a) is NumVector or type(b) is NumVector:
+    return numeric.elementwise("<=", a, b) # type: ignore
+  return TRUE if a <= b else FALSE
 
 def greater_than(a: Number, b: Number) -> Boolean:
   """
@@ -230,7 +291,9 @@ def greater_than(a: Number, b: Number) -> Boolean:
     @example
     - `(> 4 5)` -> `false`  
   """
-  return Boolean(a > b)
+  if type(a) is NumVector or type(b) is NumVector:
+    return numeric.elementwise(">", a, b) # type: ignore
+  return TRUE if a > b else FALSE
 
 def greater_than_or_equal(a: Number, b: Number) -> Boolean:
   """
@@ -239,7 +302,9 @@ def greater_than_or_equal(a: Number, b: Number) -> Boolean:
     @example
     - `(>= 10 5)` -> `true`
   """
-  return Boolean(a >= b)
+  if type(a) is NumVector or type(b) is NumVector:
+    return numeric.elementwise(">=", a, b) # type: ignore
+  return TRUE if a >= b else FALSE
 
 def slurp(file_name: String) -> String:
   """
@@ -255,7 +320,25 @@ def slurp(file_name: String) -> String:
   file.close()
   return String(contents)
 
-def prepend(new_el: PLPType, given_list: Sequence) -> List:
+def read_lines(file_name: String) -> LazySeq:
+  """
+    returns lines of a file (without line endings) as a lazy list
+    
+    the file is read only as far as the lines are needed and again every time the list is walked through
+    
+    @example
+    - `(first (read-lines "tests/slurp.txt"))` -> `"hello world!"`
+  """
+  file_path = create_relative_path_for_file(file_name)
+  # fail right away if the file doesn't exist
+  os.stat(file_path)
+  def lines():
+    with open(file_path) as file:
+      for line in file:
+        yield String(line.rstrip("\n"))
+  return LazySeq(lines)
+
+def prepend(new_el: PLPType, given_list: Sequence) -> PersistentList:
   """
     returns a list where a given element is prepended to the given list
         
@@ -266,11 +349,9 @@ def prepend(new_el: PLPType, given_list: Sequence) -> List:
     @example
     - `(prepend (list 1 2 3) [4])` -> `((1 2 3) 4)`
   """
-  copied_list = copy.deepcopy(given_list)
-  copied_list.insert(0, new_el)
-  return List(copied_list)
+  return PersistentList.of(given_list).prepend(new_el)
 
-def append(new_el: PLPType, given_list: Sequence) -> List:
+def append(new_el: PLPType, given_list: Sequence) -> PersistentList:
   """
     returns a list where a given element is appended to the given list
         
@@ -281,14 +362,14 @@ def append(new_el: PLPType, given_list: Sequence) -> List:
     @example
     - `(append (list 1 2 3) [4])` -> `(4 (1 2 3))`
   """
-  copied_list = copy.deepcopy(given_list)
-  copied_list.append(new_el)
-  return List(copied_list)
+  return PersistentList.of(given_list).append(new_el)
 
-def concat(*given_lists: list[Sequence]) -> List:
+def concat(*given_lists: list[Sequence]) -> Sequence:
   """
     returns list that is a concanation of all given lists
     
+    if any of them is lazy, so is the result
+    
     if zero lists ares given, returns empty list
   
     @params (optional)
@@ -298,6 +379,10 @@ def concat(*given_lists: list[Sequence]) -> List:
     - `(concat (list 3 9 1) (list "hi" (do (define a 8) a)) [])` -> `(3 9 1 "hi" 8)`
     - `(concat)` -> `()`
   """
+  if any(isinstance(given_list, LazySeq) for given_list in given_lists):
+    lengths = [given_list.length if isinstance(given_list, LazySeq) else len(given_list) for given_list in given_lists]
+    length = None if None in lengths else sum(lengths) # type: ignore
+    return LazySeq(lambda: itertools.chain.from_iterable(given_lists), length) # type: ignore
   concanated_lists = List([])
   for given_list in given_lists:
     concanated_lists.extend(given_list)
@@ -351,8 +436,10 @@ def first(sequence: Sequence):
     @example
     - `(first (list 1 2 3))` -> `1`
   """
+  if isinstance(sequence, LazySeq):
+    return NIL if sequence.is_empty() else sequence[0]
   if len(sequence) == 0:
-    return Null()
+    return NIL
   return sequence[0]
 
 def last(sequence: Sequence):
@@ -367,13 +454,19 @@ def last(sequence: Sequence):
     @example
     - `(last [1 2 (do (define a (- 10 13)) a)])` -> `-3`
   """
+  if isinstance(sequence, LazySeq) and sequence.item is None:
+    # walks the items without keeping them around
+    last_item: PLPType = NIL
+    for last_item in sequence:
+      pass
+    return last_item
   if len(sequence) == 0:
-    return Null()
+    return NIL
   return sequence[len(sequence) - 1]
 
 def splice(starting_index: Integer, ending_index: Integer, sequence: Sequence) -> Sequence:
   """
-    reduces a sequence to given bounds, always returns a list
+    reduces a sequence to given bounds, always returns a list (a view of the given sequence, nothing is copied)
     
     if bounds overlap, raises an exception
     
@@ -394,11 +487,15 @@ def splice(starting_index: Integer, ending_index: Integer, sequence: Sequence) -
   ending_rescaled = ending_index if ending_index > 0 else len(sequence) + ending_index
   if starting_index > ending_rescaled or starting_index < 0 or (ending_rescaled >= len(sequence) and ending_rescaled != 0):
     raise SyntaxError("can't splice given sequence (out of bounds)")
+  if isinstance(sequence, LazySeq):
+    return sequence.slice(starting_index, ending_index)
+  if isinstance(sequence, Sequence):
+    return ListView.of(sequence, starting_index, ending_index)
   return List(sequence[starting_index:ending_index])
 
-def take(length: Integer, sequence: Sequence) -> List:
+def take(length: Integer, sequence: Sequence) -> Sequence:
   """
-    returns a list containing the first n elements of given sequence where n is the provided length
+    returns a list containing the first n elements of given sequence where n is the provided length (a view, nothing is copied)
     
     if length zero, zeturns empty sequence
     
@@ -410,8 +507,32 @@ def take(length: Integer, sequence: Sequence) -> List:
     - `(take 2 (list 1 2 3 4 5))` -> `(1 2)`
     - `(take 3 [1 2 3 4 5 6])` -> `(1 2 3)`
   """
+  if isinstance(sequence, LazySeq):
+    return sequence.slice(0, length)
+  if isinstance(sequence, Sequence):
+    return ListView.of(sequence, 0, length)
   return List(sequence[:length])
 
+def rest(sequence: Sequence) -> Sequence:
+  """
+    returns a list of all elements of given sequence but the first one (a view, nothing is copied)
+    
+    if sequence is empty, returns empty list
+    
+    @params
+    - `sequence`
+    
+    @examples
+    - `(rest (list 1 2 3))` -> `(2 3)`
+    - `(rest [1])` -> `()`
+    - `(rest ())` -> `()`
+  """
+  if isinstance(sequence, LazySeq):
+    return sequence.slice(1, None)
+  if isinstance(sequence, Sequence):
+    return ListView.of(sequence, 1, len(sequence))
+  return List(sequence[1:])
+
 def split_string(separator: String, string: String) -> List:
   """
     splits string with provided separator into a list
@@ -431,11 +552,24 @@ def split_string(separator: String, string: String) -> List:
     result = string.split(separator)
   return List(map(lambda x: String(x), result))
 
-def create_range(start: Integer, end: Integer, step: Integer = Integer(1)) -> List:
+def string_length(string: String) -> Integer:
+  """
+    returns the number of characters of a string
+
+    @examples
+    - `(length "hello")` -> `5`
+    - `(length "")` -> `0`
+  """
+  if isinstance(string, str):
+    return len(string)
+  # anything else is split into items first, the same as `(count (split "" string))`
+  return count_items(split_string(String(""), string))
+
+def create_range(start: Integer, end: Integer, step: Integer = 1) -> LazySeq:
   """
   wrapper for python range()
   
-  returns a list
+  returns a lazy list, its numbers are created only once they are needed
   
   @params
   - `start`: included
@@ -447,7 +581,8 @@ def create_range(start: Integer, end: Integer, step: Integer = Integer(1)) -> Li
   - `(range 3 9 2)` -> `(3 5 7)`
   - `(range 11 7)` -> `()`
   """
-  return List(map(lambda x: Integer(x), range(start, end, step)))
+  numbers = range(start, end, step)
+  return LazySeq(lambda: iter(numbers), len(numbers), numbers.__getitem__)
 
 def is_list(*args: PLPType) -> Boolean:
   """
@@ -457,11 +592,11 @@ def is_list(*args: PLPType) -> Boolean:
     - `(list? 4 (list 1 2 34))` -> `false`
     - `(list? () (list 4 1 ))` -> `true`
   """
-  if len(args) == 0: return Boolean(False)
+  if len(args) == 0: return FALSE
   for arg in args:
-    if not isinstance(arg, List):
-      return Boolean(False)
-  return Boolean(True)
+    if not isinstance(arg, (List, PersistentList, ListView, LazySeq)):
+      return FALSE
+  return TRUE
 
 def is_sequence_empty(*args: PLPType) -> Boolean:
   """
@@ -471,39 +606,43 @@ def is_sequence_empty(*args: PLPType) -> Boolean:
   """
   check_enough_arguments(1, *args)
   seq = args[0]
-  if isinstance(seq, (List, Vector)):
-    return Boolean(len(seq) == 0)
-  elif isinstance(seq, HashMap):
-    return Boolean(len(seq.map) == 0)
+  if isinstance(seq, LazySeq):
+    return TRUE if seq.is_empty() else FALSE
+  if isinstance(seq, (Sequence, HashMap)):
+    return TRUE if len(seq) == 0 else FALSE
   # BUG: should probably be handled better
   #      instead of returning false, alarm the user that the function cant be used on this type
-  return Boolean(False)
+  return FALSE
 
 """
   i think these functions speak for themselves
 """
 def is_symbol(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Symbol))
+  return TRUE if isinstance(expr, Symbol) else FALSE
 def is_nil(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Null))
+  return TRUE if expr is NIL else FALSE
 def is_string(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, String))
+  return TRUE if isinstance(expr, String) else FALSE
 def is_true(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Boolean) and expr == Boolean(True))
+  return TRUE if expr is TRUE else FALSE
+def negation(expr: Any) -> Boolean:
+  return FALSE if expr is not NIL and expr is not FALSE else TRUE
 def is_false(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Boolean) and expr == Boolean(False))
+  return TRUE if expr is FALSE else FALSE
 def is_number(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, (Integer, Float)))
+  return TRUE if isinstance(expr, (Integer, Float)) else FALSE
 def is_int(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Integer))
+  return TRUE if isinstance(expr, Integer) else FALSE
 def is_float(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Float))
+  return TRUE if isinstance(expr, Float) else FALSE
 def is_function(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, (type(lambda: None), Lambda)))
+  return TRUE if isinstance(expr, (type(lambda: None), Lambda)) else FALSE
 def is_hashmap(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, HashMap))
+  return TRUE if isinstance(expr, HashMap) else FALSE
 def is_sequence(expr: Any) -> Boolean:
-  return Boolean(isinstance(expr, Sequence))
+  return TRUE if isinstance(expr, Sequence) else FALSE
+def is_num_vec(expr: Any) -> Boolean:
+  return TRUE if isinstance(expr, NumVector) else FALSE
 
 def create_hashmap(*args: PLPType) -> HashMap:
   """
@@ -538,9 +677,9 @@ def assoc(hashmap: HashMap, *args: PLPType) -> HashMap:
         - `(assoc a "foo" "bar")` -> `{"hello" "world" "foo" "bar"}`
         - `a` stays `{"hello" "world"}`
   """
-  new_hashmap = copy.deepcopy(hashmap)
+  new_hashmap = hashmap
   for i in range(0, len(args) -1, 2):
-    new_hashmap.update(args[i], args[i + 1]) # type: ignore
+    new_hashmap = new_hashmap.assoc(args[i], args[i + 1]) # type: ignore
   return new_hashmap
   
 def dissoc(hashmap: HashMap, *keys: ATOMS) -> HashMap:
@@ -558,9 +697,9 @@ def dissoc(hashmap: HashMap, *keys: ATOMS) -> HashMap:
   - `(dissoc {"hello" "world" 1 2} "foo" 1)` -> `{"hello" "world"}`
   - `(dissoc {"some" "hashmap"})` -> `{"some" "hashmap"}`
   """
-  new_hashmap = copy.deepcopy(hashmap)
+  new_hashmap = hashmap
   for key in keys:
-    new_hashmap.remove(key)
+    new_hashmap = new_hashmap.dissoc(key)
   return new_hashmap
 
 def is_in_hashmap(key: ATOMS, hashmap: HashMap) -> Boolean:
@@ -571,7 +710,7 @@ def is_in_hashmap(key: ATOMS, hashmap: HashMap) -> Boolean:
     - `(contains? 1 {1 2 3 4})` -> `true`
     - `(contains? 4 {3 4})` -> `false`
   """
-  return Boolean(key in hashmap.map)
+  return TRUE if key in hashmap else FALSE
 
 def get_from_hashmap(key: ATOMS, hashmap: HashMap) -> PLPType:
   """
@@ -581,7 +720,7 @@ def get_from_hashmap(key: ATOMS, hashmap: HashMap) -> PLPType:
     - `(get 1 {1 2 3 4})` -> `2`
     - `(get 2 {1 2 3 4})` -> `nil`
   """
-  return hashmap.map.get(key, Null())
+  return hashmap.get(key, NIL)
 
 def get_hashmap_keys(hashmap: HashMap) -> List:
   """
@@ -591,7 +730,7 @@ def get_hashmap_keys(hashmap: HashMap) -> List:
     - `(keys {1 2 3 4})` -> `(1 3)`
     - `(keys {})` -> `()` 
   """
-  return List(hashmap.map.keys())
+  return List(hashmap.keys())
   
 def get_hashmap_vals(hashmap: HashMap) -> List:
   """
@@ -601,13 +740,22 @@ def get_hashmap_vals(hashmap: HashMap) -> List:
     - `(vals {1 2 3 4})` -> `(2 4)`
     - `(vals {})` -> `()`
   """
-  return List(hashmap.map.values())
+  return List(hashmap.values())
 
 def get_current_time() -> Integer:
   """
     returns elapsed time since the epoch in nanoseconds
   """
-  return Integer(time.time_ns())
+  return time.time_ns()
+
+def get_current_time_ms() -> Integer:
+  """
+    returns elapsed time since the epoch in milliseconds
+  """
+  return time.time_ns() // 1000000
+
+# numbers are python's own types, they are reported under their PLP names
+TYPE_NAMES = {int: "Integer", float: "Float"}
 
 def get_type(expr: Any) -> String:
   """
@@ -617,7 +765,9 @@ def get_type(expr: Any) -> String:
     - `(type (list 1 2 3))` -> `"List"`
     - `(type (time-ms))` -> `"Integer"`
   """
-  return String(type(expr).__name__)
+  if isinstance(expr, (PersistentList, ListView, LazySeq)):
+    return String("List")
+  return String(TYPE_NAMES.get(type(expr), type(expr).__name__))
   
 def floor(num: Number) -> Integer:
   """
@@ -627,7 +777,7 @@ def floor(num: Number) -> Integer:
     - `(floor 8.4231)` -> `8`
     - `(floor 10)` -> `10`
   """
-  return Integer(math.floor(num))
+  return math.floor(num)
 
 def join(separator: String, seq: Sequence) -> String:
   """
@@ -643,6 +793,195 @@ def join(separator: String, seq: Sequence) -> String:
   """
   return String(separator.join(do_str(a) for a in seq))
 
+def num_vec(sequence: Sequence) -> NumVector:
+  """
+    packs a sequence of numbers into a numeric vector, its items are stored unboxed in one array
+    
+    arithmetic (`+ - * /`) and comparisons on numeric vectors work item by item, a number is combined with every item
+    and comparisons return `1` where they hold and `0` elsewhere, `vec` turns it back into an ordinary vector
+    
+    integers have 64 bits, an integer result that doesn't fit gives an ordinary vector of the exact results
+    
+    @examples
+    - `(num-vec [1 2 3])` -> `#num[1 2 3]`
+    - `(num-vec (list 1 2.5))` -> `#num[1.0 2.5]`
+    - `(* (num-vec [1 2 3]) (num-vec [4 5 6]))` -> `#num[4 10 18]`
+    - `(< (num-vec [1 5 2]) 3)` -> `#num[1 0 1]`
+    - `(num-vec ["hello"])` -> error
+    - `(num-vec [9223372036854775808])` -> error
+  """
+  return numeric.from_sequence(sequence)
+
+def sum_items(sequence: Sequence) -> Number:
+  """
+    returns the sum of a sequence of numbers
+    
+    @examples
+    - `(sum [1 2 3])` -> `6`
+    - `(sum (num-vec [1.5 2]))` -> `3.5`
+    - `(sum [])` -> `0`
+  """
+  return numeric.total(sequence) # type: ignore
+
+def min_item(sequence: Sequence) -> Number:
+  """
+    returns the smallest number of a non-empty sequence
+    
+    @examples
+    - `(min [3 1 2])` -> `1`
+  """
+  return numeric.minimum(sequence) # type: ignore
+
+def max_item(sequence: Sequence) -> Number:
+  """
+    returns the largest number of a non-empty sequence
+    
+    @examples
+    - `(max (num-vec [3 1 2]))` -> `3`
+  """
+  return numeric.maximum(sequence) # type: ignore
+
+def dot_product(a: Sequence, b: Sequence) -> Number:
+  """
+    returns the dot product of two sequences of numbers of the same length
+    
+    @examples
+    - `(dot [1 2 3] (num-vec [4 5 6]))` -> `32`
+  """
+  return numeric.dot(a, b) # type: ignore
+
+def map_items(function: Callable[..., PLPType], *sequences: Sequence) -> Sequence:
+  """
+    calls the function with items of the sequences at the same positions and returns a list of the results
+    
+    stops at the end of the shortest sequence, if any of the sequences is lazy, so is the result
+    
+    @params
+    - `function`: builtin or lambda taking as many arguments as there are sequences
+    - `sequences`
+    
+    @examples
+    - `(map (fn (x) (* x x)) [1 2 3])` -> `(1 4 9)`
+    - `(map + (list 1 2 3) [10 20])` -> `(11 22)`
+  """
+  if any(isinstance(sequence, LazySeq) for sequence in sequences):
+    def items():
+      call = evaluator.caller(function)
+      for args in zip(*sequences):
+        yield call(list(args))
+    return LazySeq(items)
+  call = evaluator.caller(function)
+  return List([call(list(args)) for args in zip(*sequences)])
+
+def filter_items(predicate: Callable[..., PLPType], sequence: Sequence) -> Sequence:
+  """
+    returns a list of the items of the sequence for which the predicate returns neither `false` nor `nil`
+    
+    if the sequence is lazy, so is the result
+    
+    @examples
+    - `(filter (fn (x) (> x 2)) [1 2 3 4])` -> `(3 4)`
+    - `(filter nil? (list 1 nil 2))` -> `(nil)`
+  """
+  if isinstance(sequence, LazySeq):
+    def items():
+      call = evaluator.caller(predicate)
+      for item in sequence:
+        if is_defined_or_true(call([item])):
+          yield item
+    return LazySeq(items)
+  call = evaluator.caller(predicate)
+  return List([item for item in sequence if is_defined_or_true(call([item]))])
+
+def reduce_items(function: Callable[..., PLPType], *args: PLPType) -> PLPType:
+  """
+    combines the items of a sequence from left to right using a function of two arguments
+    
+    the initial value is optional, without it the first item is used (and an empty sequence calls the function without arguments)
+    
+    @params
+    - `function`
+    - `initial` (optional)
+    - `sequence`
+    
+    @examples
+    - `(reduce + 0 [1 2 3])` -> `6`
+    - `(reduce (fn (acc x) (append x acc)) () (range 0 3))` -> `(0 1 2)`
+    - `(reduce * (list 1 2 3 4))` -> `24`
+  """
+  if len(args) not in [1, 2]:
+    raise exceptions.ArgumentCountError(f"operation 'reduce' expects 2 or 3 arguments (got {len(args) + 1})")
+  sequence: Any = args[-1]
+  items = iter(sequence)
+  if len(args) == 2:
+    result = args[0]
+  else:
+    result = next(items, None)
+    if result is None:
+      return evaluator.call_function(function, [])
+  call = evaluator.caller(function)
+  for item in items:
+    result = call([result, item])
+  return result
+
+def apply_function(function: Callable[..., PLPType], *args: PLPType) -> PLPType:
+  """
+    calls the function with the given arguments followed by all items of the last argument (a sequence)
+    
+    @examples
+    - `(apply + [1 2 3])` -> `6`
+    - `(apply str "a" "b" (list "c" "d"))` -> `"abcd"`
+  """
+  if len(args) == 0:
+    raise exceptions.ArgumentCountError("operation 'apply' expects at least 2 arguments (got 1)")
+  return evaluator.call_function(function, list(args[:-1]) + list(args[-1])) # type: ignore
+
+def memoize(function: Callable[..., PLPType], *options: PLPType) -> Callable[..., PLPType]:
+  """
+    returns a function that gives the same results as the given one, but remembers them for arguments it was called with before
+
+    arguments are compared by their structure (numbers, strings, keywords, lists, vectors and hashmaps),
+    calls with anything else (e.g. a function) as an argument are not cached
+
+    to make recursive calls go through the cache too, define the memoized function under the original name
+
+    @params
+    - `function`: builtin or lambda
+    - `:max-size n` (optional): the least recently used results are thrown away once there are more than `n` of them (`1024` by default, `nil` for no limit)
+    - `:ttl ms` (optional): results expire after `ms` milliseconds
+
+    @examples
+    - `(define slow-fibonacci (memoize slow-fibonacci))` -> `#<function 'memoized'>`
+    - `(memoize + :max-size 2 :ttl 1000)` -> `#<function 'memoized'>`
+  """
+  if not isinstance(function, (Lambda, type(lambda: None))):
+    raise TypeError(f"'memoize' expects a function (got {printer.format(function)})")
+  if len(options) % 2 != 0:
+    raise SyntaxError("'memoize' expects options in pairs of a keyword and a value")
+  max_size: Any = 1024
+  ttl: Any = None
+  for option, value in zip(options[0::2], options[1::2]):
+    if option is Keyword("max-size") and (value is NIL or (type(value) is int and value > 0)):
+      max_size = None if value is NIL else value
+    elif option is Keyword("ttl") and type(value) in (int, float) and value > 0:
+      ttl = value / 1000
+    else:
+      raise ValueError(f"'memoize' got an invalid option {printer.format(option)} {printer.format(value)}")
+  # not `evaluator.caller`, its reused environment would be overwritten by recursive calls going through the cache
+  return memo.memoize(function, evaluator.call_function, memo.Cache(max_size, ttl))
+
+def cache_stats(function: Callable[..., PLPType]) -> HashMap:
+  """
+    returns numbers of cache hits, misses, evictions (of the least recently used results) and expirations of a memoized function
+
+    @examples
+    - `(cache-stats (memoize +))` -> `{:hits 0 :misses 0 :evictions 0 :expirations 0 :size 0 :max-size 1024}`
+  """
+  cache = getattr(function, "cache", None)
+  if not isinstance(cache, memo.Cache):
+    raise TypeError(f"'cache-stats' expects a function returned by 'memoize' (got {printer.format(function)})")
+  return cache.stats()
+
 # TODO: figure out how to efficiently check for required number of arguments in a function
 ns: dict[str, Callable[..., PLPType]] = {
   "+": plus_sign,
@@ -650,19 +989,25 @@ ns: dict[str, Callable[..., PLPType]] = {
   "*": asterisk_sign,
   "/": division_sign,
   "%": modulo_sign,
+  "**": power,
+  "//": floor_division,
   "=": eq,
   ">=": greater_than_or_equal,
   ">": greater_than,
   "<=": less_than_or_equal,
   "<": less_than,
   "append": append,
+  "apply": apply_function,
   "assoc": assoc,
+  "cache-stats": cache_stats,
   "dissoc": dissoc,
+  "dot": dot_product,
   "concat": concat,
   "contains?": is_in_hashmap,
   "count": count_items,
   "empty?": is_sequence_empty,
   "false?": is_false,
+  "filter": filter_items,
   "first": first,
   "float?": is_float,
   "floor": floor,
@@ -674,29 +1019,45 @@ ns: dict[str, Callable[..., PLPType]] = {
   "join": join,
   "keys": get_hashmap_keys,
   "last": last,
+  "length": string_length,
   "list": to_list,
   "list?": is_list,
+  "map": map_items,
+  "max": max_item,
+  "memoize": memoize,
+  "min": min_item,
   "nil?": is_nil,
+  "not": negation,
   "nth": nth,
+  "num-vec": num_vec,
+  "num-vec?": is_num_vec,
   "number?": is_number,
   "prepend": prepend,
   "println": println,
   "prn": prn,
   "pr-str": pr_str,
   "range": create_range,
-  "read-string": reader.read_raw_string,
+  "read-lines": read_lines,
+  "read-string": ast_cache.read_string,
+  "reduce": reduce_items,
+  "rest": rest,
   "seq?": is_sequence,
   "slurp": slurp,
   "splice": splice,
   "split": split_string,
   "str": do_str,
   "string?": is_string,
+  "sum": sum_items,
   "symbol?": is_symbol,
   "take": take,
   "time": get_current_time,
+  "time-ms": get_current_time_ms,
   "true?": is_true,
   "type": get_type,
   "vals": get_hashmap_vals,
   "vec": vec,
   "vector": to_vector,
-}
\ No newline at end of file
+}
+
+# imported last, `lib.eval` (through the JIT) needs the functions above while it is being imported
+import lib.eval as evaluator
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from typing import Callable, Union, Optional, Self, TYPE_CHECKING
+import itertools
 if TYPE_CHECKING:
   from .plp_types import PLPType, Symbol
   EXPR_TYPE = Union[PLPType, Callable[..., PLPType]]
@@ -17,12 +18,17 @@ class Env:
   def __init__(self, outer: Optional[Self] = None, binds: Optional[list[Symbol]] = None, exprs: Optional[list[EXPR_TYPE]] = None):
     self.data: dict[Symbol, EXPR_TYPE] = dict()
     self.outer: Optional[Self] = outer
+    # the global environment this one ends in, `None` if it doesn't track local names (see `GlobalEnv`)
+    self.root: Optional[GlobalEnv] = None if outer is None else outer.root
     if binds is not None and exprs is not None:
       for (bind, expr) in zip(binds, exprs):
         self.set(bind, expr)
 
   def set(self, key: Symbol, value: EXPR_TYPE) -> EXPR_TYPE:
     self.data[key] = value
+    root = self.root
+    if root is not None and key not in root.local_names:
+      root.add_local_name(key)
     return value
 
   def get(self, key: Symbol) -> Optional[EXPR_TYPE]:
@@ -33,4 +39,122 @@ class Env:
       else:
         return self.outer.get(key)
     else:
-      return value
\ No newline at end of file
+      return value
+
+# versions are unique across all global environments, so a cached version also identifies the environment
+VERSIONS = itertools.count(1)
+
+class GlobalEnv(Env):
+  """
+    the outermost environment holding builtins and top-level definitions
+
+    every definition bumps `version` so code that caches global values can cheaply tell that none of them changed
+
+    it also remembers every symbol that was ever bound in a local environment ending in it,
+    a symbol that is not among them can only ever resolve to the global value
+    so `EVAL` keeps that value in an inline cache of the call site instead of walking the whole chain of environments
+  """
+  def __init__(self):
+    super().__init__()
+    self.root = self
+    self.version = next(VERSIONS)
+    self.local_names: set[Symbol] = set()
+    # statistics of the inline caches in `EVAL`
+    self.cache_hits = 0
+    self.cache_misses = 0
+
+  def set(self, key: Symbol, value: EXPR_TYPE) -> EXPR_TYPE:
+    self.data[key] = value
+    self.version = next(VERSIONS)
+    return value
+
+  def add_local_name(self, key: Symbol) -> None:
+    # values cached for the symbol are not valid anymore, it may be shadowed from now on
+    self.local_names.add(key)
+    self.version = next(VERSIONS)
+
+class Unset:
+  """
+    marks a slot of a `Frame` whose symbol hasn't been defined (yet)
+  """
+  def __repr__(self) -> str:
+    return "UNSET"
+UNSET = Unset()
+
+class Scope:
+  """
+    compile-time description of a `Frame`
+
+    symbols of `fn` parameters, `let*` bindings and every `define` found in the body are resolved
+    to `(depth, index)` coordinates once, when the form is compiled, instead of hashing them on every lookup
+  """
+  def __init__(self, names: list[Symbol], outer: Optional[Scope] = None):
+    self.names = names
+    self.outer = outer
+    # later occurrences win, the same way repeated binds overwrite each other in `Env`
+    self.index: dict[Symbol, int] = {name: i for i, name in enumerate(names)}
+
+  def resolve(self, key: Symbol) -> list[tuple[int, int]]:
+    """
+      returns coordinates of every enclosing slot named `key`, innermost first
+
+      the later ones are only used when the inner slot is `UNSET` at runtime (e.g. a `define` that hasn't run yet)
+    """
+    coordinates: list[tuple[int, int]] = []
+    scope: Optional[Scope] = self
+    depth = 0
+    while scope is not None:
+      if key in scope.index:
+        coordinates.append((depth, scope.index[key]))
+      scope = scope.outer
+      depth += 1
+    return coordinates
+
+class Frame:
+  """
+    runtime counterpart of `Scope`, values are stored in a plain list indexed by the coordinates computed by `Scope`
+  """
+  __slots__ = ("values", "outer")
+
+  def __init__(self, values: list[EXPR_TYPE | Unset], outer: Optional[Frame]):
+    self.values = values
+    self.outer = outer
+
+class FrameEnv(Env):
+  """
+    `Env` view of a `Frame` chain so that `EVAL` can still run lambdas compiled with slot frames
+  """
+  def __init__(self, frame: Optional[Frame], scope: Optional[Scope], global_env: Env):
+    self.frame = frame
+    self.scope = scope
+    self.global_env = global_env
+    # slots of the frames aren't tracked as local names, call sites evaluated in here are not cached
+    self.root = None
+
+  @property
+  def outer(self) -> Env: # type: ignore
+    if self.frame is None or self.scope is None:
+      return self.global_env
+    if self.frame.outer is None or self.scope.outer is None:
+      return self.global_env
+    return FrameEnv(self.frame.outer, self.scope.outer, self.global_env)
+
+  @property
+  def data(self) -> dict[Symbol, EXPR_TYPE]: # type: ignore
+    if self.frame is None or self.scope is None:
+      return {}
+    values = self.frame.values
+    return {key: values[i] for key, i in self.scope.index.items() if values[i] is not UNSET} # type: ignore
+
+  def set(self, key: Symbol, value: EXPR_TYPE) -> EXPR_TYPE:
+    if self.frame is None or self.scope is None or key not in self.scope.index:
+      raise SyntaxError(f"can't define '{key}' outside of the frame compiled for it")
+    self.frame.values[self.scope.index[key]] = value
+    return value
+
+  def get(self, key: Symbol) -> Optional[EXPR_TYPE]:
+    if self.frame is not None and self.scope is not None and key in self.scope.index:
+      value = self.frame.values[self.scope.index[key]]
+      if value is not UNSET:
+        return value # type: ignore
+    return self.outer.get(key)
@@ -1,12 +1,35 @@
 from lib.env import Env
 from lib.plp_types import PLPType
 from typing import Union, Callable
+import lib.benchmark as benchmark
 import lib.exceptions as exceptions
+import lib.jit as jit
 import lib.plp_types as plp
+import lib.printer as printer
+import lib.profiler as profiler
 
 EVAL_RETURN_TYPE = Union[PLPType, Callable[..., PLPType]]
 
-def EVAL(ast: PLPType, env: Env) -> EVAL_RETURN_TYPE:
+# operators handled by `EVAL` itself, they take precedence over any value bound to the same symbol
+SPECIAL_FORMS = ("define", "do", "fn", "if", "let*", "while", "quote", "and", "or", "cond", "profile", "bench")
+
+class TailCall:
+  """
+    returned by calls in tail position of a lambda body instead of recursing
+
+    the closure engine unwinds it in `compiler.run`, `EVAL` and the vm return it only when asked to (see `step`),
+    either way the python stack stays flat for tail-recursive code
+  """
+  __slots__ = ("function", "args")
+
+  def __init__(self, function: plp.Lambda, args: list[PLPType]):
+    self.function = function
+    self.args = args
+
+def EVAL(ast: PLPType, env: Env, tail: bool = False) -> EVAL_RETURN_TYPE:
+  """
+    with `tail` set (see `step`) a call to a lambda with its own `invoke` in the tail position of `ast` is returned as `TailCall`
+  """
   while True:
     match ast:
       # symbol denotes a value stored in env
@@ -23,10 +46,12 @@ def EVAL(ast: PLPType, env: Env) -> EVAL_RETURN_TYPE:
 
       # hashmap is just a hashmap where keys are always static
       #                             and values are exprs that need to be evaluated
+      # (a new hashmap is built, the literal itself is part of the AST and may be evaluated again)
       case plp.HashMap():
+        items: list[PLPType] = []
         for key, value in ast.items():
-          ast.update(key, EVAL(value, env))
-        return ast
+          items.extend((key, EVAL(value, env)))
+        return plp.HashMap(items)
 
       # list is denoted like (symbol expr1 expr2 ...)
       # the first element is always a symbol that needs to be invoked with the remaining elements as its arguments
@@ -51,24 +76,73 @@ def EVAL(ast: PLPType, env: Env) -> EVAL_RETURN_TYPE:
             case "let*":
               ast, env = eval_let(args, env)
               continue
+            # `and` stops at the first value that is `false` or `nil`, `or` at the first one that isn't,
+            # the last expression is evaluated in the tail position
+            case "and":
+              if len(args) == 0:
+                return plp.TRUE
+              for expr in args[:-1]:
+                value = EVAL(expr, env)
+                if not plp.is_defined_or_true(value):
+                  return value
+              ast = args[-1]
+              continue
+            case "or":
+              if len(args) == 0:
+                return plp.NIL
+              for expr in args[:-1]:
+                value = EVAL(expr, env)
+                if plp.is_defined_or_true(value):
+                  return value
+              ast = args[-1]
+              continue
+            case "cond":
+              ast = eval_cond(args, env)
+              continue
+            case "profile":
+              return eval_profile(args, env)
+            case "bench":
+              return eval_bench(args, env)
             case "while":
               pre_while_env = Env(env)
               eval_while(args, pre_while_env)
               for key in pre_while_env.data:
                 if key in env.data:
                   env.set(key, pre_while_env.data[key])
-              return plp.Null()
+              return plp.NIL
             # quoting is kinda broken, the cause rises from the reader implementation
             case "quote":
               return args[0]
             case _: pass # to satisfy type-checker
 
         # this can give us either a function from the environment or the 'first' value is defined as some arbitraty type such as integer etc. on which we can't apply the arguments per the definition of our list
-        function = EVAL(operator, env)
+        root = env.root
+        if root is not None and type(operator) is plp.Symbol:
+          # a call site of a symbol that was never bound locally keeps its global value until the global environment changes
+          cache = ast.cache
+          if cache is not None and cache[0] == root.version:
+            root.cache_hits += 1
+            function = cache[1]
+          else:
+            root.cache_misses += 1
+            function = EVAL(operator, env)
+            if operator not in root.local_names:
+              ast.cache = (root.version, function)
+        else:
+          function = EVAL(operator, env)
         if plp.is_function(function):
           # if it passes the custom check, it must be Callable
           return function(*(EVAL(a, env) for a in args)) # type: ignore
         elif isinstance(function, plp.Lambda):
+          if function.invoke is not None:
+            if tail:
+              return TailCall(function, [EVAL(a, env) for a in args])
+            return function.invoke([EVAL(a, env) for a in args])
+          function.calls += 1
+          if function.calls == jit.THRESHOLD:
+            jit.compile_lambda(function)
+            if function.invoke is not None:
+              return function.invoke([EVAL(a, env) for a in args])
           ast = function.ast
           env = function.get_env([EVAL(a, env) for a in args])
           continue
@@ -127,7 +201,30 @@ def eval_if(args: list[PLPType], env: Env):
   elif len(args) == 3:
     return args[2]
   else:
-    return plp.Null()
+    return plp.NIL
+
+def eval_cond(args: list[PLPType], env: Env) -> PLPType:
+  if len(args) % 2 != 0:
+    raise SyntaxError(f"operator 'cond' expects pairs of a condition and an expression (got {len(args)} arguments)")
+
+  for i in range(0, len(args), 2):
+    if plp.is_defined_or_true(EVAL(args[i], env)):
+      return args[i + 1]
+  return plp.NIL
+
+def eval_profile(args: list[PLPType], env: Env) -> EVAL_RETURN_TYPE:
+  if len(args) not in [1, 2]:
+    raise SyntaxError(f"operator 'profile' expects either 1 or 2 arguments (got {len(args)})")
+
+  json_path = EVAL(args[1], env) if len(args) == 2 else plp.NIL
+  return profiler.profile(profiler.global_env_of(env), lambda: EVAL(args[0], env), json_path) # type: ignore
+
+def eval_bench(args: list[PLPType], env: Env) -> PLPType:
+  if len(args) == 0:
+    raise SyntaxError("operator 'bench' expects an expression to measure")
+
+  options = [EVAL(option, env) for option in benchmark.options(args[1:])]
+  return benchmark.bench(lambda: EVAL(args[0], env), *options) # type: ignore
 
 def eval_fn(args: list[PLPType], env: Env):
   if len(args) != 2:
@@ -142,7 +239,7 @@ def eval_fn(args: list[PLPType], env: Env):
 
   def get_env(exprs: list[PLPType]) -> Env:
     return Env(env, fn_args, exprs) # type: ignore
-  return plp.Lambda(args[1], get_env)
+  return plp.Lambda(args[1], get_env, params=fn_args, env=env) # type: ignore
 
 def eval_while(args: list[PLPType], env: Env):
   if len(args) < 2:
@@ -151,4 +248,79 @@ def eval_while(args: list[PLPType], env: Env):
   while_condition = args[0]
   while plp.is_defined_or_true(EVAL(while_condition, env)):
     for expr in args[1:]:
-      EVAL(expr, env)
\ No newline at end of file
+      EVAL(expr, env)
+
+def call_function(function: EVAL_RETURN_TYPE, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+  """
+    calls a builtin or a lambda with already evaluated arguments, the entry point for calling PLP functions from python
+
+    the list of arguments is handed over to the function (compiled lambdas use it as their frame)
+  """
+  if plp.is_function(function):
+    return function(*args) # type: ignore
+  elif isinstance(function, plp.Lambda):
+    if function.invoke is not None:
+      return function.invoke(args)
+    function.calls += 1
+    if function.calls == jit.THRESHOLD:
+      jit.compile_lambda(function)
+      if function.invoke is not None:
+        return function.invoke(args)
+    return EVAL(function.ast, function.get_env(args))
+  raise SyntaxError(f"'{printer.format(function)}' is not a function; can't apply it on given arguments") # type: ignore
+
+def step(function: plp.Lambda, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+  """
+    calls a lambda the same way as `call_function`, but a call it ends with is returned as `TailCall` instead of made
+    (lambdas of the closure engine and the vm provide their own `step`), the profilers unwind such calls themselves
+  """
+  if function.step is not None:
+    return function.step(args)
+  if function.invoke is not None:
+    return function.invoke(args)
+  function.calls += 1
+  if function.calls == jit.THRESHOLD:
+    jit.compile_lambda(function)
+    if function.invoke is not None:
+      return function.invoke(args)
+  return EVAL(function.ast, function.get_env(args), True)
+
+def caller(function: EVAL_RETURN_TYPE) -> Callable[[list[PLPType]], EVAL_RETURN_TYPE]:
+  """
+    returns a python function calling `function` over and over (e.g. once for every item of a list)
+
+    a lambda interpreted by `EVAL` whose body can't capture its environment (there is no `fn` in it)
+    gets one environment that is emptied and reused by all the calls instead of a new one for each call
+  """
+  if plp.is_function(function):
+    return lambda args: function(*args) # type: ignore
+  if not isinstance(function, plp.Lambda):
+    raise SyntaxError(f"'{printer.format(function)}' is not a function; can't apply it on given arguments") # type: ignore
+  if function.invoke is not None or function.params is None or mentions(function.ast, "fn"):
+    return lambda args: call_function(function, args)
+
+  lambda_ = function
+  params = lambda_.params
+  env = Env(lambda_.env)
+  def call(args: list[PLPType]) -> EVAL_RETURN_TYPE:
+    if lambda_.invoke is not None:
+      return lambda_.invoke(args)
+    lambda_.calls += 1
+    if lambda_.calls == jit.THRESHOLD:
+      jit.compile_lambda(lambda_)
+      if lambda_.invoke is not None:
+        return lambda_.invoke(args)
+    env.data.clear()
+    for param, arg in zip(params, args): # type: ignore
+      env.set(param, arg)
+    return EVAL(lambda_.ast, env)
+  return call
+
+def mentions(ast: PLPType, symbol: str) -> bool:
+  if isinstance(ast, plp.Symbol):
+    return ast == symbol
+  if isinstance(ast, (plp.List, plp.Vector)):
+    return any(mentions(a, symbol) for a in ast)
+  if isinstance(ast, plp.HashMap):
+    return any(mentions(a, symbol) for a in ast.values())
+  return False
@@ -23,7 +23,11 @@ def is_string(possible_string: Any) -> bool:
   return bool(re.match(string_re, possible_string))
 
 def are_numbers(*possible_nums: Any) -> bool:
-  return all(isinstance(n, (Integer, Float)) for n in possible_nums)
+  # a plain loop, this runs on every arithmetic operation and a generator costs more than the checks themselves
+  for n in possible_nums:
+    if type(n) is not Integer and type(n) is not Float:
+      return False
+  return True
 
 def are_strings(*possible_strings: Any) -> bool:
   return all(isinstance(s, String) for s in possible_strings)
@@ -0,0 +1,340 @@
+"""
+  instrumentation of the evaluator: counters read by `(runtime-stats)` and hooks called when PLP functions are entered and exited
+
+  the engines contain no code for either of them, so they cost nothing until they're turned on
+
+  - counters use python's `sys.monitoring`: events are enabled only for the first instruction of the functions listed in `ENTRIES`
+    and `LOOPS`, of the forms compiled by the closure engine and of the builtins, and for the jumps of `EVAL`'s loop, the rest
+    of the code runs untouched (jumps other than the ones back to the start of the loop report themselves once and are disabled
+    right away), raised errors are followed by the global events of raising and unwinding, which cost nothing until
+    something raises, the functions are looked up by their qualified names and counting refuses to start when any of them
+    is missing, the JIT is paused meanwhile (see `jit.pause`)
+  - hooks wrap functions of the global environment for the time they're installed the same way the profilers do (see `lib/profiler.py`)
+
+  counters:
+  - `forms`: forms evaluated, atoms included: calls of `EVAL` and of the closures the closure engine compiled forms into,
+    `EVAL` also counts the forms it continued with instead of recursing and the operators it found in its inline cache
+    (of the global environment counting was enabled for)
+  - `tail-calls`: calls of lambdas from the tail position of a lambda body (the closure engine returns them as `TailCall`)
+  - `lambda-calls`: calls of lambdas in any engine (counted when their environment or frame is built)
+  - `frames`: environments and slot frames allocated (lambda calls, `let*`, `while`)
+  - `exceptions`: errors raised while evaluating, each counted once when it unwinds the engine, wherever it's caught
+  - `builtin-calls`: calls of each builtin bound in the global environment when counting started, by name
+
+  an engine that can't count some of them leaves them out of the report once it evaluated anything while counting (see `LOOPS`)
+"""
+
+from contextlib import contextmanager
+from lib.env import GlobalEnv
+from lib.plp_types import PLPType
+from types import CodeType, FunctionType
+from typing import Any, Callable, Iterator, Optional
+import dis
+import importlib
+import lib.jit as jit
+import lib.plp_types as plp
+import lib.profiler as profiler
+import sys
+
+# ids 0 to 2 and 5 are taken by debuggers, coverage tools, profilers and optimizers by convention
+TOOL_ID = 4
+# functions (by module and qualified name) whose every call increases a counter,
+# engines that haven't been imported yet are imported once counting starts
+ENTRIES: dict[tuple[str, str], str] = {
+  ("lib.eval", "EVAL"): "forms",
+  ("lib.eval", "eval_fn.<locals>.get_env"): "lambda_calls",
+  # lambdas called repeatedly (e.g. by `map`) reuse one environment
+  ("lib.eval", "caller.<locals>.call"): "lambda_calls",
+  ("lib.compiler", "CompiledLambda.frame"): "lambda_calls",
+  ("lib.eval", "TailCall.__init__"): "tail_calls",
+  ("lib.vm", "VMLambda.frame"): "lambda_calls",
+  ("lib.env", "Env.__init__"): "frames",
+  ("lib.env", "Frame.__init__"): "frames",
+}
+# functions that run whenever the tree and the vm engines evaluate (the closure engine runs its compiled forms instead),
+# errors raised while evaluating unwind them, and the counters the engines can't count: `EVAL` continues its loop with
+# every call of a lambda, so it can't tell tail calls from the other calls, bytecode has nothing that would correspond
+# to a form and the loop of the vm makes tail calls right in itself
+LOOPS: dict[tuple[str, str], tuple[str, ...]] = {
+  ("lib.eval", "EVAL"): ("tail_calls",),
+  ("lib.vm", "execute"): ("forms", "tail_calls"),
+}
+
+class Hooks:
+  """
+    base class of hooks, `enter` is called before a function bound in the global environment is called
+    and `exit` (or `error`) after it returned (or raised), `name` is the name the function was defined under
+  """
+  def enter(self, name: str, args: list[PLPType]) -> None:
+    pass
+
+  def exit(self, name: str, value: PLPType) -> None:
+    pass
+
+  def error(self, name: str, exception: Exception) -> None:
+    pass
+
+class Counters:
+  def __init__(self):
+    self.forms = 0
+    self.tail_calls = 0
+    self.lambda_calls = 0
+    self.frames = 0
+    self.exceptions = 0
+    self.builtin_calls: dict[str, int] = {}
+    # counters left out of the report, an engine that can't count them evaluated something
+    self.uncounted: set[str] = set()
+
+  def reset(self) -> None:
+    self.__init__()
+
+  def stats(self, global_env: Optional[GlobalEnv] = None) -> plp.HashMap:
+    """
+      the counters as a hashmap, with hits and misses of the inline caches of `EVAL` when the global environment is given
+    """
+    counts = {
+      "forms": self.forms + (skipped_forms() if self is counting else 0),
+      "tail_calls": self.tail_calls,
+      "lambda_calls": self.lambda_calls,
+      "frames": self.frames,
+      "exceptions": self.exceptions,
+    }
+    items: list[Any] = [x for name, count in counts.items() if name not in self.uncounted for x in (plp.Keyword(name.replace("_", "-")), count)]
+    items.extend((plp.Keyword("builtin-calls"), plp.HashMap([item for name, count in sorted(self.builtin_calls.items()) for item in (plp.String(name), count)])))
+    if global_env is not None:
+      items.extend((plp.Keyword("cache-hits"), global_env.cache_hits, plp.Keyword("cache-misses"), global_env.cache_misses))
+    return plp.HashMap(items)
+
+# counters of the whole run, filled while `enable` is in effect (e.g. with `main.py --runtime-stats`)
+counters = Counters()
+# the counters being filled right now
+counting: Optional[Counters] = None
+# code objects events were enabled for, they're turned off again when counting stops
+monitored: list[CodeType] = []
+# the global environment counting was enabled for and its hits of the inline caches of `EVAL` at that time
+cache_hits_from: Optional[tuple[GlobalEnv, int]] = None
+
+def code_objects(module: Any) -> Iterator[CodeType]:
+  """
+    yields code objects of all functions defined in a module (methods and nested functions included)
+  """
+  def nested(code: CodeType) -> Iterator[CodeType]:
+    yield code
+    for constant in code.co_consts:
+      if isinstance(constant, CodeType):
+        yield from nested(constant)
+  for value in list(vars(module).values()):
+    functions = [value] if isinstance(value, FunctionType) else list(vars(value).values()) if isinstance(value, type) else []
+    for function in functions:
+      if isinstance(function, FunctionType) and function.__module__ == module.__name__:
+        yield from nested(function.__code__)
+
+def find_codes(names: dict[tuple[str, str], Any], table: str) -> dict[CodeType, Any]:
+  """
+    returns code objects of the functions named in `names` (by module and qualified name) with their values in it
+  """
+  codes: dict[CodeType, Any] = {}
+  found: set[tuple[str, str]] = set()
+  for module_name in sorted({module_name for module_name, _ in names}):
+    for code in code_objects(importlib.import_module(module_name)):
+      value = names.get((module_name, code.co_qualname))
+      if value is not None:
+        codes[code] = value
+        found.add((module_name, code.co_qualname))
+  missing = names.keys() - found
+  if missing:
+    functions = ", ".join(f"{module_name}.{qualname}" for module_name, qualname in sorted(missing))
+    raise RuntimeError(f"can't count the evaluator, functions {functions} don't exist (see `instrument.{table}`)")
+  return codes
+
+def entry_codes() -> dict[CodeType, str]:
+  """
+    returns code objects of the functions in `ENTRIES` and of the forms compiled by the closure engine
+    with the counters their calls increase
+  """
+  codes = find_codes(ENTRIES, "ENTRIES")
+  for code in compiled_forms():
+    codes[code] = "forms"
+  return codes
+
+def compiled_forms() -> list[CodeType]:
+  """
+    returns code objects of the closures the closure engine compiles forms into, the functions nested in `lib.compiler`
+    that take just the frame (see `compiler.Compiled`)
+  """
+  codes = [
+    code for code in code_objects(importlib.import_module("lib.compiler"))
+    if "<locals>" in code.co_qualname and code.co_argcount == 1 and code.co_varnames[0] == "frame"
+  ]
+  if not codes:
+    raise RuntimeError("can't count the evaluator, the closure engine compiles forms into no closures taking the frame")
+  return codes
+
+def skipped_forms() -> int:
+  """
+    operators `EVAL` found in its inline cache since counting started, it evaluated them without recursing
+  """
+  if cache_hits_from is None:
+    return 0
+  global_env, start = cache_hits_from
+  return global_env.cache_hits - start
+
+def loop_start(code: CodeType) -> int:
+  """
+    returns the offset where the outermost loop of a function starts, the earliest instruction any jump goes back to
+  """
+  targets = [i.argval for i in dis.get_instructions(code) if i.opname == "JUMP_BACKWARD"]
+  if not targets:
+    raise RuntimeError(f"can't count the evaluator, '{code.co_qualname}' has no loop")
+  return min(targets)
+
+def enable(global_env: GlobalEnv, into: Optional[Counters] = None) -> None:
+  """
+    starts counting into `into` (the counters of the whole run by default)
+  """
+  global counting, cache_hits_from
+  if counting is not None:
+    raise RuntimeError("the evaluator is already being counted")
+  target = into if into is not None else counters
+  # resolved before anything changes, so nothing has to be undone when it fails
+  entries = entry_codes()
+  loops = find_codes(LOOPS, "LOOPS")
+  evaluate = importlib.import_module("lib.eval").EVAL.__code__
+  evaluate_loop = loop_start(evaluate)
+  monitoring = sys.monitoring
+  monitoring.use_tool_id(TOOL_ID, "plp")
+  counting = target
+  cache_hits_from = (global_env, global_env.cache_hits)
+  # compiled lambdas call neither lambdas nor builtins the way the interpreter does
+  jit.pause()
+
+  # code of builtins and their names
+  starts: dict[CodeType, str] = {}
+  functions: dict[CodeType, FunctionType] = {}
+  for symbol, value in global_env.data.items():
+    if type(value) is FunctionType:
+      code = value.__code__
+      if code not in functions:
+        functions[code] = value
+        starts[code] = str(symbol)
+      elif functions[code] is not value:
+        # different functions sharing their code (e.g. all memoized ones) are counted under the name of the python function
+        starts[code] = value.__name__
+  for code in {**entries, **starts, **loops}:
+    monitoring.set_local_events(TOOL_ID, code, monitoring.events.PY_START)
+    monitored.append(code)
+  monitoring.set_local_events(TOOL_ID, evaluate, monitoring.events.PY_START | monitoring.events.JUMP)
+  monitoring.set_events(TOOL_ID, monitoring.events.RAISE | monitoring.events.PY_UNWIND)
+
+  builtin_calls = target.builtin_calls
+  # loops of the engines that didn't run yet
+  waiting = dict(loops)
+  # code errors raised while evaluating unwind
+  evaluating = {code for code, counter in entries.items() if counter == "forms"} | loops.keys()
+  def on_start(code: CodeType, offset: int) -> Any:
+    counter = entries.get(code)
+    if counter is not None:
+      setattr(target, counter, getattr(target, counter) + 1)
+    uncounted = waiting.pop(code, None)
+    if uncounted is not None:
+      target.uncounted.update(uncounted)
+    name = starts.get(code)
+    if name is not None:
+      builtin_calls[name] = builtin_calls.get(name, 0) + 1
+    elif counter is None:
+      return monitoring.DISABLE
+  def on_jump(code: CodeType, offset: int, destination: int) -> Any:
+    # `EVAL` continued with the next form instead of recursing
+    if code is not evaluate or destination != evaluate_loop:
+      return monitoring.DISABLE
+    target.forms += 1
+  # an error is counted once, the first time it unwinds the engine after it was raised (errors caught before that,
+  # e.g. by the reader, are internal to the interpreter), the event of raising is reported again by every function
+  # the error passes through, it was raised right there only when its traceback has nothing deeper
+  raised: Optional[BaseException] = None
+  def on_raise(code: CodeType, offset: int, exception: BaseException) -> Any:
+    nonlocal raised
+    traceback = exception.__traceback__
+    if traceback is not None and traceback.tb_next is None:
+      raised = exception
+  def on_unwind(code: CodeType, offset: int, exception: BaseException) -> Any:
+    nonlocal raised
+    if exception is raised and code in evaluating:
+      target.exceptions += 1
+      raised = None
+  monitoring.register_callback(TOOL_ID, monitoring.events.PY_START, on_start)
+  monitoring.register_callback(TOOL_ID, monitoring.events.JUMP, on_jump)
+  monitoring.register_callback(TOOL_ID, monitoring.events.RAISE, on_raise)
+  monitoring.register_callback(TOOL_ID, monitoring.events.PY_UNWIND, on_unwind)
+  # locations disabled while counting before report again
+  monitoring.restart_events()
+
+def disable() -> None:
+  global counting, cache_hits_from
+  if counting is None:
+    return
+  counting.forms += skipped_forms()
+  cache_hits_from = None
+  monitoring = sys.monitoring
+  # the instrumented instructions are replaced by the original ones, the code runs as fast as before
+  for code in monitored:
+    monitoring.set_local_events(TOOL_ID, code, 0)
+  monitored.clear()
+  monitoring.set_events(TOOL_ID, 0)
+  for event in (monitoring.events.PY_START, monitoring.events.JUMP, monitoring.events.RAISE, monitoring.events.PY_UNWIND):
+    monitoring.register_callback(TOOL_ID, event, None)
+  monitoring.free_tool_id(TOOL_ID)
+  jit.resume()
+  counting = None
+
+class HookSession(profiler.Session):
+  """
+    calls hooks around every call of a function of the global environment
+  """
+  def __init__(self, global_env: GlobalEnv, hooks: list[Hooks]):
+    super().__init__(global_env)
+    self.hooks = hooks
+
+  def wrapper(self, name: str, kind: str, call: Callable[..., PLPType]) -> Callable[..., PLPType]:
+    hooks = self.hooks
+    def hooked_call(*args: Any) -> PLPType:
+      if profiler.active is not self:
+        return call(*args)
+      for hook in hooks:
+        hook.enter(name, list(args[0]) if kind == "lambda" else list(args))
+      try:
+        value = call(*args)
+      except Exception as e:
+        for hook in hooks:
+          hook.error(name, e)
+        raise
+      for hook in hooks:
+        hook.exit(name, value)
+      return value
+    return hooked_call
+
+  def write(self, path: Optional[str]) -> None:
+    pass
+
+@contextmanager
+def installed(global_env: GlobalEnv, hooks: list[Hooks | Counters]) -> Iterator[None]:
+  """
+    installs hooks (and fills counters given among them) for the time of one evaluation, see `rep.rep`
+  """
+  counters_given = [h for h in hooks if isinstance(h, Counters)]
+  if len(counters_given) > 1:
+    raise ValueError("only one set of counters can be filled at a time")
+  session = HookSession(global_env, [h for h in hooks if isinstance(h, Hooks)])
+  if counters_given:
+    enable(global_env, counters_given[0])
+  try:
+    if session.hooks:
+      session.start()
+    try:
+      yield
+    finally:
+      if session.hooks:
+        session.stop()
+  finally:
+    if counters_given:
+      disable()
@@ -0,0 +1,415 @@
+"""
+  second tier of the tree-walking `EVAL`
+
+  once a lambda has been called `THRESHOLD` times its body is translated into python source,
+  compiled with `compile()` and attached to the lambda as `invoke`, later calls then run as CPython bytecode
+
+  - arithmetic and comparisons of `lib/core.py` are inlined for integers, other values go through the builtins
+  - self tail calls become a `while` loop, other self calls call the compiled function directly
+  - the global values the code calls are captured when it is compiled, if any of them gets redefined
+    the compiled code is thrown away and the lambda goes back to the interpreter
+
+  only lambdas defined on the top level whose bodies use `if`, `cond`, `and`, `or`, `do`, `quote`, constants and calls are compiled,
+  anything else (e.g. `define`, `while` or a tail call to another lambda) keeps being interpreted
+"""
+
+from lib.env import GlobalEnv
+from lib.plp_types import PLPType
+from types import FunctionType
+from typing import Any, Callable, Optional
+import re
+import weakref
+import lib.core as core
+import lib.eval as evaluator
+import lib.exceptions as exceptions
+import lib.plp_types as plp
+
+THRESHOLD = 100
+
+# lambdas compiled so far with the code attached to them, `pause` sends them back to the interpreter
+compiled: list[tuple[weakref.ref[plp.Lambda], Callable[[list[PLPType]], PLPType]]] = []
+# whether lambdas reaching the threshold are left to the interpreter
+paused = False
+
+class Unsupported(Exception):
+  """
+    raised while translating a body that the JIT can't handle, the lambda then stays interpreted
+  """
+
+# binary builtins that get inlined, mapped to the python operator doing the same on numbers
+ARITHMETIC: dict[Callable[..., Any], str] = {
+  core.plus_sign: "+",
+  core.number_subtraction: "-",
+  core.asterisk_sign: "*",
+}
+COMPARISONS: dict[Callable[..., Any], str] = {
+  core.less_than: "<",
+  core.less_than_or_equal: "<=",
+  core.greater_than: ">",
+  core.greater_than_or_equal: ">=",
+}
+
+def apply(function: Any, args: list[PLPType], operator: str) -> PLPType:
+  if type(function) is FunctionType:
+    return function(*args)
+  elif isinstance(function, plp.Lambda):
+    if function.invoke is not None:
+      return function.invoke(args)
+    return evaluator.EVAL(function.ast, function.get_env(args)) # type: ignore
+  raise SyntaxError(f"'{operator}' is not a function; can't apply '{operator}' on given arguments")
+
+def is_true(value: PLPType) -> bool:
+  return value is not plp.NIL and value is not plp.FALSE
+
+class Translator:
+  """
+    translates the body of a single lambda into the source of a python function
+  """
+  def __init__(self, function: plp.Lambda, global_env: GlobalEnv):
+    self.function = function
+    self.data = global_env.data
+    self.params: dict[plp.Symbol, str] = {param: f"v{i}" for i, param in enumerate(function.params)} # type: ignore
+    self.lines: list[str] = []
+    self.indent = 0
+    self.temporaries = 0
+    # values the code refers to, passed to the generated function as `k<index>`
+    self.constants: list[Any] = []
+    # global symbols whose values were captured and must stay the same for the code to be valid
+    self.dependencies: dict[plp.Symbol, Any] = {}
+
+  def emit(self, line: str) -> None:
+    self.lines.append(" " * self.indent + line)
+
+  def constant(self, value: Any) -> str:
+    for i, constant in enumerate(self.constants):
+      if constant is value:
+        return f"k{i}"
+    self.constants.append(value)
+    return f"k{len(self.constants) - 1}"
+
+  def integers(self, *names: str) -> str:
+    """
+      returns a python condition checking that all given values are integers, constants are checked right away
+    """
+    checks = [f"type({name}) is Integer" for name in names if not (name.startswith("k") and type(self.constants[int(name[1:])]) is plp.Integer)]
+    return " and ".join(checks) if checks else "True"
+
+  def temporary(self, expr: str) -> str:
+    name = f"t{self.temporaries}"
+    self.temporaries += 1
+    self.emit(f"{name} = {expr}")
+    return name
+
+  def global_value(self, symbol: plp.Symbol) -> Any:
+    value = self.data.get(symbol)
+    if value is None:
+      raise Unsupported(f"'{symbol}' is not defined yet")
+    self.dependencies[symbol] = value
+    return value
+
+  def translate(self) -> str:
+    params = ", ".join(self.params.values())
+    self.emit(f"def body({params}):")
+    self.indent += 2
+    self.emit("while True:")
+    self.indent += 2
+    self.emit("if genv.version != state[0] and not revalidate():")
+    self.emit(f"  return deoptimize([{params}])")
+    self.tail(self.function.ast)
+    return "\n".join(self.lines)
+
+  def atom(self, ast: PLPType) -> str:
+    """
+      returns a python expression for `ast` that is safe to use more than once (a parameter, a constant or a temporary)
+    """
+    expr = self.value(ast)
+    if re.fullmatch(r"[kvt]\d+", expr):
+      return expr
+    return self.temporary(expr)
+
+  def tail(self, ast: PLPType) -> None:
+    """
+      emits statements returning the value of `ast`
+    """
+    if isinstance(ast, plp.List) and len(ast) > 0 and isinstance(ast[0], plp.Symbol):
+      operator, args = ast[0], ast[1:]
+      if operator == "if":
+        self.check_if(args)
+        self.emit(f"if {self.condition(args[0])}:")
+        self.indent += 2
+        self.tail(args[1])
+        self.indent -= 2
+        self.emit("else:")
+        self.indent += 2
+        self.tail(args[2] if len(args) == 3 else plp.NIL)
+        self.indent -= 2
+        return
+      if operator == "do":
+        self.check_do(args)
+        for expr in args[:-1]:
+          self.emit(self.value(expr))
+        self.tail(args[-1])
+        return
+      if operator == "cond":
+        self.check_cond(args)
+        # every branch returns (or loops), so the conditions can simply follow each other
+        for i in range(0, len(args), 2):
+          self.emit(f"if {self.condition(args[i])}:")
+          self.indent += 2
+          self.tail(args[i + 1])
+          self.indent -= 2
+        self.tail(plp.NIL)
+        return
+      if (operator == "and" or operator == "or") and len(args) > 0:
+        for expr in args[:-1]:
+          value = self.atom(expr)
+          self.emit(f"if {'not ' if operator == 'and' else ''}is_true({value}):")
+          self.emit(f"  return {value}")
+        self.tail(args[-1])
+        return
+      if operator not in self.params and self.data.get(operator) is self.function:
+        # self tail call, rebind the parameters and loop
+        values = [self.atom(a) for a in args]
+        if len(values) != len(self.params):
+          raise Unsupported("self call with different number of arguments")
+        self.dependencies[operator] = self.function
+        if values:
+          self.emit(f"{', '.join(self.params.values())} = {', '.join(values)}")
+        self.emit("continue")
+        return
+      value = self.data.get(operator)
+      if operator not in self.params and operator not in evaluator.SPECIAL_FORMS and isinstance(value, plp.Lambda):
+        raise Unsupported("tail call to another lambda")
+    self.emit(f"return {self.value(ast)}")
+
+  def condition(self, ast: PLPType) -> str:
+    """
+      returns a python expression evaluating to python `bool` whether `ast` is neither `false` nor `nil`
+    """
+    if isinstance(ast, plp.List) and len(ast) == 3 and isinstance(ast[0], plp.Symbol) and ast[0] not in self.params:
+      function = self.data.get(ast[0])
+      if type(function) is not FunctionType:
+        pass
+      elif function in COMPARISONS:
+        self.global_value(ast[0])
+        a, b = self.atom(ast[1]), self.atom(ast[2])
+        # anything else than integers (e.g. numeric vectors compared item by item) goes through the builtin
+        return f"({a} {COMPARISONS[function]} {b} if {self.integers(a, b)} else is_true({self.constant(function)}({a}, {b})))" # type: ignore
+      elif function is core.eq:
+        self.global_value(ast[0])
+        a, b = self.atom(ast[1]), self.atom(ast[2])
+        return f"({a} == {b} if {self.integers(a, b)} else {self.constant(core.eq)}({a}, {b}) is TRUE)"
+    if isinstance(ast, plp.Boolean):
+      return "True" if ast.boo else "False"
+    return f"is_true({self.value(ast)})"
+
+  def value(self, ast: PLPType) -> str:
+    """
+      returns a python expression for the value of `ast`, statements it depends on are emitted before
+    """
+    match ast:
+      case plp.Symbol():
+        if ast in self.params:
+          return self.params[ast]
+        return f"lookup({self.constant(ast)})"
+      case plp.Vector() | plp.HashMap():
+        raise Unsupported("collection literal")
+      case plp.List():
+        if len(ast) == 0:
+          return self.constant(ast)
+        operator, args = ast[0], ast[1:]
+        if isinstance(operator, plp.Symbol) and operator in evaluator.SPECIAL_FORMS:
+          return self.special_form(operator, args)
+        return self.call(operator, args)
+      case _:
+        return self.constant(ast)
+
+  def special_form(self, operator: plp.Symbol, args: list[PLPType]) -> str:
+    match operator:
+      case "if":
+        self.check_if(args)
+        result = f"t{self.temporaries}"
+        self.temporaries += 1
+        self.emit(f"if {self.condition(args[0])}:")
+        self.indent += 2
+        self.emit(f"{result} = {self.value(args[1])}")
+        self.indent -= 2
+        self.emit("else:")
+        self.indent += 2
+        self.emit(f"{result} = {self.value(args[2] if len(args) == 3 else plp.NIL)}")
+        self.indent -= 2
+        return result
+      case "do":
+        self.check_do(args)
+        for expr in args[:-1]:
+          self.emit(self.value(expr))
+        return self.value(args[-1])
+      case "quote":
+        if len(args) == 0:
+          raise Unsupported("empty quote")
+        return self.constant(args[0])
+      case "and" | "or":
+        if len(args) == 0:
+          return self.constant(plp.TRUE if operator == "and" else plp.NIL)
+        # every next expression is evaluated only while the ones before allow it
+        result = self.temporary(self.value(args[0]))
+        for expr in args[1:]:
+          self.emit(f"if {'' if operator == 'and' else 'not '}is_true({result}):")
+          self.indent += 2
+          self.emit(f"{result} = {self.value(expr)}")
+        self.indent -= 2 * (len(args) - 1)
+        return result
+      case "cond":
+        self.check_cond(args)
+        result = f"t{self.temporaries}"
+        self.temporaries += 1
+        for i in range(0, len(args), 2):
+          self.emit(f"if {self.condition(args[i])}:")
+          self.indent += 2
+          self.emit(f"{result} = {self.value(args[i + 1])}")
+          self.indent -= 2
+          self.emit("else:")
+          self.indent += 2
+        self.emit(f"{result} = {self.constant(plp.NIL)}")
+        self.indent -= 2 * (len(args) // 2)
+        return result
+      case _:
+        raise Unsupported(f"special form '{operator}'")
+
+  def call(self, operator: PLPType, args: list[PLPType]) -> str:
+    if isinstance(operator, plp.Symbol) and operator not in self.params:
+      function = self.global_value(operator)
+      values = [self.atom(a) for a in args]
+      if function is self.function:
+        if len(values) != len(self.params):
+          raise Unsupported("self call with different number of arguments")
+        return f"body({', '.join(values)})"
+      if type(function) is not FunctionType:
+        return f"apply({self.constant(function)}, [{', '.join(values)}], {self.constant(operator)})"
+      if len(values) == 2 and function in ARITHMETIC:
+        a, b = values
+        return f"({a} {ARITHMETIC[function]} {b} if {self.integers(a, b)} else {self.constant(function)}({a}, {b}))" # type: ignore
+      if len(values) == 2 and function in COMPARISONS:
+        a, b = values
+        return f"((TRUE if {a} {COMPARISONS[function]} {b} else FALSE) if {self.integers(a, b)} else {self.constant(function)}({a}, {b}))" # type: ignore
+      return f"{self.constant(function)}({', '.join(values)})"
+    function = self.atom(operator)
+    values = [self.atom(a) for a in args]
+    return f"apply({function}, [{', '.join(values)}], {self.constant(operator)})"
+
+  def check_if(self, args: list[PLPType]) -> None:
+    # malformed forms are left to the interpreter so they fail with its error messages
+    if len(args) not in [2, 3]:
+      raise Unsupported("malformed if")
+
+  def check_do(self, args: list[PLPType]) -> None:
+    if len(args) == 0:
+      raise Unsupported("malformed do")
+
+  def check_cond(self, args: list[PLPType]) -> None:
+    if len(args) % 2 != 0:
+      raise Unsupported("malformed cond")
+
+def compile_lambda(function: plp.Lambda) -> bool:
+  """
+    tries to translate a hot lambda, on success the compiled code is attached to it as `invoke`
+
+    lambdas that can't be compiled are never tried again
+  """
+  if paused:
+    # asked again once the lambda is called `THRESHOLD` more times
+    function.calls = 0
+    return False
+  env = function.env
+  if function.params is None or not isinstance(env, GlobalEnv):
+    function.calls = THRESHOLD + 1
+    return False
+  translator = Translator(function, env)
+  try:
+    source = translator.translate()
+  except Unsupported:
+    # the counter is past the threshold now so `EVAL` won't ask again
+    function.calls = THRESHOLD + 1
+    return False
+
+  dependencies = list(translator.dependencies.items())
+  state = [env.version]
+  arity = len(function.params)
+
+  def revalidate() -> bool:
+    for symbol, value in dependencies:
+      if env.data.get(symbol) is not value:
+        return False
+    state[0] = env.version
+    return True
+
+  def deoptimize(args: list[PLPType]) -> PLPType:
+    # some global the code depends on changed, go back to the interpreter (the lambda may get compiled again later)
+    function.invoke = None
+    function.calls = 0
+    return evaluator.EVAL(function.ast, function.get_env(args)) # type: ignore
+
+  def lookup(symbol: plp.Symbol) -> PLPType:
+    value = env.data.get(symbol)
+    if value is None:
+      raise exceptions.UndefinedSymbolError(symbol)
+    return value
+
+  namespace: dict[str, Any] = {
+    "genv": env,
+    "state": state,
+    "revalidate": revalidate,
+    "deoptimize": deoptimize,
+    "lookup": lookup,
+    "apply": apply,
+    "is_true": is_true,
+    "Integer": plp.Integer,
+    "TRUE": plp.TRUE,
+    "FALSE": plp.FALSE,
+  }
+  for i, constant in enumerate(translator.constants):
+    namespace[f"k{i}"] = constant
+  exec(compile(source, "<plp jit>", "exec"), namespace)
+  body = namespace["body"]
+
+  def invoke(args: list[PLPType]) -> PLPType:
+    if len(args) != arity:
+      return evaluator.EVAL(function.ast, function.get_env(args)) # type: ignore
+    return body(*args)
+
+  function.invoke = invoke
+  compiled[:] = [(reference, code) for reference, code in compiled if reference() is not None]
+  compiled.append((weakref.ref(function), invoke))
+  return True
+
+def pause() -> None:
+  """
+    stops compiling lambdas and sends the compiled ones back to the interpreter until `resume`,
+    e.g. while the evaluator is being counted (see `lib/instrument.py`), the compiled code doesn't go through it
+  """
+  global paused
+  paused = True
+  for reference, invoke in compiled:
+    function = reference()
+    if function is not None and function.invoke is invoke:
+      function.invoke = None
+      function.calls = 0
+  compiled.clear()
+
+def resume() -> None:
+  """
+    lets lambdas get compiled again, the ones `pause` sent back to the interpreter once they're called `THRESHOLD` more times
+  """
+  global paused
+  paused = False
+
+def source_of(function: plp.Lambda) -> Optional[str]:
+  """
+    returns the python source the JIT would generate for a lambda (for debugging)
+  """
+  if function.params is None or not isinstance(function.env, GlobalEnv):
+    return None
+  try:
+    return Translator(function, function.env).translate()
+  except Unsupported:
+    return None
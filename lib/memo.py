@@ -0,0 +1,122 @@
+"""
+  caches of functions wrapped by `memoize` (see `lib/core.py`)
+
+  arguments are turned into keys by their structure, so equal lists, vectors, hashmaps, strings and numbers
+  built anew for every call still find the same entry, values PLP compares by identity (lambdas, builtins, lazy lists)
+  make the call skip the cache
+
+  a memoized function is a plain python function, so every engine calls it as fast as any builtin
+  and redefining the original name with it makes recursive calls in the body go through the cache too
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import lib.plp_types as plp
+import time
+
+# returned by `key` for arguments that can't be part of a key
+UNCACHEABLE = object()
+
+class Cache:
+  """
+    LRU cache of results, entries are evicted once there are more than `max_size` of them (`None` means no limit)
+    and expire `ttl` seconds after they were stored (`None` means never)
+  """
+  def __init__(self, max_size: Optional[int], ttl: Optional[float]):
+    self.max_size = max_size
+    self.ttl = ttl
+    # key -> (result, time it expires at)
+    self.entries: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  def get(self, key: Any) -> Any:
+    """
+      returns the cached result or `UNCACHEABLE` when there is none (or it has expired)
+    """
+    entry = self.entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return UNCACHEABLE
+    if self.ttl is not None and entry[1] <= time.monotonic():
+      del self.entries[key]
+      self.expirations += 1
+      self.misses += 1
+      return UNCACHEABLE
+    self.entries.move_to_end(key)
+    self.hits += 1
+    return entry[0]
+
+  def put(self, key: Any, result: Any) -> None:
+    expires = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+    self.entries[key] = (result, expires)
+    self.entries.move_to_end(key)
+    if self.max_size is not None and len(self.entries) > self.max_size:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def stats(self) -> plp.HashMap:
+    return plp.HashMap([
+      plp.Keyword("hits"), self.hits,
+      plp.Keyword("misses"), self.misses,
+      plp.Keyword("evictions"), self.evictions,
+      plp.Keyword("expirations"), self.expirations,
+      plp.Keyword("size"), len(self.entries),
+      plp.Keyword("max-size"), self.max_size if self.max_size is not None else plp.NIL,
+    ])
+
+def key(value: Any) -> Any:
+  """
+    returns a hashable key that is equal for values `=` considers equal, `UNCACHEABLE` if there is no such key
+  """
+  value_type = type(value)
+  # the type is part of the key, `1` and `1.0` (or `"a"` and `:a`) are different values
+  if value_type is int or value_type is float or value_type is plp.String or value_type is plp.Keyword or value_type is plp.Symbol:
+    return (value_type, value)
+  if value is plp.NIL or value is plp.TRUE or value is plp.FALSE:
+    return value
+  if value_type is plp.Vector:
+    return sequence_key(plp.Vector, value)
+  if value_type is plp.List or value_type is plp.PersistentList or value_type is plp.ListView:
+    # they all behave as lists and are equal to each other
+    return sequence_key(plp.List, value)
+  if value_type is plp.HashMap:
+    items = []
+    for item_key, item in value.items():
+      item = key(item)
+      if item is UNCACHEABLE:
+        return UNCACHEABLE
+      items.append((plp.hashmap_key(item_key), item))
+    return (plp.HashMap, frozenset(items))
+  if value_type is plp.NumVector:
+    return (plp.NumVector, value.data.typecode, value.data.tobytes())
+  return UNCACHEABLE
+
+def sequence_key(kind: type, sequence: Any) -> Any:
+  items = []
+  for item in sequence:
+    item = key(item)
+    if item is UNCACHEABLE:
+      return UNCACHEABLE
+    items.append(item)
+  return (kind, tuple(items))
+
+def memoize(function: Any, call_function: Callable[[Any, list[Any]], Any], cache: Cache) -> Callable[..., Any]:
+  """
+    returns a python function looking the arguments up in `cache` before calling `function` with them (using `call_function`)
+  """
+  def memoized(*args: Any) -> Any:
+    args_key = sequence_key(tuple, args)
+    if args_key is UNCACHEABLE:
+      return call_function(function, list(args))
+    result = cache.get(args_key)
+    if result is UNCACHEABLE:
+      result = call_function(function, list(args))
+      cache.put(args_key, result)
+    return result
+  memoized.cache = cache # type: ignore
+  # the memoized function, e.g. for the profiler to tell memoized lambdas from builtins
+  memoized.function = function # type: ignore
+  return memoized
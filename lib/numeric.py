@@ -0,0 +1,176 @@
+"""
+  bulk operations on `NumVector`s (see `lib/plp_types.py`) used by `num-vec`, the arithmetic and comparison builtins, `sum`, `min`, `max` and `dot`
+
+  every operation handles the whole array in one call running in C, either `map` with a function of the `operator` module
+  filling a new `array.array`, or a NumPy ufunc on a view of the array when NumPy is installed (it's optional)
+
+  integers are stored in 64 bits, an integer result that doesn't fit gives a plain `Vector` of python's (exact) integers
+  instead of wrapping around, the same as the operation would give on a plain vector of numbers
+"""
+
+from array import array
+from functools import reduce
+from itertools import repeat
+from typing import Any
+import operator
+import lib.plp_types as plp
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# NumPy dtypes matching the typecodes of the arrays
+DTYPES = {"q": "int64", "d": "float64"}
+
+# integers of a vector are in the range `[-LIMIT, LIMIT)`
+LIMIT = 2 ** 63
+
+# name of the builtin -> (python function, NumPy ufunc, whether it compares)
+OPERATORS: dict[str, tuple[Any, str, bool]] = {
+  "+": (operator.add, "add", False),
+  "-": (operator.sub, "subtract", False),
+  "*": (operator.mul, "multiply", False),
+  "/": (operator.truediv, "true_divide", False),
+  "<": (operator.lt, "less", True),
+  "<=": (operator.le, "less_equal", True),
+  ">": (operator.gt, "greater", True),
+  ">=": (operator.ge, "greater_equal", True),
+}
+
+def from_sequence(sequence: Any) -> plp.NumVector:
+  """
+    packs a sequence of numbers into a `NumVector`, it holds integers only if all the numbers are integers
+  """
+  if isinstance(sequence, plp.NumVector):
+    return sequence
+  items = list(sequence)
+  for item in items:
+    if not isinstance(item, (plp.Integer, plp.Float)):
+      raise TypeError("num-vec")
+  if not all(type(item) is plp.Integer for item in items):
+    return plp.NumVector(array("d", items))
+  for item in items:
+    if not -LIMIT <= item < LIMIT:
+      raise OverflowError(f"num-vec holds 64-bit integers, {item} doesn't fit")
+  return plp.NumVector(array("q", items))
+
+def typecode_of(operand: Any, name: str) -> str:
+  if isinstance(operand, plp.NumVector):
+    return operand.data.typecode
+  if isinstance(operand, plp.Integer):
+    return "q"
+  if isinstance(operand, plp.Float):
+    return "d"
+  raise TypeError(name)
+
+def magnitude(operand: Any) -> int:
+  """
+    the largest absolute value of an integer operand (a vector or a number)
+  """
+  if not isinstance(operand, plp.NumVector):
+    return abs(operand)
+  if len(operand) == 0:
+    return 0
+  return max(abs(max(operand.data)), abs(min(operand.data)))
+
+def may_overflow(name: str, a: Any, b: Any) -> bool:
+  """
+    whether an integer `+`, `-` or `*` of the operands can give a result that doesn't fit into 64 bits
+  """
+  if name == "*":
+    return magnitude(a) * magnitude(b) >= LIMIT
+  return magnitude(a) + magnitude(b) >= LIMIT
+
+def values(operand: Any) -> Any:
+  return operand.data if isinstance(operand, plp.NumVector) else operand
+
+def exact(function: Any, a: Any, b: Any) -> list[Any]:
+  """
+    applies `function` on the items with python's numbers, `a` or `b` can also be a plain `Vector` of an earlier result
+  """
+  if not isinstance(a, (plp.NumVector, plp.Vector)):
+    return list(map(function, repeat(a), values(b)))
+  if not isinstance(b, (plp.NumVector, plp.Vector)):
+    return list(map(function, values(a), repeat(b)))
+  return list(map(function, values(a), values(b)))
+
+def packed(typecode: str, items: list[Any]) -> Any:
+  """
+    `NumVector` of the items, or a plain `Vector` of them if some integer doesn't fit into 64 bits
+  """
+  try:
+    return plp.NumVector(array(typecode, items))
+  except OverflowError:
+    return plp.Vector(items)
+
+def as_numpy(operand: Any) -> Any:
+  if isinstance(operand, plp.NumVector):
+    # a view sharing the memory of the array, nothing is copied
+    return numpy.frombuffer(operand.data, dtype=DTYPES[operand.data.typecode]) # type: ignore
+  return operand
+
+def elementwise(name: str, a: Any, b: Any) -> Any:
+  """
+    applies a binary builtin to the items at the same positions, a number on either side is combined with every item
+
+    comparisons give a vector of `1`s and `0`s, division always gives floats, integers that don't fit give a plain `Vector`
+  """
+  function, ufunc, compares = OPERATORS[name]
+  a_typecode, b_typecode = typecode_of(a, name), typecode_of(b, name)
+  if isinstance(a, plp.NumVector) and isinstance(b, plp.NumVector) and len(a) != len(b):
+    raise ValueError(f"can't apply '{name}' on vectors of different lengths ({len(a)} and {len(b)})")
+  if name == "/" and (0 in b.data if isinstance(b, plp.NumVector) else b == 0):
+    raise ZeroDivisionError
+  if compares:
+    typecode = "q"
+  elif name == "/":
+    typecode = "d"
+  else:
+    typecode = "q" if a_typecode == b_typecode == "q" else "d"
+
+  # NumPy's integers wrap around silently, so results that may not fit are computed by python
+  if numpy is not None and (typecode == "d" or compares or not may_overflow(name, a, b)):
+    result = getattr(numpy, ufunc)(as_numpy(a), as_numpy(b))
+    return plp.NumVector(array(typecode, result.astype(DTYPES[typecode]).tobytes()))
+  return packed(typecode, exact(function, a, b))
+
+def fold(name: str, items: tuple[Any, ...]) -> Any:
+  """
+    `elementwise` for builtins taking any number of arguments (`+` and `*`), applied from left to right
+
+    once a result doesn't fit into a `NumVector`, the rest is computed on the plain `Vector` with python's integers
+  """
+  def step(a: Any, b: Any) -> Any:
+    if isinstance(a, plp.Vector):
+      typecode_of(b, name)
+      return plp.Vector(exact(OPERATORS[name][0], a, b))
+    return elementwise(name, a, b)
+  return reduce(step, items)
+
+def total(sequence: Any) -> plp.PLPType:
+  vector = from_sequence(sequence)
+  if numpy is not None and (vector.data.typecode == "d" or len(vector) * magnitude(vector) < LIMIT):
+    return numpy.sum(as_numpy(vector)).item()
+  return sum(vector.data)
+
+def minimum(sequence: Any) -> plp.PLPType:
+  vector = from_sequence(sequence)
+  if len(vector) == 0:
+    raise ValueError("can't find the minimum of an empty sequence")
+  return min(vector.data)
+
+def maximum(sequence: Any) -> plp.PLPType:
+  vector = from_sequence(sequence)
+  if len(vector) == 0:
+    raise ValueError("can't find the maximum of an empty sequence")
+  return max(vector.data)
+
+def dot(a: Any, b: Any) -> plp.PLPType:
+  a, b = from_sequence(a), from_sequence(b)
+  if len(a) != len(b):
+    raise ValueError(f"can't apply 'dot' on vectors of different lengths ({len(a)} and {len(b)})")
+  integers = a.data.typecode == b.data.typecode == "q"
+  if numpy is not None and (not integers or len(a) * magnitude(a) * magnitude(b) < LIMIT):
+    return numpy.dot(as_numpy(a), as_numpy(b)).item()
+  return sum(map(operator.mul, a.data, b.data))
@@ -0,0 +1,346 @@
+"""
+  persistent (immutable, structurally shared) collections backing PLP lists built by `append`/`prepend` and hashmaps
+
+  - `Vector` is a 32-way trie with a tail buffer, appending and replacing an item copy only one path of the trie
+  - `Map` is a hash array mapped trie, every node holds a 32-bit bitmap of used slots and a compact array of them
+
+  both never change once created, every update returns a new collection sharing the untouched nodes with the old one
+"""
+
+from typing import Any, Iterable, Iterator, Optional
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+class Vector:
+  """
+    persistent vector, `nth`, `set` and `conj` take O(log32 n)
+
+    items live in leaves of 32 items, the last (possibly partial) leaf is kept aside as `tail` so appending is mostly just copying it
+  """
+  __slots__ = ("count", "shift", "root", "tail")
+
+  def __init__(self, count: int = 0, shift: int = BITS, root: Optional[list] = None, tail: Optional[list] = None):
+    self.count = count
+    self.shift = shift
+    self.root: list = [] if root is None else root
+    self.tail: list = [] if tail is None else tail
+
+  @staticmethod
+  def from_iterable(items: Iterable[Any]) -> "Vector":
+    """
+      builds the vector bottom up in O(n) instead of appending the items one by one
+    """
+    items = list(items)
+    count = len(items)
+    if count == 0:
+      return Vector()
+    tail_start = ((count - 1) >> BITS) << BITS
+    nodes = [items[i:i + WIDTH] for i in range(0, tail_start, WIDTH)]
+    shift = BITS
+    while len(nodes) > WIDTH:
+      nodes = [nodes[i:i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+      shift += BITS
+    return Vector(count, shift, nodes, items[tail_start:])
+
+  def __len__(self) -> int:
+    return self.count
+
+  def tail_offset(self) -> int:
+    return 0 if self.count < WIDTH else ((self.count - 1) >> BITS) << BITS
+
+  def leaf(self, index: int) -> list:
+    if index >= self.tail_offset():
+      return self.tail
+    node = self.root
+    for level in range(self.shift, 0, -BITS):
+      node = node[(index >> level) & MASK]
+    return node
+
+  def nth(self, index: int) -> Any:
+    if not 0 <= index < self.count:
+      raise IndexError(index)
+    return self.leaf(index)[index & MASK]
+
+  def conj(self, item: Any) -> "Vector":
+    """
+      returns a new vector with `item` appended
+    """
+    if self.count - self.tail_offset() < WIDTH:
+      return Vector(self.count + 1, self.shift, self.root, self.tail + [item])
+    # the tail is full, it becomes a leaf of the trie (adding a level if the root is full as well)
+    shift = self.shift
+    if (self.count >> BITS) > (1 << shift):
+      root = [self.root, new_path(shift, self.tail)]
+      shift += BITS
+    else:
+      root = self.push_tail(self.shift, self.root, self.tail)
+    return Vector(self.count + 1, shift, root, [item])
+
+  def push_tail(self, level: int, parent: list, tail: list) -> list:
+    node = list(parent)
+    index = ((self.count - 1) >> level) & MASK
+    if level == BITS:
+      child = tail
+    elif index < len(parent):
+      child = self.push_tail(level - BITS, parent[index], tail)
+    else:
+      child = new_path(level - BITS, tail)
+    if index < len(node):
+      node[index] = child
+    else:
+      node.append(child)
+    return node
+
+  def set(self, index: int, item: Any) -> "Vector":
+    """
+      returns a new vector with the item at `index` replaced
+    """
+    if not 0 <= index < self.count:
+      raise IndexError(index)
+    if index >= self.tail_offset():
+      tail = list(self.tail)
+      tail[index & MASK] = item
+      return Vector(self.count, self.shift, self.root, tail)
+    return Vector(self.count, self.shift, assoc_path(self.shift, self.root, index, item), self.tail)
+
+  def leaves(self) -> Iterator[list]:
+    for start in range(0, self.tail_offset(), WIDTH):
+      yield self.leaf(start)
+    yield self.tail
+
+  def __iter__(self) -> Iterator[Any]:
+    for leaf in self.leaves():
+      yield from leaf
+
+  def __reversed__(self) -> Iterator[Any]:
+    for start in range(((self.count - 1) >> BITS) << BITS, -1, -WIDTH):
+      yield from reversed(self.leaf(start))
+
+def new_path(level: int, node: list) -> list:
+  while level > 0:
+    node = [node]
+    level -= BITS
+  return node
+
+def assoc_path(level: int, node: list, index: int, item: Any) -> list:
+  copied = list(node)
+  if level == 0:
+    copied[index & MASK] = item
+  else:
+    child = (index >> level) & MASK
+    copied[child] = assoc_path(level - BITS, node[child], index, item)
+  return copied
+
+# a hash is consumed 5 bits per level, keys whose whole hashes are the same end up in a `Collision` node
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+class Node:
+  """
+    node of `Map`, `array` holds `(key, value)` entries and child nodes in the order of the bits set in `bitmap`
+  """
+  __slots__ = ("bitmap", "array")
+
+  def __init__(self, bitmap: int, array: list):
+    self.bitmap = bitmap
+    self.array = array
+
+  def get(self, shift: int, key_hash: int, key: Any, default: Any) -> Any:
+    node: Any = self
+    while True:
+      if type(node) is Collision:
+        for entry_key, value in node.entries:
+          if entry_key == key:
+            return value
+        return default
+      bit = 1 << ((key_hash >> shift) & MASK)
+      if not node.bitmap & bit:
+        return default
+      item = node.array[(node.bitmap & (bit - 1)).bit_count()]
+      if type(item) is tuple:
+        return item[1] if item[0] == key else default
+      node = item
+      shift += BITS
+
+  def assoc(self, shift: int, key_hash: int, key: Any, value: Any) -> tuple["Node", bool]:
+    """
+      returns the updated node and whether the key was added (as opposed to replaced)
+    """
+    bit = 1 << ((key_hash >> shift) & MASK)
+    index = (self.bitmap & (bit - 1)).bit_count()
+    if not self.bitmap & bit:
+      array = list(self.array)
+      array.insert(index, (key, value))
+      return Node(self.bitmap | bit, array), True
+    item = self.array[index]
+    if type(item) is tuple:
+      if item[0] == key:
+        if item[1] is value:
+          return self, False
+        child: Any = (key, value)
+        added = False
+      else:
+        child = merge(shift + BITS, item, hash_of(item[0]), (key, value), key_hash)
+        added = True
+    else:
+      child, added = item.assoc(shift + BITS, key_hash, key, value)
+      if child is item:
+        return self, False
+    array = list(self.array)
+    array[index] = child
+    return Node(self.bitmap, array), added
+
+  def dissoc(self, shift: int, key_hash: int, key: Any) -> Optional[Any]:
+    """
+      returns the node without `key` (`self` if it isn't present), an entry tuple if only one is left or `None` when it's empty
+    """
+    bit = 1 << ((key_hash >> shift) & MASK)
+    if not self.bitmap & bit:
+      return self
+    index = (self.bitmap & (bit - 1)).bit_count()
+    item = self.array[index]
+    if type(item) is tuple:
+      if item[0] != key:
+        return self
+      child = None
+    else:
+      child = item.dissoc(shift + BITS, key_hash, key)
+      if child is item:
+        return self
+    array = list(self.array)
+    if child is None:
+      del array[index]
+      bitmap = self.bitmap & ~bit
+    else:
+      array[index] = child
+      bitmap = self.bitmap
+    if len(array) == 0:
+      return None
+    # a single entry is pulled up into the parent so the trie doesn't keep chains of one-entry nodes
+    if len(array) == 1 and type(array[0]) is tuple and shift > 0:
+      return array[0]
+    return Node(bitmap, array)
+
+  def __iter__(self) -> Iterator[tuple[Any, Any]]:
+    for item in self.array:
+      if type(item) is tuple:
+        yield item
+      else:
+        yield from item
+
+class Collision:
+  """
+    keys with identical hashes, they are compared linearly
+  """
+  __slots__ = ("key_hash", "entries")
+
+  def __init__(self, key_hash: int, entries: list[tuple[Any, Any]]):
+    self.key_hash = key_hash
+    self.entries = entries
+
+  def assoc(self, shift: int, key_hash: int, key: Any, value: Any) -> tuple[Any, bool]:
+    for i, (entry_key, entry_value) in enumerate(self.entries):
+      if entry_key == key:
+        if entry_value is value:
+          return self, False
+        entries = list(self.entries)
+        entries[i] = (key, value)
+        return Collision(self.key_hash, entries), False
+    return Collision(self.key_hash, self.entries + [(key, value)]), True
+
+  def dissoc(self, shift: int, key_hash: int, key: Any) -> Optional[Any]:
+    entries = [entry for entry in self.entries if entry[0] != key]
+    if len(entries) == len(self.entries):
+      return self
+    if len(entries) == 1:
+      return entries[0]
+    return Collision(self.key_hash, entries)
+
+  def __iter__(self) -> Iterator[tuple[Any, Any]]:
+    return iter(self.entries)
+
+def hash_of(key: Any) -> int:
+  return hash(key) & HASH_MASK
+
+def merge(shift: int, entry1: tuple[Any, Any], hash1: int, entry2: tuple[Any, Any], hash2: int) -> Any:
+  """
+    creates the smallest subtree holding two entries whose hashes agree on the bits used so far
+  """
+  if shift >= HASH_BITS:
+    return Collision(hash1, [entry1, entry2])
+  bit1 = 1 << ((hash1 >> shift) & MASK)
+  bit2 = 1 << ((hash2 >> shift) & MASK)
+  if bit1 == bit2:
+    return Node(bit1, [merge(shift + BITS, entry1, hash1, entry2, hash2)])
+  return Node(bit1 | bit2, [entry1, entry2] if bit1 < bit2 else [entry2, entry1])
+
+def build(shift: int, entries: list[tuple[int, Any, Any]]) -> Node:
+  """
+    node holding `(hash, key, value)` entries whose hashes agree on the bits before `shift`
+  """
+  buckets: dict[int, list[tuple[int, Any, Any]]] = {}
+  for entry in entries:
+    buckets.setdefault((entry[0] >> shift) & MASK, []).append(entry)
+  bitmap = 0
+  array: list = []
+  for index in sorted(buckets):
+    bucket = buckets[index]
+    bitmap |= 1 << index
+    if len(bucket) == 1:
+      array.append(bucket[0][1:])
+    elif shift + BITS >= HASH_BITS:
+      array.append(Collision(bucket[0][0], [entry[1:] for entry in bucket]))
+    else:
+      array.append(build(shift + BITS, bucket))
+  return Node(bitmap, array)
+
+EMPTY_NODE = Node(0, [])
+# marks a key that isn't present in `Map.get`
+MISSING = object()
+
+class Map:
+  """
+    persistent hash map (HAMT), `get`, `assoc` and `dissoc` take O(log32 n), the iteration order is unspecified
+  """
+  __slots__ = ("count", "root")
+
+  def __init__(self, count: int = 0, root: Node = EMPTY_NODE):
+    self.count = count
+    self.root = root
+
+  @staticmethod
+  def from_dict(items: dict[Any, Any]) -> "Map":
+    """
+      builds the map top down in one go instead of adding the entries one by one
+    """
+    if not items:
+      return Map()
+    return Map(len(items), build(0, [(hash_of(key), key, value) for key, value in items.items()]))
+
+  def __len__(self) -> int:
+    return self.count
+
+  def get(self, key: Any, default: Any = None) -> Any:
+    return self.root.get(0, hash_of(key), key, default)
+
+  def __contains__(self, key: Any) -> bool:
+    return self.root.get(0, hash_of(key), key, MISSING) is not MISSING
+
+  def assoc(self, key: Any, value: Any) -> "Map":
+    root, added = self.root.assoc(0, hash_of(key), key, value)
+    if root is self.root:
+      return self
+    return Map(self.count + 1 if added else self.count, root)
+
+  def dissoc(self, key: Any) -> "Map":
+    root = self.root.dissoc(0, hash_of(key), key)
+    if root is self.root:
+      return self
+    if root is None:
+      return Map()
+    return Map(self.count - 1, root)
+
+  def __iter__(self) -> Iterator[tuple[Any, Any]]:
+    return iter(self.root)
@@ -1,74 +1,454 @@
-from dataclasses import dataclass
+from array import array
 from .exceptions import UndefinedPLPTypeError
 from .env import Env
-from itertools import combinations
-from typing import Union, Any, Callable
+from itertools import islice
+from typing import Union, Any, Callable, Iterator, Optional
+import lib.persistent as persistent
 
-class Integer(int): pass
-class Float(float): pass
+# numbers are plain python `int`s and `float`s, the names are kept so the rest of the code reads as PLP types
+Integer = int
+Float = float
   
 class Boolean:
-  def __init__(self, boo: bool):
-    self.boo = boo
+  """
+    there are only two booleans, `TRUE` and `FALSE`, calling `Boolean(...)` returns one of them so they can be compared with `is`
+  """
+  __slots__ = ("boo",)
+  def __new__(cls, boo: Any) -> "Boolean":
+    return TRUE if boo else FALSE
   def __str__(self) -> str:
     if self.boo:
       return "true"
     return "false"
-  def __eq__(self, other: Any) -> bool:
-    return self.boo == other
+  def __reduce__(self) -> tuple:
+    return (Boolean, (self.boo,))
+
+TRUE: Boolean = object.__new__(Boolean)
+TRUE.boo = True
+FALSE: Boolean = object.__new__(Boolean)
+FALSE.boo = False
+
+class Null:
+  """
+    `nil`, `Null()` always returns the same `NIL`
+  """
+  __slots__ = ()
+  def __new__(cls) -> "Null":
+    return NIL
+  def __reduce__(self) -> tuple:
+    return (Null, ())
+
+NIL: Null = object.__new__(Null)
+
+class Interned(str):
+  """
+    base of `Symbol` and `Keyword`, there is only one instance of each name (kept in `table` of the class forever)
+
+    the symbols of the code and the keys of the environments are then the very same objects,
+    so dictionaries find them by identity without comparing the characters
+  """
+  __slots__ = ()
+  table: dict[str, "Interned"]
+  def __new__(cls, name: str) -> Any:
+    instance = cls.table.get(name)
+    if instance is None:
+      instance = cls.table[name] = str.__new__(cls, name)
+    return instance
 
 class String(str): pass
-class Symbol(str): pass
-class Null: pass
+class Symbol(Interned):
+  __slots__ = ()
+  table: dict[str, "Interned"] = {}
 class Comment: pass
-class Keyword(str): pass
+class Keyword(Interned):
+  __slots__ = ()
+  table: dict[str, "Interned"] = {}
 
 ATOMS = Union[Integer, Float, Boolean, Symbol, String, Keyword, Null, Comment]
 
-class List(list["PLPType"]): pass
+class List(list["PLPType"]):
+  # inline cache of `EVAL` for lists that are call sites: `(version of the global environment, value of the operator)`
+  cache: Optional[tuple[int, Any]] = None
+  def __reduce__(self) -> tuple:
+    # the cache is left out, it holds values of the running program (e.g. functions that can't be pickled)
+    return (List, (list(self),))
 
 class Vector(list["PLPType"]): pass
 
+class PersistentList:
+  """
+    list returned by `append` and `prepend`, it behaves (and prints) as `List` but shares its items with the list it was built from
+
+    prepended items are kept reversed in `front`, appended ones in `back`, so both operations take O(log32 n)
+  """
+  __slots__ = ("front", "back")
+
+  def __init__(self, front: persistent.Vector, back: persistent.Vector):
+    self.front = front
+    self.back = back
+
+  @staticmethod
+  def of(sequence: Any) -> "PersistentList":
+    if isinstance(sequence, PersistentList):
+      return sequence
+    return PersistentList(EMPTY_VECTOR, persistent.Vector.from_iterable(sequence))
+
+  def append(self, item: "PLPType") -> "PersistentList":
+    return PersistentList(self.front, self.back.conj(item))
+
+  def prepend(self, item: "PLPType") -> "PersistentList":
+    return PersistentList(self.front.conj(item), self.back)
+
+  def __len__(self) -> int:
+    return len(self.front) + len(self.back)
+
+  def __getitem__(self, index: Any) -> Any:
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    front = len(self.front)
+    if index < front:
+      return self.front.nth(front - 1 - index)
+    return self.back.nth(index - front)
+
+  def __iter__(self) -> Iterator["PLPType"]:
+    yield from reversed(self.front)
+    yield from self.back
+
+  def __eq__(self, other: Any) -> bool:
+    if not isinstance(other, (list, PersistentList, ListView, LazySeq)) or len(self) != len(other):
+      return False
+    return all(a == b for a, b in zip(self, other))
+
+  __hash__ = None # type: ignore
+
+class ListView:
+  """
+    window into another sequence returned by `splice`, `take` and `rest`, it behaves (and prints) as `List` but copies nothing
+
+    a view of a view points straight to the original sequence, so walking a list with `rest` takes O(1) memory per step
+  """
+  __slots__ = ("base", "offset", "length")
+
+  def __init__(self, base: Any, offset: int, length: int):
+    self.base = base
+    self.offset = offset
+    self.length = length
+
+  @staticmethod
+  def of(sequence: Any, start: int, stop: int) -> "ListView":
+    """
+      view of `sequence[start:stop]`, the bounds are clamped the same way python slices are
+    """
+    start, stop, _ = slice(start, stop).indices(len(sequence))
+    length = max(0, stop - start)
+    if isinstance(sequence, ListView):
+      return ListView(sequence.base, sequence.offset + start, length)
+    return ListView(sequence, start, length)
+
+  def __len__(self) -> int:
+    return self.length
+
+  def __getitem__(self, index: Any) -> Any:
+    if isinstance(index, slice):
+      if index.step is None or index.step == 1:
+        return ListView.of(self, index.start, index.stop)
+      return [self[i] for i in range(*index.indices(self.length))]
+    if index < 0:
+      index += self.length
+    if not 0 <= index < self.length:
+      raise IndexError(index)
+    return self.base[self.offset + index]
+
+  def __iter__(self) -> Iterator["PLPType"]:
+    base = self.base
+    for i in range(self.offset, self.offset + self.length):
+      yield base[i]
+
+  def __eq__(self, other: Any) -> bool:
+    if not isinstance(other, (list, PersistentList, ListView, LazySeq)) or len(self) != len(other):
+      return False
+    return all(a == b for a, b in zip(self, other))
+
+  __hash__ = None # type: ignore
+
+class Realized:
+  """
+    items of a lazy sequence realized so far, shared by the sequence and all the sequences sliced from it
+  """
+  __slots__ = ("source", "items", "iterator", "done")
+  CHUNK = 32
+
+  def __init__(self, source: Callable[[], Iterator["PLPType"]]):
+    self.source = source
+    self.items: list["PLPType"] = []
+    self.iterator: Optional[Iterator["PLPType"]] = None
+    self.done = False
+
+  def realize(self, count: int) -> int:
+    """
+      realizes (in chunks) at least the first `count` items if there are that many, returns the number of realized items
+    """
+    items = self.items
+    while len(items) < count and not self.done:
+      if self.iterator is None:
+        self.iterator = self.source()
+      chunk = list(islice(self.iterator, Realized.CHUNK))
+      if len(chunk) < Realized.CHUNK:
+        self.done = True
+        self.iterator = None
+      items.extend(chunk)
+    return len(items)
+
+class LazySeq:
+  """
+    list whose items are produced on demand by a python iterator, returned by `range` and `read-lines`
+
+    `source` returns a fresh iterator every time, so iterating (printing, `join`, `count`, ...) never keeps the items around,
+    only indexing realizes them into the shared `Realized` chunks
+
+    it's a window `[start, stop)` of the source, `take`, `splice` and `rest` just create another window,
+    `length` and `item` (direct access to an item of the source) are provided when the source knows them (e.g. a range)
+  """
+  __slots__ = ("source", "start", "stop", "length", "item", "realized")
+
+  def __init__(self, source: Callable[[], Iterator["PLPType"]], length: Optional[int] = None, item: Optional[Callable[[int], "PLPType"]] = None, start: int = 0, stop: Optional[int] = None, realized: Optional[Realized] = None):
+    self.source = source
+    self.start = start
+    self.stop = stop
+    self.length = length
+    self.item = item
+    self.realized = Realized(source) if realized is None else realized
+
+  def __iter__(self) -> Iterator["PLPType"]:
+    if self.start == 0 and self.stop is None:
+      return self.source()
+    return islice(self.source(), self.start, self.stop)
+
+  def __len__(self) -> int:
+    if self.length is None:
+      if self.realized.done:
+        self.length = max(0, min(len(self.realized.items), self.stop if self.stop is not None else len(self.realized.items)) - self.start)
+      else:
+        self.length = sum(1 for _ in self)
+    return self.length
+
+  def is_empty(self) -> bool:
+    if self.length is not None:
+      return self.length == 0
+    if self.stop is not None and self.stop <= self.start:
+      return True
+    return self.realized.realize(self.start + 1) <= self.start
+
+  def __getitem__(self, index: Any) -> Any:
+    if isinstance(index, slice):
+      if index.step is None or index.step == 1:
+        return self.slice(index.start or 0, index.stop)
+      return list(self)[index]
+    if index < 0:
+      index += len(self)
+    if index < 0 or (self.length is not None and index >= self.length) or (self.stop is not None and self.start + index >= self.stop):
+      raise IndexError(index)
+    if self.item is not None:
+      return self.item(self.start + index)
+    if self.realized.realize(self.start + index + 1) <= self.start + index:
+      raise IndexError(index)
+    return self.realized.items[self.start + index]
+
+  def slice(self, start: int, stop: Optional[int]) -> "LazySeq":
+    """
+      lazy `self[start:stop]`, only negative bounds need to know the length of the sequence
+    """
+    if start < 0 or (stop is not None and stop < 0) or self.length is not None:
+      start, stop, _ = slice(start, stop).indices(len(self))
+      stop = max(start, stop)
+      length: Optional[int] = stop - start
+    else:
+      length = None
+      if stop is not None:
+        stop = max(start, stop)
+        length = 0 if stop == start else None
+    new_stop = self.start + stop if stop is not None else self.stop
+    if self.stop is not None and new_stop is not None:
+      new_stop = min(new_stop, self.stop)
+    return LazySeq(self.source, length, self.item, self.start + start, new_stop, self.realized)
+
+  def __eq__(self, other: Any) -> bool:
+    if not isinstance(other, (list, PersistentList, ListView, LazySeq)) or len(self) != len(other):
+      return False
+    return all(a == b for a, b in zip(self, other))
+
+  __hash__ = None # type: ignore
+
+class NumVector:
+  """
+    homogeneous vector of numbers returned by `num-vec`, the numbers are stored unboxed in an `array.array`
+    of 64-bit integers (typecode `q`) or doubles (typecode `d`), so `lib/numeric.py` can work on all of them at once
+
+    it behaves as a sequence of its numbers
+  """
+  __slots__ = ("data",)
+
+  def __init__(self, data: array):
+    self.data = data
+
+  def __len__(self) -> int:
+    return len(self.data)
+
+  def __getitem__(self, index: Any) -> Any:
+    if isinstance(index, slice):
+      return NumVector(self.data[index])
+    return self.data[index]
+
+  def __iter__(self) -> Iterator["PLPType"]:
+    return iter(self.data)
+
+  def __eq__(self, other: Any) -> bool:
+    if isinstance(other, NumVector):
+      return self.data == other.data
+    if not isinstance(other, (list, PersistentList, ListView, LazySeq)) or len(self) != len(other):
+      return False
+    return all(a == b for a, b in zip(self, other))
+
+  __hash__ = None # type: ignore
+
+EMPTY_VECTOR = persistent.Vector()
+
+HASHMAP_KEY_TYPES = (Keyword, String, Integer, Float)
+
+def hashmap_key(key: Any) -> tuple[type, Any]:
+  # the type is part of the key, so `1` and `1.0` (or `:a` and `"a"`) are different keys
+  return (type(key), key)
+
 class HashMap:
+  """
+    persistent hashmap, `assoc` and `dissoc` return a new hashmap sharing most of its structure with the old one
+
+    `index` maps keys to their position in `entries` which keeps `(key, value)` pairs in insertion order,
+    removed entries leave a hole there until there are more holes than entries
+  """
   def __init__(self, items: list["PLPType"]):
-    hashmap = {}
     if len(items) % 2 != 0:
       raise SyntaxError("can't initialize hashmap with empty value")
-    for key in items[0::2]:
-      if not isinstance(key, (Keyword, String, Integer, Float)):
+    keys = items[0::2]
+    for key in keys:
+      if type(key) not in HASHMAP_KEY_TYPES:
         raise SyntaxError(f"can't have key of type '{type(key).__name__}' in a hashmap")
-    for (key1, key2) in combinations(items[0::2], 2):
-      if key1 == key2 and type(key1) is type(key2):
-        raise SyntaxError(f"can't initialize hashmap with two or more same keys: '{key1}'")
-    for i in range(0, len(items) - 1, 2):
-      hashmap[items[i]] = items[i + 1]
-    self.map: dict[ATOMS, "PLPType"] = hashmap
+    positions = {(type(key), key): i for i, key in enumerate(keys)}
+    if len(positions) != len(keys):
+      seen: set[tuple[type, Any]] = set()
+      for key in keys:
+        if hashmap_key(key) in seen:
+          raise SyntaxError(f"can't initialize hashmap with two or more same keys: '{key}'")
+        seen.add(hashmap_key(key))
+    self.index = persistent.Map.from_dict(positions)
+    self.entries = persistent.Vector.from_iterable(zip(keys, items[1::2]))
+  @staticmethod
+  def create(index: persistent.Map, entries: persistent.Vector) -> "HashMap":
+    hashmap = HashMap.__new__(HashMap)
+    hashmap.index = index
+    hashmap.entries = entries
+    return hashmap
+  def __reduce__(self) -> tuple:
+    # the index depends on hashes of strings, which are different in every run, so it's built again when unpickled
+    return (HashMap, ([item for entry in self.items() for item in entry],))
   def items(self) -> list[tuple[ATOMS, "PLPType"]]:
-    return list(self.map.items())
-  # BUG: update function could use some error checking
-  def update(self, key: ATOMS, val: "PLPType") -> None:
-    self.map[key] = val
-  def remove(self, key: ATOMS) -> None:
-    if key in self.map:
-      del self.map[key]
+    return [entry for entry in self.entries if entry is not None]
+  def keys(self) -> list[ATOMS]:
+    return [entry[0] for entry in self.entries if entry is not None]
+  def values(self) -> list["PLPType"]:
+    return [entry[1] for entry in self.entries if entry is not None]
+  def get(self, key: ATOMS, default: Any = None) -> Any:
+    position = self.index.get(hashmap_key(key))
+    if position is None:
+      return default
+    return self.entries.nth(position)[1]
+  def __contains__(self, key: ATOMS) -> bool:
+    return hashmap_key(key) in self.index
+  def __len__(self) -> int:
+    return len(self.index)
+  # BUG: assoc could use some error checking of the key type
+  def assoc(self, key: ATOMS, val: "PLPType") -> "HashMap":
+    typed_key = hashmap_key(key)
+    position = self.index.get(typed_key)
+    if position is None:
+      return HashMap.create(self.index.assoc(typed_key, len(self.entries)), self.entries.conj((key, val)))
+    return HashMap.create(self.index, self.entries.set(position, (key, val)))
+  def dissoc(self, key: ATOMS) -> "HashMap":
+    typed_key = hashmap_key(key)
+    position = self.index.get(typed_key)
+    if position is None:
+      return self
+    index = self.index.dissoc(typed_key)
+    entries = self.entries.set(position, None)
+    if len(entries) > 2 * len(index) + persistent.WIDTH:
+      # too many holes, renumber the remaining entries
+      remaining = [entry for entry in entries if entry is not None]
+      index = persistent.Map()
+      for i, (entry_key, _) in enumerate(remaining):
+        index = index.assoc(hashmap_key(entry_key), i)
+      entries = persistent.Vector.from_iterable(remaining)
+    return HashMap.create(index, entries)
   def __eq__(self, other: Any) -> bool:
-    if not isinstance(other, HashMap):
+    if not isinstance(other, HashMap) or len(self) != len(other):
       return False
-    return self.map == other.map
+    for key, value in self.items():
+      if key not in other or other.get(key) != value:
+        return False
+    return True
 
-PLPType = Union[ATOMS, List, Vector, HashMap, "Lambda", Callable[..., "PLPType"]]
-@dataclass
+PLPType = Union[ATOMS, List, Vector, PersistentList, ListView, LazySeq, NumVector, HashMap, "Lambda", Callable[..., "PLPType"]]
 class Lambda:
-  ast: PLPType
-  get_env: Callable[[list[PLPType]], Env]
+  # a plain class instead of a dataclass, importing `dataclasses` (and `inspect` with it) took a good part of the startup
+
+  # engines that compile the body ahead of time provide a method running a call that returns a tail call it ends with (see `eval.step`)
+  step: Optional[Callable[[list[PLPType]], Any]] = None
+
+  def __init__(
+    self,
+    ast: PLPType,
+    get_env: Callable[[list[PLPType]], Env],
+    invoke: Optional[Callable[[list[PLPType]], PLPType]] = None,
+    params: Optional[list["Symbol"]] = None,
+    env: Optional[Env] = None,
+    calls: int = 0,
+  ):
+    self.ast = ast
+    self.get_env = get_env
+    # engines that compile the body ahead of time provide a direct entry point taking evaluated arguments
+    self.invoke = invoke
+    # set by `EVAL` for lambdas it creates, the JIT needs them to translate the body
+    self.params = params
+    self.env = env
+    # number of calls made by `EVAL`, lambdas become candidates for the JIT once it reaches `jit.THRESHOLD`
+    self.calls = calls
+
+  def __eq__(self, other: Any) -> bool:
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return (self.ast, self.get_env, self.invoke, self.params, self.env, self.calls) == (other.ast, other.get_env, other.invoke, other.params, other.env, other.calls)
+
+  __hash__ = None # type: ignore
 
 def is_defined_or_true(arg: PLPType) -> bool:
-  return not (isinstance(arg, Null) or (arg == False and isinstance(arg, Boolean)))
+  return arg is not NIL and arg is not FALSE
 
 def is_function(possible_function: Any) -> bool:
   return isinstance(possible_function, type(lambda: None))
 
+def to_ast(value: PLPType) -> PLPType:
+  """
+    turns persistent lists (e.g. built by `append`), views and lazy sequences back into `List`s, so a value can be evaluated as code
+  """
+  if isinstance(value, (PersistentList, ListView, LazySeq)):
+    return List([to_ast(a) for a in value])
+  if isinstance(value, (List, Vector)):
+    items = [to_ast(a) for a in value]
+    if any(a is not b for a, b in zip(items, value)):
+      return type(value)(items)
+  return value
+
 def py_to_plp_type(var: Any) -> PLPType:
-  if isinstance(var, int): return Integer(var)
-  elif isinstance(var, float): return Float(var)
+  if isinstance(var, (int, float)): return var
   raise UndefinedPLPTypeError(var)
@@ -7,12 +7,14 @@ def print_ast(ast: PLPType | FunctionType, print_readably: bool = True) -> None:
 
 def format(ast: PLPType | FunctionType, print_readably: bool = True) -> str:
   match ast:
-    case plp.List():
+    case plp.List() | plp.PersistentList() | plp.ListView() | plp.LazySeq():
       return f"({format_sequence(ast, " ", print_readably)})"
     case plp.Vector():
       return f"[{format_sequence(ast, " ", print_readably)}]"
+    case plp.NumVector():
+      return f"#num[{format_sequence(ast, " ", print_readably)}]"
     case plp.HashMap():
-      items = [f"{format(key, print_readably)} {format(value, print_readably)}" for key, value in ast.map.items()]
+      items = [f"{format(key, print_readably)} {format(value, print_readably)}" for key, value in ast.items()]
       return "{" + " ".join(items) + "}"
     case plp.Integer():
       return str(ast)
@@ -41,5 +43,5 @@ def format(ast: PLPType | FunctionType, print_readably: bool = True) -> str:
     case _:
       return f"#<function '{ast.__name__}'>"
 
-def format_sequence(sequence: plp.List | plp.Vector | list[PLPType], separator: str = " ", print_readably: bool = True) -> str:
+def format_sequence(sequence: plp.List | plp.Vector | plp.PersistentList | plp.ListView | plp.LazySeq | plp.NumVector | list[PLPType], separator: str = " ", print_readably: bool = True) -> str:
   return separator.join(format(a, print_readably) for a in sequence)
\ No newline at end of file
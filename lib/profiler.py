@@ -0,0 +1,413 @@
+"""
+  profilers of PLP functions: the deterministic one (`Profiler`) started by `main.py --profile` or the `(profile expr)` special form
+  and the sampling one (`Sampler`) started by `main.py --sample`
+
+  nothing in the engines checks whether profiling is on, instead every function bound in the global environment
+  is replaced by a wrapper when a session starts (and functions defined while it runs are wrapped as they're defined),
+  the original values are put back once the session stops, so there is no cost at all while no profiler is running
+
+  builtins are wrapped by python functions and lambdas replaced by a `ProfiledLambda` with its own `invoke`, every engine calls both
+  the same way it calls any other builtin or a lambda compiled by another engine, functions are identified by the name they were
+  defined under, the time spent in anonymous lambdas (e.g. passed to `map`) counts as the time of the function calling them
+
+  a lambda memoized under its name (`(define fib (memoize fib))`) is reported under that name as a "memoized lambda",
+  its calls are all calls going through the cache (hits included) and its time includes the evaluation of the lambda on misses
+
+  both profilers run lambdas on a trampoline (see `TrampolineSession`), tail calls between them don't nest on the python stack,
+  the sampling profiler leaves builtins as they are, its thread finds the one running on the python stack (see `Sampler.running_builtin`)
+"""
+
+from abc import ABC, abstractmethod
+from lib.env import Env, GlobalEnv, VERSIONS
+from lib.helper import create_relative_path_for_file
+from lib.plp_types import PLPType
+from types import CodeType, FunctionType
+from typing import Any, Callable, Optional
+import lib.eval as evaluator
+import lib.plp_types as plp
+import sys
+import time
+
+# the running session, there is at most one at a time
+active: Optional["Session"] = None
+
+def kind_of(function: FunctionType) -> str:
+  return "memoized lambda" if hasattr(function, "cache") and isinstance(getattr(function, "function", None), plp.Lambda) else "builtin"
+
+class Entry:
+  """
+    statistics of one function, times are in nanoseconds
+
+    `total_time` of a recursive function counts only its outermost calls so the time isn't counted several times
+  """
+  __slots__ = ("name", "kind", "calls", "self_time", "total_time", "depth")
+
+  def __init__(self, name: str, kind: str):
+    self.name = name
+    self.kind = kind
+    self.calls = 0
+    self.self_time = 0
+    self.total_time = 0
+    # number of calls of the function currently running
+    self.depth = 0
+
+class ProfiledLambda(plp.Lambda):
+  """
+    lambda standing in for a profiled one, engines call it through `invoke`
+  """
+  def __init__(self, original: plp.Lambda, name: str, invoke: Callable[[list[PLPType]], PLPType]):
+    super().__init__(original.ast, original.get_env, invoke, original.params, original.env)
+    self.original = original
+    self.name = name
+
+class Session(ABC):
+  """
+    wraps functions of the global environment while it runs, subclasses decide what the wrappers record (see `wrapper`)
+  """
+  def __init__(self, global_env: GlobalEnv):
+    self.global_env = global_env
+    self.started = 0
+    self.elapsed = 0
+
+  @abstractmethod
+  def wrapper(self, name: str, kind: str, call: Callable[..., PLPType]) -> Callable[..., PLPType]:
+    """
+      returns a python function calling `call` with its arguments, `kind` is "builtin", "lambda" or "memoized lambda"
+    """
+
+  @abstractmethod
+  def write(self, path: Optional[str]) -> None:
+    """
+      prints what the session recorded, or writes it to a file when a path is given
+    """
+
+  def invoke(self, name: str, original: plp.Lambda) -> Callable[[list[PLPType]], PLPType]:
+    """
+      returns the `invoke` of the lambda standing in for `original`, it calls `original` through `wrapper`
+    """
+    return self.wrapper(name, "lambda", lambda args: evaluator.call_function(original, args))
+
+  def wrap(self, name: str, value: Any) -> Any:
+    """
+      returns a profiled version of a function defined under `name`, other values (and already wrapped functions) are returned as they are
+    """
+    if type(value) is FunctionType:
+      if hasattr(value, "profiled_original"):
+        return value
+      wrapper = self.wrapper(name, kind_of(value), value)
+      # attributes such as the cache of a memoized function stay reachable, and the function still prints the same
+      wrapper.__dict__.update(value.__dict__)
+      wrapper.__name__ = value.__name__
+      wrapper.profiled_original = value # type: ignore
+      return wrapper
+    if isinstance(value, plp.Lambda) and not isinstance(value, ProfiledLambda):
+      return ProfiledLambda(value, name, self.invoke(name, value))
+    return value
+
+  def start(self) -> None:
+    global active
+    if active is not None:
+      raise RuntimeError("a profiler is already running")
+    data = self.global_env.data
+    for key in list(data):
+      data[key] = self.wrap(key, data[key])
+    self.global_env.version = next(VERSIONS)
+    # an attribute of the instance shadows the method, definitions made during the session are wrapped too
+    self.global_env.set = self.define # type: ignore
+    active = self
+    self.started = time.perf_counter_ns()
+
+  def define(self, key: plp.Symbol, value: Any) -> Any:
+    return GlobalEnv.set(self.global_env, key, self.wrap(key, value))
+
+  def stop(self) -> None:
+    global active
+    self.elapsed = time.perf_counter_ns() - self.started
+    active = None
+    del self.global_env.set
+    data = self.global_env.data
+    for key, value in data.items():
+      if isinstance(value, ProfiledLambda):
+        data[key] = value.original
+      elif type(value) is FunctionType and hasattr(value, "profiled_original"):
+        data[key] = value.profiled_original # type: ignore
+    self.global_env.version = next(VERSIONS)
+
+class TrampolineSession(Session):
+  """
+    session that follows lambdas on a trampoline instead of nesting their calls in wrappers
+
+    the lambda standing in for a profiled one runs the body of the original (see `eval.step`), a call the body ends with
+    comes back as `TailCall` and the same loop makes it, the python stack stays as flat as it is without a session,
+    the session only learns (`enter` and `leave`) which profiled lambda runs, anonymous lambdas don't change it
+  """
+  @abstractmethod
+  def enter(self, name: str) -> None:
+    """
+      a call of the lambda defined under `name` starts
+    """
+
+  @abstractmethod
+  def leave(self, name: str) -> None:
+    """
+      the call of `name` that started last has ended (returned, raised or made a tail call)
+    """
+
+  def invoke(self, name: str, original: plp.Lambda) -> Callable[[list[PLPType]], PLPType]:
+    enter = self.enter
+    leave = self.leave
+    step = evaluator.step
+    def unwinding_call(args: list[PLPType]) -> PLPType:
+      if active is not self:
+        # the lambda outlived its session (e.g. it was stored in a list)
+        return evaluator.call_function(original, args)
+      function: plp.Lambda = original
+      running = name
+      enter(running)
+      try:
+        while True:
+          result = step(function, args)
+          if type(result) is not evaluator.TailCall:
+            return result
+          function, args = result.function, result.args
+          if type(function) is ProfiledLambda:
+            leave(running)
+            running = function.name
+            enter(running)
+            function = function.original
+      finally:
+        leave(running)
+    return unwinding_call
+
+  def wrapper(self, name: str, kind: str, call: Callable[..., PLPType]) -> Callable[..., PLPType]:
+    enter = self.enter
+    leave = self.leave
+    def tracked_call(*args: Any) -> PLPType:
+      if active is not self:
+        # the wrapper outlived its session (e.g. it was stored in a list)
+        return call(*args)
+      enter(name)
+      try:
+        return call(*args)
+      finally:
+        leave(name)
+    return tracked_call
+
+class Profiler(TrampolineSession):
+  """
+    deterministic profiler, counts every call and measures how long it took
+  """
+  def __init__(self, global_env: GlobalEnv):
+    super().__init__(global_env)
+    self.entries: dict[str, Entry] = {}
+    # start of every running profiled call and time spent in the calls it made (innermost last)
+    self.starts: list[int] = []
+    self.children: list[int] = []
+
+  def entry(self, name: str, kind: str) -> Entry:
+    entry = self.entries.get(name)
+    if entry is None:
+      entry = self.entries[name] = Entry(name, kind)
+    entry.kind = kind
+    return entry
+
+  def enter(self, name: str) -> None:
+    self.entries[name].depth += 1
+    self.children.append(0)
+    self.starts.append(time.perf_counter_ns())
+
+  def leave(self, name: str) -> None:
+    elapsed = time.perf_counter_ns() - self.starts.pop()
+    children = self.children
+    entry = self.entries[name]
+    entry.calls += 1
+    entry.self_time += elapsed - children.pop()
+    entry.depth -= 1
+    if entry.depth == 0:
+      entry.total_time += elapsed
+    if children:
+      children[-1] += elapsed
+
+  def invoke(self, name: str, original: plp.Lambda) -> Callable[[list[PLPType]], PLPType]:
+    self.entry(name, "lambda")
+    return super().invoke(name, original)
+
+  def wrapper(self, name: str, kind: str, call: Callable[..., PLPType]) -> Callable[..., PLPType]:
+    self.entry(name, kind)
+    return super().wrapper(name, kind, call)
+
+  def sorted_entries(self) -> list[Entry]:
+    # functions that weren't called during the session are left out
+    return sorted((e for e in self.entries.values() if e.calls), key=lambda e: (-e.self_time, e.name))
+
+  def report(self) -> str:
+    """
+      table of the called functions sorted by their self time
+    """
+    lines = [
+      f"profile: {self.elapsed / 1e6:.3f} ms",
+      f"{'calls':>10} {'self ms':>12} {'self %':>7} {'total ms':>12}  name",
+    ]
+    for e in self.sorted_entries():
+      share = e.self_time / self.elapsed * 100 if self.elapsed else 0.0
+      lines.append(f"{e.calls:>10} {e.self_time / 1e6:>12.3f} {share:>6.1f}% {e.total_time / 1e6:>12.3f}  {e.name} ({e.kind})")
+    return "\n".join(lines)
+
+  def to_json(self) -> dict[str, Any]:
+    return {
+      "total_ms": self.elapsed / 1e6,
+      "functions": [
+        {"name": e.name, "kind": e.kind, "calls": e.calls, "self_ms": e.self_time / 1e6, "total_ms": e.total_time / 1e6}
+        for e in self.sorted_entries()
+      ],
+    }
+
+  def write(self, json_path: Optional[str]) -> None:
+    # the report is written as JSON
+    if json_path is None:
+      print(self.report())
+      return
+    # imported here, only JSON output needs it
+    import json
+    with open(json_path, "w") as file:
+      json.dump(self.to_json(), file, indent=2)
+
+class Sampler(TrampolineSession):
+  """
+    sampling profiler, the trampoline of lambdas (and the wrappers of memoized ones) only keeps a stack of names
+    of the running functions and a background thread counts the stacks it finds there `rate` times a second
+
+    builtins aren't wrapped, so their calls cost nothing extra, instead the thread looks at the python stack of the sampled thread
+    and adds the builtin running on top of the innermost lambda (if there is one), a builtin calling lambdas (e.g. `map`)
+    therefore shows up only while it isn't in one of them
+
+    the counts are written in the collapsed stack format of flame graphs (https://github.com/brendangregg/FlameGraph),
+    one line per stack `root;outer;...;inner count`, the root frame is the name of what was sampled (e.g. the script)
+  """
+  def __init__(self, global_env: GlobalEnv, rate: float = 1000, root: str = "plp"):
+    if rate <= 0:
+      raise ValueError(f"sampling rate has to be positive (got {rate})")
+    super().__init__(global_env)
+    self.interval = 1 / rate
+    self.root = root
+    self.stack: list[str] = []
+    self.samples: dict[tuple[str, ...], int] = {}
+    # names of the builtins by their code, and code of the trampoline and the wrappers which stand for an item of `stack`
+    self.builtins: dict[CodeType, str] = {}
+    self.boundaries: set[CodeType] = set()
+    self.thread_id = 0
+    self.stopped: Optional["threading.Event"] = None
+    self.thread: Optional["threading.Thread"] = None
+    self.switch_interval = 0.0
+
+  def enter(self, name: str) -> None:
+    self.stack.append(name)
+
+  def leave(self, name: str) -> None:
+    self.stack.pop()
+
+  def wrap(self, name: str, value: Any) -> Any:
+    if type(value) is FunctionType and kind_of(value) == "builtin":
+      self.builtins[value.__code__] = name
+      return value
+    return super().wrap(name, value)
+
+  def invoke(self, name: str, original: plp.Lambda) -> Callable[[list[PLPType]], PLPType]:
+    invoke = super().invoke(name, original)
+    self.boundaries.add(invoke.__code__)
+    return invoke
+
+  def wrapper(self, name: str, kind: str, call: Callable[..., PLPType]) -> Callable[..., PLPType]:
+    wrapper = super().wrapper(name, kind, call)
+    self.boundaries.add(wrapper.__code__)
+    return wrapper
+
+  def running_builtin(self) -> Optional[str]:
+    """
+      name of the builtin the sampled thread runs on top of its innermost lambda, the python stack is searched from the top
+      only up to the frame of the lambda
+    """
+    frame = sys._current_frames().get(self.thread_id)
+    builtins = self.builtins
+    boundaries = self.boundaries
+    while frame is not None:
+      code = frame.f_code
+      if code in boundaries:
+        return None
+      name = builtins.get(code)
+      if name is not None:
+        return name
+      frame = frame.f_back
+    return None
+
+  def sample(self) -> None:
+    stack = self.stack
+    samples = self.samples
+    while not self.stopped.wait(self.interval): # type: ignore
+      # copying the list is atomic (it happens under the GIL), the stack is never seen half-updated,
+      # the sampled thread may rarely get to run before the python stack is searched though
+      key = tuple(stack)
+      builtin = self.running_builtin()
+      if builtin is not None:
+        key += (builtin,)
+      samples[key] = samples.get(key, 0) + 1
+
+  def start(self) -> None:
+    # imported here, `threading` would take a good part of the startup of every run
+    import threading
+    self.stopped = threading.Event()
+    self.thread_id = threading.get_ident()
+    super().start()
+    # the sampling thread gets to run only as often as python switches threads
+    self.switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(min(self.switch_interval, self.interval))
+    self.thread = threading.Thread(target=self.sample, name="plp-sampler", daemon=True)
+    self.thread.start()
+
+  def stop(self) -> None:
+    self.stopped.set() # type: ignore
+    if self.thread is not None:
+      self.thread.join()
+    sys.setswitchinterval(self.switch_interval)
+    super().stop()
+
+  def collapsed(self) -> str:
+    lines = [
+      ";".join((self.root, *stack)) + f" {count}"
+      for stack, count in sorted(self.samples.items())
+    ]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+  def write(self, path: Optional[str]) -> None:
+    if path is None:
+      print(self.collapsed(), end="")
+      return
+    with open(path, "w") as file:
+      file.write(self.collapsed())
+
+def global_env_of(env: Env) -> GlobalEnv:
+  while env.outer is not None:
+    env = env.outer
+  return env # type: ignore
+
+def profile(global_env: GlobalEnv, evaluate: Callable[[], PLPType], json_path: PLPType = plp.NIL) -> PLPType:
+  """
+    evaluates an expression (`evaluate`) under a new profiler session and prints its report (or writes it as JSON to `json_path`)
+
+    when a session is already running (e.g. started by `--profile`) the expression just becomes part of it
+  """
+  if json_path is not plp.NIL and not isinstance(json_path, plp.String):
+    raise TypeError("operator 'profile' expects the second argument to be a path of a JSON file")
+  if active is not None:
+    return evaluate()
+  session = Profiler(global_env)
+  session.start()
+  try:
+    value = evaluate()
+  finally:
+    session.stop()
+  if json_path is plp.NIL:
+    session.write(None)
+  else:
+    session.write(create_relative_path_for_file(json_path))
+  return value
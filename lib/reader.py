@@ -1,128 +1,129 @@
-from .helper import is_float, is_int, is_string
-from .plp_types import Integer, Symbol, List, Float, Boolean, Vector, HashMap, PLPType, String, Keyword, Null, ATOMS
-from typing import Optional
+from .plp_types import Symbol, List, Vector, HashMap, PLPType, String, Keyword, TRUE, FALSE, NIL
+from typing import Iterable, Iterator, Optional
 import re
 
-class Reader:
-  """
-    Reader class stores tokens which are used to construct an AST
-  """
-  def __init__(self, tokens: list[str]):
-    self.tokens = tokens
-    self.position = 0
+# splits text into tokens in one pass, the same tokens as the ones of https://norvig.com/lispy2.html
+SCANNER = re.compile(r"""[\s,]*(~@|[\[\]{}()'`~^@]|"(?:\\.|[^\\"])*"?|;.*|[^\s\[\]{}('"`,;)]*)""")
+CLOSED_STRING = re.compile(r'"(?:\\.|[^\\"])*"')
 
-  def next(self) -> Optional[str]:
-    if self.position < len(self.tokens):
-      token = self.tokens[self.position]
-      self.position += 1
-      return token
-    return None
-
-  def get(self) -> Optional[str]:
-    if self.position < len(self.tokens):
-      return self.tokens[self.position]
-    return None
+CLOSING = {"(": ")", "[": "]", "{": "}"}
+DIGITS = "0123456789"
+# words `float()` accepts as numbers
+FLOAT_WORDS = {sign + word for sign in ("", "+", "-") for word in ("inf", "infinity", "nan")}
+QUOTE = Symbol("quote")
+# atoms that aren't numbers, they are the same objects every time they're read (symbols and keywords are interned anyway)
+ATOM_CACHE: dict[str, PLPType] = {"true": TRUE, "false": FALSE, "nil": NIL}
 
 def read_raw_string(input: str) -> PLPType:
   """
     reads raw string and returns it's AST (abstract-syntax-tree) form using PLP syntax
   """
-  tokens = tokenize(input)
-  if len(tokens) == 0:
-    raise Exception("empty line!")
-  reader = Reader(tokens)
-  return read_token(reader)
-  
+  for form in read_forms([input]):
+    return form
+  raise Exception("empty line!")
+
 def tokenize(body: str) -> list[str]:
   """
     splits raw string into specific pre-defined segments (using a given regular expression) that can be then further evaluated
   """
-  # source https://norvig.com/lispy2.html
-  pattern = re.compile(r"""[\s,]*(~@|[\[\]{}()'`~^@]|"(?:\\.|[^\\"])*"?|;.*|[^\s\[\]{}('"`,;)]*)""")
-  return [token for token in pattern.findall(body) if token.strip()]
+  return [token for token in SCANNER.findall(body) if token]
 
-def read_token(reader: Reader) -> PLPType:
-  """
-    transforms a token into it's PLP internal representation
+def read_forms(chunks: Iterable[str]) -> Iterator[PLPType]:
   """
-  token = reader.get()
-  assert token is not None
-  # BUG: if comment is the last token, it throws error as undefined symbol
-  #      i honestly don't the what's the best solution here so i'm leaving this open
-  if token[0] == ";":
-    reader.next()
-    return read_token(reader)
-  match token:
-    # quote
-    case "\'":
-      reader.next()
-      return List([Symbol("quote"), read_token(reader)])
-    # could be expanded to parse quasiquote, unquote, ...
-    # beginning of a list expression
-    case "(":
-      return read_list(reader)
-    case ")":
-      raise EOFError('unexpected ")"')
-    # beginning of a vector
-    case "[":
-      return read_vector(reader)
-    case "]":
-      raise EOFError('unexpected "]"')
-    # beginning of a hash map
-    case "{":
-      return read_hash_map(reader)
-    case "}":
-      raise EOFError('unexpeced "}"')
-    case _:
-      return read_atom(reader)
+    reads top-level forms from text coming in chunks (e.g. lines of an open file) and yields each one as soon as it is complete
 
+    a chunk is tokenized only once the forms before it were taken, a string literal left open at the end of a chunk continues in the next one
 
-def read_sequence(reader: Reader, end: str) -> list[PLPType]:
+    tokens are classified by their first character in a single loop, nested collections are kept on an explicit stack
+    of `(opening bracket, items)` instead of recursing, a quote is an entry `("'", [])` wrapping the next finished form
   """
-    handles tokens that are a sequence denoted by specific symbol `end`
-  """
-  result: list[PLPType] = []
-  token = reader.next()
-  while True:
-    token = reader.get()
-    if token == end:
-      reader.next()
-      break
-    if token is None:
-      raise EOFError(f'missing closing "{end}"')
-    result.append(read_token(reader))
-  return result
-
-def read_list(reader: Reader) -> List:
-  return List(read_sequence(reader, ")"))
+  stack: list[tuple[str, list[PLPType]]] = []
+  pending = ""
+  for chunk in chunks:
+    tokens = tokenize(pending + chunk if pending else chunk)
+    pending = ""
+    if tokens and tokens[-1][0] == '"' and not CLOSED_STRING.fullmatch(tokens[-1]):
+      # an open string can only be the last token if it runs to the end of the chunk
+      pending = tokens.pop()
+    for token in tokens:
+      first = token[0]
+      if first == "(" or first == "[" or first == "{":
+        stack.append((first, []))
+        continue
+      if first == ")" or first == "]" or first == "}":
+        if not stack or CLOSING.get(stack[-1][0]) != first:
+          raise EOFError(f'unexpected "{first}"')
+        opening, items = stack.pop()
+        if opening == "(":
+          form: PLPType = List(items)
+        elif opening == "[":
+          form = Vector(items)
+        else:
+          form = HashMap(items)
+      elif first == ";":
+        continue
+      elif first == "'":
+        stack.append(("'", []))
+        continue
+      elif first == '"':
+        form = read_string(token)
+      else:
+        form = ATOM_CACHE.get(token) # type: ignore
+        if form is None:
+          form = read_atom(token)
 
-def read_vector(reader: Reader) -> Vector:
-  return Vector(read_sequence(reader, "]"))
+      # the finished form completes all the quotes waiting for it
+      while stack and stack[-1][0] == "'":
+        stack.pop()
+        form = List([QUOTE, form])
+      if stack:
+        stack[-1][1].append(form)
+      else:
+        yield form
 
-def read_hash_map(reader: Reader) -> HashMap:
-  return HashMap(read_sequence(reader, "}"))
+  if pending:
+    read_string(pending)
+  if stack:
+    opening = stack[-1][0]
+    if opening == "'":
+      raise EOFError("expected a form after \"'\"")
+    raise EOFError(f'missing closing "{CLOSING[opening]}"')
 
-def read_atom(reader: Reader) -> ATOMS:
-  token = reader.get()
-  assert token is not None
-  if is_int(token):
-    token = Integer(int(token))
-  elif is_float(token):
-    token = Float(float(token))
-  elif is_string(token):
-    string = token[1:-1].replace('\\\\', '\b').replace('\\"', '"').replace('\\n', '\n').replace('\b', '\\')
-    token = String(string)
-  elif token[0] == "\"":
+def read_string(token: str) -> String:
+  if not CLOSED_STRING.fullmatch(token):
     raise EOFError("expected closing '\"'")
-  elif token[0] == ":":
-    token = Keyword(token[1:])
-  elif token == "true":
-    token = Boolean(True)
-  elif token == "false":
-    token = Boolean(False)
-  elif token == "nil":
-    token = Null()
+  return String(token[1:-1].replace('\\\\', '\b').replace('\\"', '"').replace('\\n', '\n').replace('\b', '\\'))
+
+def read_atom(token: str) -> PLPType:
+  """
+    classifies an atom by its first characters, only tokens that look like numbers are given to `int()` and `float()`
+  """
+  first = token[0]
+  if token.isascii():
+    if first in DIGITS or (first in "+-." and len(token) > 1 and (token[1] in DIGITS or (token[1] == "." and len(token) > 2 and token[2] in DIGITS))):
+      if token.isdigit() or (first in "+-" and token[1:].isdigit()):
+        return int(token)
+      number = read_number(token)
+      if number is not None:
+        return number
+    elif (first in "iInN" or (first in "+-" and len(token) > 1 and token[1] in "iInN")) and token.lower() in FLOAT_WORDS:
+      return float(token)
   else:
-    token = Symbol(token)
-  reader.next()
-  return token
\ No newline at end of file
+    # python also accepts digits of other scripts
+    number = read_number(token)
+    if number is not None:
+      return number
+  atom = Keyword(token[1:]) if first == ":" else Symbol(token)
+  ATOM_CACHE[token] = atom
+  return atom
+
+def read_number(token: str) -> Optional[PLPType]:
+  if "." not in token:
+    try:
+      return int(token)
+    except ValueError:
+      pass
+  try:
+    return float(token)
+  except ValueError:
+    return None
@@ -1,28 +1,188 @@
-from lib.env import Env
+from lib.env import Env, GlobalEnv, VERSIONS
+from lib.helper import create_relative_path_for_file
 from lib.plp_types import PLPType
 from lib.eval import EVAL, EVAL_RETURN_TYPE
+from types import FunctionType
+from typing import Callable, Iterator, Optional
+import importlib
+import lib.ast_cache as ast_cache
+import lib.clone as clone
 import lib.core as core
+import lib.instrument as instrument
 import lib.plp_types as plp
 import lib.reader as reader
+import os
 
-global_environment = Env()
-for symbol, value in core.ns.items():
-  global_environment.set(plp.Symbol(symbol), value)
-
-# BUG? this takes the global envinronment
-#      but if i want to use eval within some other env
-#      it won't work, could be handy to expand the behavior
-#      or define something liike `local_eval_func`
-def eval_func(ast: PLPType) -> EVAL_RETURN_TYPE:
-  return EVAL(ast, global_environment)
-global_environment.set(plp.Symbol("eval"), eval_func)
-
-def rep(arg: str) -> PLPType:
-  return EVAL(reader.read_raw_string(arg), global_environment)
-
-rep("(define not (fn (a) (if a false true)))")
-rep(f"""(define load-file (fn (f) (eval (read-string (str "(do " (slurp f) "\nnil)")))))""")
-rep("(define time-ms (fn () (floor (/ (time) 1e6))))")
-rep(f"""(define length (fn (string) (count (split "" string))))""")
-rep("(define ** (fn (a b) (if (= b 1) a (if (= b 0) 1 (* a (** a (- b 1)))))))")
-rep("(define // (fn (a b) (floor (/ a b))))")
\ No newline at end of file
+# "tree" walks the AST on every evaluation, "closure" compiles each form into python closures first
+# and "vm" compiles it into bytecode for a stack based virtual machine
+# (modules of the engines, "closure" and "vm" are imported only once they are used so they don't slow down the startup)
+ENGINES: dict[str, str] = {
+  "tree": "lib.eval",
+  "closure": "lib.compiler",
+  "vm": "lib.vm",
+}
+
+def evaluator(engine: str) -> Callable[[PLPType, Env], EVAL_RETURN_TYPE]:
+  if engine == "tree":
+    return EVAL
+  return importlib.import_module(ENGINES[engine]).evaluate
+
+def check_engine(engine: str) -> str:
+  if engine not in ENGINES:
+    raise ValueError(f"unknown engine '{engine}' (available: {', '.join(ENGINES)})")
+  return engine
+
+def read_forms(file_name: str) -> Iterator[PLPType]:
+  """
+    yields top-level forms of a file one by one, the file is read only as far as the forms that were taken
+
+    forms of files that didn't change since they were last read come from their cache (see `lib/ast_cache.py`)
+  """
+  yield from ast_cache.read_file_forms(create_relative_path_for_file(file_name))
+
+def read_file(file_name: str) -> PLPType:
+  return plp.List([plp.Symbol("do"), *read_forms(file_name), plp.NIL])
+
+def load_bytecode(file_name: str, use_cache: bool = True) -> list["bytecode.Code"]:
+  """
+    returns compiled top-level forms of a file, reusing its `.plpc` file if it was compiled from the same version of the source
+  """
+  import lib.bytecode as bytecode
+  file_path = create_relative_path_for_file(file_name)
+  stat = os.stat(file_path)
+  stamp = (stat.st_mtime_ns, stat.st_size)
+  cache_path = bytecode.cache_path_for_file(file_path)
+  if use_cache and os.path.isfile(cache_path):
+    with open(cache_path, "rb") as file:
+      codes = bytecode.loads(file.read(), stamp)
+    if codes is not None:
+      return codes
+
+  codes = [bytecode.compile_ast(form) for form in read_forms(file_name)]
+  if use_cache:
+    try:
+      os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+      # written under another name first, so a run reading the file at the same time never sees half of it
+      temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+      with open(temporary_path, "wb") as file:
+        file.write(bytecode.dumps(codes, stamp))
+      os.replace(temporary_path, cache_path)
+    except OSError:
+      pass # the cache is only an optimization, e.g. the directory might be read-only
+  return codes
+
+class Interpreter:
+  """
+    global environment (builtins and everything defined in it) together with the settings evaluating in it,
+    nothing an interpreter defines is seen by any other one
+
+    - `engine`: the engine evaluating forms (one of `ENGINES`)
+    - `bytecode_cache`: whether `load-file` with the "vm" engine stores compiled files as `.plpc` in `__plpcache__` and reuses them
+
+    `clone` copies an interpreter that already loaded what it needs (e.g. a library of definitions) in a fraction of the time
+    it took to load it, so many scripts can each run in their own copy of the same warm environment
+  """
+  def __init__(self, engine: str = "tree", bytecode_cache: bool = True):
+    self.engine = check_engine(engine)
+    self.bytecode_cache = bytecode_cache
+    self.builtins: dict[str, FunctionType] = {}
+    self.global_env = GlobalEnv()
+    for symbol, value in core.ns.items():
+      self.global_env.set(plp.Symbol(symbol), value)
+    self.bind_builtins()
+
+  def bind_builtins(self) -> None:
+    """
+      binds builtins working with the interpreter itself, every interpreter (and every clone) has its own
+    """
+    # closures rather than bound methods, engines call builtins directly only when they are plain python functions
+    # BUG? `eval` takes the global envinronment
+    #      but if i want to use eval within some other env
+    #      it won't work, could be handy to expand the behavior
+    #      or define something liike `local_eval_func`
+    def eval_func(ast: PLPType) -> EVAL_RETURN_TYPE:
+      return self.evaluate(ast)
+    def load_file(file_name: plp.String) -> plp.Null:
+      return self.load_file(file_name)
+    def runtime_stats() -> plp.HashMap:
+      return self.runtime_stats()
+    self.builtins = {"eval": eval_func, "load-file": load_file, "runtime-stats": runtime_stats}
+    for name, function in self.builtins.items():
+      self.global_env.set(plp.Symbol(name), function)
+
+  def clone(self) -> "Interpreter":
+    """
+      returns a new interpreter with the same settings and definitions without evaluating any of them again
+
+      values that can reach this interpreter's global environment (lambdas, the environments and frames they close over,
+      memoized functions, collections holding them, ...) are copied so they reach the clone's one instead (see `lib/clone.py`),
+      the rest is immutable and shared, a value that can't be copied raises `clone.Uncopyable` (a `TypeError`)
+    """
+    clone_interpreter = Interpreter.__new__(Interpreter)
+    clone_interpreter.engine = self.engine
+    clone_interpreter.bytecode_cache = self.bytecode_cache
+    clone_interpreter.global_env = GlobalEnv()
+    clone_interpreter.bind_builtins()
+    builtins = {self.builtins[name]: clone_interpreter.builtins[name] for name in self.builtins}
+    clone_interpreter.global_env.data.update(clone.copy_values(self.global_env, clone_interpreter.global_env, builtins))
+    clone_interpreter.global_env.local_names.update(self.global_env.local_names)
+    clone_interpreter.global_env.version = next(VERSIONS)
+    return clone_interpreter
+
+  def evaluate(self, ast: PLPType) -> EVAL_RETURN_TYPE:
+    return evaluator(self.engine)(plp.to_ast(ast), self.global_env)
+
+  def load_file(self, file_name: plp.String) -> plp.Null:
+    """
+      evaluates all expressions of a file (relative to the main script) in the global environment
+
+      each expression is evaluated right after it's read, so the whole file (or its AST) is never held in memory at once
+    """
+    if self.engine == "vm":
+      import lib.vm as vm
+      for code in load_bytecode(file_name, self.bytecode_cache):
+        vm.execute(code, None, self.global_env)
+    else:
+      for form in read_forms(file_name):
+        self.evaluate(form)
+    return plp.NIL
+
+  def runtime_stats(self) -> plp.HashMap:
+    """
+      returns counters of the evaluator (see `lib/instrument.py`) and of the inline caches of `EVAL`
+
+      the counters are filled only while counting is on (`main.py --runtime-stats`, `instrument.enable` or counters given to `rep`)
+
+      @examples
+      - `(get :forms (runtime-stats))` -> `0` (when not counting)
+    """
+    return (instrument.counting or instrument.counters).stats(self.global_env)
+
+  def evaluate_form(self, ast: PLPType, engine: Optional[str] = None) -> PLPType:
+    engine = engine if engine is not None else self.engine
+    return evaluator(engine)(ast, self.global_env)
+
+  def rep(self, arg: str, engine: Optional[str] = None, hooks: Optional[list[instrument.Hooks | instrument.Counters]] = None) -> PLPType:
+    """
+      reads and evaluates one form, `hooks` (and counters given among them) are installed only while it's evaluated
+    """
+    if hooks:
+      with instrument.installed(self.global_env, hooks):
+        return self.evaluate_form(reader.read_raw_string(arg), engine)
+    return self.evaluate_form(reader.read_raw_string(arg), engine)
+
+# the interpreter of `main.py` and `test.py`, functions below evaluate in it
+interpreter = Interpreter()
+global_environment = interpreter.global_env
+
+def set_default_engine(engine: str) -> None:
+  interpreter.engine = check_engine(engine)
+
+def runtime_stats() -> plp.HashMap:
+  return interpreter.runtime_stats()
+
+def evaluate_form(ast: PLPType, engine: Optional[str] = None) -> PLPType:
+  return interpreter.evaluate_form(ast, engine)
+
+def rep(arg: str, engine: Optional[str] = None, hooks: Optional[list[instrument.Hooks | instrument.Counters]] = None) -> PLPType:
+  return interpreter.rep(arg, engine, hooks)
@@ -0,0 +1,73 @@
+"""
+  converts PLP values (ASTs and constants) into nested tuples of python builtins that `marshal` can store and back
+
+  every value becomes `(tag, payload)`, functions and lambdas can't be serialized
+"""
+
+from .plp_types import PLPType
+from typing import Any
+import lib.plp_types as plp
+
+INTEGER = 0
+FLOAT = 1
+STRING = 2
+SYMBOL = 3
+KEYWORD = 4
+BOOLEAN = 5
+NULL = 6
+LIST = 7
+VECTOR = 8
+HASHMAP = 9
+
+def encode(value: PLPType) -> tuple[int, Any]:
+  match value:
+    case plp.Integer():
+      return (INTEGER, value)
+    case plp.Float():
+      return (FLOAT, value)
+    # keyword and symbol need to be matched before string, all of them are `str`
+    case plp.Keyword():
+      return (KEYWORD, str(value))
+    case plp.Symbol():
+      return (SYMBOL, str(value))
+    case plp.String():
+      return (STRING, str(value))
+    case plp.Boolean():
+      return (BOOLEAN, value.boo)
+    case plp.Null():
+      return (NULL, None)
+    case plp.List() | plp.PersistentList() | plp.ListView() | plp.LazySeq():
+      return (LIST, tuple(encode(a) for a in value))
+    case plp.Vector():
+      return (VECTOR, tuple(encode(a) for a in value))
+    case plp.HashMap():
+      return (HASHMAP, tuple((encode(key), encode(item)) for key, item in value.items()))
+    case _:
+      raise ValueError(f"can't serialize value of type '{type(value).__name__}'")
+
+def decode(encoded: tuple[int, Any]) -> PLPType:
+  tag, payload = encoded
+  if tag == INTEGER:
+    return payload
+  elif tag == FLOAT:
+    return payload
+  elif tag == STRING:
+    return plp.String(payload)
+  elif tag == SYMBOL:
+    return plp.Symbol(payload)
+  elif tag == KEYWORD:
+    return plp.Keyword(payload)
+  elif tag == BOOLEAN:
+    return plp.Boolean(payload)
+  elif tag == NULL:
+    return plp.NIL
+  elif tag == LIST:
+    return plp.List([decode(a) for a in payload])
+  elif tag == VECTOR:
+    return plp.Vector([decode(a) for a in payload])
+  elif tag == HASHMAP:
+    items: list[PLPType] = []
+    for key, item in payload:
+      items.extend((decode(key), decode(item)))
+    return plp.HashMap(items)
+  raise ValueError(f"unknown serialized tag '{tag}'")
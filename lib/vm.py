@@ -0,0 +1,236 @@
+"""
+  stack based virtual machine running code compiled by `lib/bytecode.py`
+
+  calls between VM lambdas don't recurse in python, the caller's activation is saved on an explicit call stack
+  and restored on `RETURN`, tail calls replace the current activation instead
+"""
+
+from lib.bytecode import Code
+from lib.env import Env, Frame, FrameEnv, UNSET, Unset
+from lib.eval import EVAL, EVAL_RETURN_TYPE, TailCall
+from lib.plp_types import PLPType
+from types import FunctionType
+from typing import Optional
+import builtins
+import lib.benchmark as benchmark
+import lib.bytecode as bytecode
+import lib.exceptions as exceptions
+import lib.plp_types as plp
+import lib.profiler as profiler
+
+class VMLambda(plp.Lambda):
+  """
+    lambda compiled into bytecode
+
+    it still carries its `ast` and `get_env` so `EVAL` and other engines can call it as any other lambda
+  """
+  def __init__(self, code: Code, outer: Optional[Frame], global_env: Env):
+    super().__init__(code.ast, self.get_frame_env, self.call)
+    self.code = code
+    self.outer = outer
+    self.global_env = global_env
+    self.arity = code.arity
+    self.padding: list[PLPType | Unset] = [UNSET] * code.arity
+    self.locals: list[PLPType | Unset] = [UNSET] * (len(code.scopes[0]) - code.arity)
+
+  def frame(self, args: list[PLPType | Unset]) -> Frame:
+    """
+      builds the frame of a call, the list of arguments is reused as its storage
+    """
+    if len(args) != self.arity:
+      args = (args + self.padding)[:self.arity]
+    if self.locals:
+      args.extend(self.locals)
+    return Frame(args, self.outer)
+
+  def get_frame_env(self, args: list[PLPType]) -> Env:
+    return FrameEnv(self.frame(args), self.code.scope(), self.global_env) # type: ignore
+
+  def call(self, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+    return execute(self.code, self.frame(args), self.global_env) # type: ignore
+
+  def step(self, args: list[PLPType]) -> EVAL_RETURN_TYPE:
+    return execute(self.code, self.frame(args), self.global_env, True) # type: ignore
+
+def evaluate(ast: PLPType, env: Env) -> EVAL_RETURN_TYPE:
+  """
+    compiles and runs a top-level form, `env` is the global environment
+  """
+  return execute(bytecode.compile_ast(ast), None, env)
+
+def lookup(frame: Frame, coordinates: tuple[tuple[int, int], ...]) -> PLPType | Unset:
+  for depth, index in coordinates:
+    outer = frame
+    for _ in range(depth):
+      outer = outer.outer # type: ignore
+    value = outer.values[index]
+    if value is not UNSET:
+      return value
+  return UNSET
+
+def global_value(data: dict, symbol: plp.Symbol) -> EVAL_RETURN_TYPE:
+  value = data.get(symbol)
+  if value is None:
+    raise exceptions.UndefinedSymbolError(symbol)
+  return value
+
+def execute(code: Code, frame: Optional[Frame], global_env: Env, tail: bool = False) -> EVAL_RETURN_TYPE:
+  """
+    the interpreter loop, runs `code` in `frame` until its outermost activation returns
+
+    with `tail` set (see `VMLambda.step`) a tail call of the outermost activation to a lambda that isn't a `VMLambda` is returned as `TailCall`
+  """
+  data = global_env.data
+  instructions = code.instructions
+  constants = code.constants
+  pc = 0
+  stack: list = []
+  # saved activations of the callers: (code, pc, stack, frame)
+  calls: list[tuple[Code, int, list, Optional[Frame]]] = []
+
+  while True:
+    opcode = instructions[pc]
+
+    if opcode == 1: # LOAD_FAST
+      value = frame.values[instructions[pc + 1]] # type: ignore
+      if value is UNSET:
+        value = global_value(data, code.names[instructions[pc + 2]])
+      stack.append(value)
+      pc += 3
+    elif opcode == 3: # LOAD_GLOBAL
+      stack.append(global_value(data, code.names[instructions[pc + 1]]))
+      pc += 2
+    elif opcode == 0: # CONST
+      stack.append(constants[instructions[pc + 1]])
+      pc += 2
+    elif opcode == 8: # JUMP_IF_FALSE
+      condition = stack.pop()
+      if condition is plp.NIL or condition is plp.FALSE:
+        pc = instructions[pc + 1]
+      else:
+        pc += 2
+    elif opcode == 9 or opcode == 10: # CALL, TAIL_CALL
+      argc = instructions[pc + 1]
+      if argc:
+        args = stack[-argc:]
+        del stack[-argc:]
+      else:
+        args = []
+      function = stack.pop()
+      if type(function) is FunctionType:
+        stack.append(function(*args))
+        pc += 3
+      elif type(function) is VMLambda:
+        if opcode == 9:
+          calls.append((code, pc + 3, stack, frame))
+        code = function.code
+        instructions = code.instructions
+        constants = code.constants
+        frame = function.frame(args)
+        stack = []
+        pc = 0
+      elif isinstance(function, plp.Lambda):
+        if opcode == 10 and tail and not calls:
+          return TailCall(function, args)
+        if function.invoke is not None:
+          stack.append(function.invoke(args))
+        else:
+          stack.append(EVAL(function.ast, function.get_env(args)))
+        pc += 3
+      else:
+        operator = code.constants[instructions[pc + 2]]
+        raise SyntaxError(f"'{operator}' is not a function; can't apply '{operator}' on given arguments")
+    elif opcode == 11: # RETURN
+      value = stack.pop()
+      if not calls:
+        return value
+      code, pc, stack, frame = calls.pop()
+      instructions = code.instructions
+      constants = code.constants
+      stack.append(value)
+    elif opcode == 7: # JUMP
+      pc = instructions[pc + 1]
+    elif opcode == 6: # POP
+      stack.pop()
+      pc += 1
+    elif opcode == 2: # LOAD_LOCAL
+      symbol, coordinates = code.refs[instructions[pc + 1]]
+      value = lookup(frame, coordinates) # type: ignore
+      if value is UNSET:
+        value = global_value(data, symbol)
+      stack.append(value)
+      pc += 2
+    elif opcode == 4: # STORE_LOCAL
+      frame.values[instructions[pc + 1]] = stack[-1] # type: ignore
+      pc += 2
+    elif opcode == 5: # STORE_GLOBAL
+      global_env.set(code.names[instructions[pc + 1]], stack[-1])
+      pc += 2
+    elif opcode == 12: # MAKE_LAMBDA
+      stack.append(VMLambda(code.codes[instructions[pc + 1]], frame, global_env))
+      pc += 2
+    elif opcode == 15: # ENTER_FRAME
+      frame = Frame([UNSET] * instructions[pc + 1], frame)
+      pc += 2
+    elif opcode == 16: # LEAVE_FRAME
+      frame = frame.outer # type: ignore
+      pc += 1
+    elif opcode == 17: # WRITE_BACK
+      on_top_level, pairs = code.write_backs[instructions[pc + 1]]
+      values = frame.values # type: ignore
+      if on_top_level:
+        for i, name_index in pairs:
+          key = code.names[name_index]
+          if values[i] is not UNSET and key in data:
+            global_env.set(key, values[i]) # type: ignore
+      else:
+        outer_values = frame.outer.values # type: ignore
+        for i, outer_i in pairs:
+          if values[i] is not UNSET and outer_values[outer_i] is not UNSET:
+            outer_values[outer_i] = values[i]
+      pc += 2
+    elif opcode == 13: # BUILD_VECTOR
+      count = instructions[pc + 1]
+      items = stack[len(stack) - count:]
+      del stack[len(stack) - count:]
+      stack.append(plp.Vector(items))
+      pc += 2
+    elif opcode == 14: # BUILD_HASHMAP
+      count = instructions[pc + 1] * 2
+      items = stack[len(stack) - count:]
+      del stack[len(stack) - count:]
+      stack.append(plp.HashMap(items))
+      pc += 2
+    elif opcode == 19: # JUMP_IF_FALSE_OR_POP
+      condition = stack[-1]
+      if condition is plp.NIL or condition is plp.FALSE:
+        pc = instructions[pc + 1]
+      else:
+        stack.pop()
+        pc += 2
+    elif opcode == 20: # JUMP_IF_TRUE_OR_POP
+      condition = stack[-1]
+      if condition is plp.NIL or condition is plp.FALSE:
+        stack.pop()
+        pc += 2
+      else:
+        pc = instructions[pc + 1]
+    elif opcode == 21: # PROFILE
+      block = code.codes[instructions[pc + 1]]
+      json_path = stack.pop()
+      block_frame = frame
+      stack.append(profiler.profile(global_env, lambda: execute(block, block_frame, global_env), json_path)) # type: ignore
+      pc += 2
+    elif opcode == 22: # BENCH
+      block = code.codes[instructions[pc + 1]]
+      allocations = stack.pop()
+      warmup = stack.pop()
+      iterations = stack.pop()
+      block_frame = frame
+      stack.append(benchmark.bench(lambda: execute(block, block_frame, global_env), iterations, warmup, allocations))
+      pc += 2
+    elif opcode == 18: # FAIL
+      name, message = constants[instructions[pc + 1]] # type: ignore
+      raise getattr(builtins, name)(message)
+    else:
+      raise RuntimeError(f"unknown opcode {opcode}")
@@ -1,16 +1,138 @@
 from lib.helper import create_relative_path_for_file
 from lib.rep import rep
-import atexit
+from typing import Iterator, Optional
+import lib.ast_cache as ast_cache
+import lib.rep as rep_module
 import lib.exceptions as exceptions
 import os
 import lib.printer as printer
-import readline
+import lib.instrument as instrument
+import lib.profiler as profiler
+import lib.reader as reader
 import sys
 
+# set by `--disassemble`, files are then only compiled and their bytecode printed
+disassemble = False
+# set by `--clear-ast-cache`, without any files given the program ends right after clearing it
+clear_ast_cache = False
+# set by `--profile` and `--profile-json`, files are then run under the profiler and its report is printed (or written as JSON) at the end
+profile = False
+profile_json: Optional[str] = None
+# set by `--sample` and `--sample-rate`, files are then run under the sampling profiler writing collapsed stacks to `sample` ("-" prints them)
+sample: Optional[str] = None
+sample_rate = 1000.0
+# set by `--runtime-stats`, counters of the evaluator are then filled while files run and printed at the end
+runtime_stats = False
+
+PROMPT = "plp> "
+CONTINUATION_PROMPT = "...  "
+# prompt of the next line the REPL asks for, it's the continuation one while a form is unfinished
+prompt = PROMPT
+# set once the input of the REPL ends
+input_closed = False
+
+def input_lines() -> Iterator[str]:
+  """
+    lines typed into the REPL, asked for only once the reader needs more input, they end with EOF (ctrl+d)
+  """
+  global prompt, input_closed
+  while True:
+    try:
+      line = input(prompt)
+    except EOFError:
+      input_closed = True
+      return
+    if line.strip() and not line.strip().startswith(";"):
+      prompt = CONTINUATION_PROMPT
+    yield line + "\n"
+
+def parse_options(argv: list[str]) -> list[str]:
+  """
+    applies command line options and returns the remaining arguments (paths to files)
+
+    - `--engine NAME`: evaluates with the given engine (`tree`, `closure` or `vm`)
+    - `--no-plpc`: the `vm` engine neither reads nor writes compiled `.plpc` files
+    - `--no-ast-cache`: files and long strings are always parsed, `__plpcache__` directories are neither read nor written
+    - `--clear-ast-cache`: removes all `__plpcache__` directories first
+    - `--disassemble`: prints bytecode of given files instead of running them
+    - `--profile`: runs given files under the profiler and prints calls and times of every function at the end
+    - `--profile-json PATH`: same as `--profile` but the report is written to a JSON file
+    - `--sample PATH`: runs given files under the sampling profiler and writes the sampled stacks for flame graphs to a file (`-` prints them)
+    - `--sample-rate HZ`: how many times a second the sampling profiler looks at the stack (1000 by default)
+    - `--runtime-stats`: counts evaluated forms, calls, frames and errors while given files run and prints the counts at the end
+  """
+  global disassemble, clear_ast_cache, profile, profile_json, sample, sample_rate, runtime_stats
+  arguments: list[str] = []
+  i = 0
+  while i < len(argv):
+    if argv[i] == "--no-plpc":
+      rep_module.interpreter.bytecode_cache = False
+      i += 1
+      continue
+    if argv[i] == "--no-ast-cache":
+      ast_cache.enabled = False
+      i += 1
+      continue
+    if argv[i] == "--clear-ast-cache":
+      clear_ast_cache = True
+      i += 1
+      continue
+    if argv[i] == "--disassemble":
+      disassemble = True
+      i += 1
+      continue
+    if argv[i] == "--profile":
+      profile = True
+      i += 1
+      continue
+    if argv[i] == "--profile-json" and i + 1 < len(argv):
+      profile = True
+      profile_json = argv[i + 1]
+      i += 2
+      continue
+    if argv[i] == "--runtime-stats":
+      runtime_stats = True
+      i += 1
+      continue
+    if argv[i] == "--sample" and i + 1 < len(argv):
+      sample = argv[i + 1]
+      i += 2
+      continue
+    if argv[i] == "--sample-rate" and i + 1 < len(argv):
+      try:
+        sample_rate = float(argv[i + 1])
+        if sample_rate <= 0:
+          raise ValueError(f"it has to be positive (got {argv[i + 1]})")
+      except ValueError as e:
+        print("\033[91m", f"[invalid sampling rate]: {e}", "\033[0m", sep="")
+        sys.exit(1)
+      i += 2
+      continue
+    if argv[i] == "--engine" and i + 1 < len(argv):
+      try:
+        rep_module.set_default_engine(argv[i + 1])
+      except ValueError as e:
+        print("\033[91m", f"[invalid engine]: {e}", "\033[0m", sep="")
+        sys.exit(1)
+      i += 2
+      continue
+    arguments.append(argv[i])
+    i += 1
+  if profile and sample is not None:
+    # only one profiler can run at a time
+    print("\033[91m", "[invalid option]: the profiler ('--profile', '--profile-json') and the sampling profiler ('--sample') can't run together", "\033[0m", sep="")
+    sys.exit(1)
+  return arguments
+
 def main() -> None:
-  if len(sys.argv) > 1:
+  arguments = parse_options(sys.argv[1:])
+  if clear_ast_cache:
+    ast_cache.clear()
+    if not arguments:
+      sys.exit(0)
+  if arguments:
     non_existent_files: list[str] = []
-    for file_path in sys.argv[1:]:
+    for file_path in arguments:
       if not os.path.isfile(create_relative_path_for_file(file_path)):
         non_existent_files.append(file_path)
     if non_existent_files:
@@ -23,15 +145,46 @@ def main() -> None:
       )
       sys.exit(1)
 
-    file_paths = map(lambda x: create_relative_path_for_file(x), sys.argv[1:])
-    for file_path in file_paths:
-      try:
-        rep(f"""(load-file "{file_path}")""")
-      except Exception as e:
-        exceptions.handle_exception(e)
-        sys.exit(1)
+    if disassemble:
+      import lib.bytecode as bytecode
+      for file_path in arguments:
+        print(f"; {file_path}")
+        print(bytecode.disassemble(bytecode.compile_ast(rep_module.read_file(file_path))))
+      sys.exit(0)
+
+    session: Optional[profiler.Session] = None
+    output: Optional[str] = None
+    if profile:
+      session, output = profiler.Profiler(rep_module.global_environment), profile_json
+    elif sample is not None:
+      root = " ".join(os.path.basename(file_path) for file_path in arguments)
+      session, output = profiler.Sampler(rep_module.global_environment, sample_rate, root), (None if sample == "-" else sample)
+    if session is not None:
+      session.start()
+    if runtime_stats:
+      instrument.enable(rep_module.global_environment)
+    file_paths = map(lambda x: create_relative_path_for_file(x), arguments)
+    try:
+      for file_path in file_paths:
+        try:
+          rep(f"""(load-file "{file_path}")""")
+        except Exception as e:
+          exceptions.handle_exception(e)
+          sys.exit(1)
+    finally:
+      # the report is useful even when a file failed
+      if runtime_stats:
+        instrument.disable()
+        printer.print_ast(rep_module.runtime_stats())
+      if session is not None:
+        session.stop()
+        session.write(output)
     sys.exit(0)
     
+  # imported only for the REPL, running files doesn't need them
+  import atexit
+  import readline
+
   # register cmd history
   histfile = os.path.join(os.path.expanduser("~"), ".plp-history")
   try:
@@ -41,10 +194,16 @@ def main() -> None:
   readline.set_history_length(1000)
   atexit.register(readline.write_history_file, histfile)
   
-  while True:
+  # a form may span several lines, the reader keeps asking for lines until it's complete
+  global prompt
+  while not input_closed:
     try:
-      printer.print_ast(rep(input("plp> ")))
+      for form in reader.read_forms(input_lines()):
+        printer.print_ast(rep_module.evaluate_form(form))
+        prompt = PROMPT
     except Exception as e:
+      # the rest of the unfinished input is thrown away
+      prompt = PROMPT
       exceptions.handle_exception(e)
 
 if __name__ == "__main__":
@@ -1,4 +1,11 @@
 from lib.rep import rep
+from typing import Optional
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import lib.rep as rep_module
 import lib.printer as printer
 import os
 import sys
@@ -10,28 +17,117 @@ YELLOW = "\033[93m"
 BLUE = "\033[94m"
 
 TESTS_DIRECTORY = "tests"
+# results of test files remembered by `--changed`, a file runs again only once it or the sources of the interpreter change
+RESULTS_CACHE = ".plptest-cache.json"
 
-def test(expression: str) -> str:
-  return printer.format(rep(expression))
+def is_test_file(file_name: str) -> bool:
+  # `.plptest` files, and python modules with checks of the interpreter's python API (e.g. `Interpreter.clone`)
+  return file_name.endswith(".plptest") or (file_name.startswith("test_") and file_name.endswith(".py"))
 
-def run_tests_in_directory(show_failed: bool) -> None:
+# what a test file printed, numbers of passed and failed tests and details of the failed ones
+FileResult = tuple[str, int, int, list[tuple[str, str, str]]]
+
+def test(expression: str, interpreter: Optional[rep_module.Interpreter] = None) -> str:
+  if interpreter is None:
+    return printer.format(rep(expression))
+  return printer.format(interpreter.rep(expression))
+
+def run_isolated(file_name: str, engine: str) -> FileResult:
+  """
+    runs a test file in a new interpreter, so definitions of other files can't affect it, and returns what it printed with its results
+
+    with `--jobs` it runs in a worker process and the main process prints the output in the order of the files
+  """
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    if file_name.endswith(".py"):
+      passed_tests, failed_tests, failed_details = run_python_tests(file_name)
+    else:
+      passed_tests, failed_tests, failed_details = run_tests(file_name, rep_module.Interpreter(engine))
+  return output.getvalue(), passed_tests, failed_tests, failed_details
+
+def sources_hash() -> str:
+  """
+    hash of the sources of the interpreter, of this runner and of the data files in the tests' directory (e.g. read by `slurp`),
+    results of `--changed` are valid only as long as it stays the same
+
+    files outside of `lib` and the tests' directory aren't part of it, tests reading them (e.g. by `load-file`) aren't run again when they change
+  """
+  paths = [os.path.join("lib", name) for name in os.listdir("lib") if name.endswith(".py")] + [os.path.basename(__file__)]
+  for directory, directories, names in os.walk(TESTS_DIRECTORY):
+    if "__pycache__" in directories:
+      directories.remove("__pycache__")
+    paths.extend(os.path.join(directory, name) for name in names if not is_test_file(name))
+  digest = hashlib.sha256()
+  for path in sorted(paths):
+    with open(path, "rb") as file:
+      digest.update(path.encode() + b"\0" + file.read())
+  return digest.hexdigest()
+
+def file_key(file_name: str, sources: str, engine: str) -> str:
+  with open(os.path.join(TESTS_DIRECTORY, file_name), "rb") as file:
+    return hashlib.sha256(f"{sources} {engine} ".encode() + file.read()).hexdigest()
+
+def run_tests_in_directory(show_failed: bool, jobs: int = 1, changed: bool = False) -> None:
+  """
+    runs all test files, each in a new interpreter, `jobs` of them at once in separate processes
+
+    with `changed` files that didn't change since their results were cached (nor did the interpreter) aren't run again
+  """
   if not os.path.isdir(TESTS_DIRECTORY):
     print(RED, f"[path error]: tests' directory '{TESTS_DIRECTORY}' doesn't exist", RESET)
     return
 
-  test_files = [file for file in os.listdir(TESTS_DIRECTORY) if file.endswith(".plptest")]
+  # sorted, so the report is the same however many processes run the files
+  test_files = sorted(file for file in os.listdir(TESTS_DIRECTORY) if is_test_file(file))
+  engine = rep_module.interpreter.engine
+
+  cache: dict[str, dict] = {}
+  keys: dict[str, str] = {}
+  if changed:
+    sources = sources_hash()
+    keys = {test_file: file_key(test_file, sources, engine) for test_file in test_files}
+    if os.path.isfile(RESULTS_CACHE):
+      try:
+        with open(RESULTS_CACHE) as file:
+          cache = json.load(file)
+      except (OSError, ValueError):
+        cache = {}
+  to_run = [test_file for test_file in test_files if not changed or cache.get(test_file, {}).get("key") != keys[test_file]]
+
+  results: dict[str, FileResult] = {}
+  if jobs > 1 and len(to_run) > 1:
+    # imported here, only `--jobs` needs it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(jobs, len(to_run))) as executor:
+      results = dict(zip(to_run, executor.map(run_isolated, to_run, [engine] * len(to_run))))
   
   total_passed_tests: int = 0
   total_failed_tests: int = 0
   all_failed_tests: list[tuple[str, str, str]] = []
   
   for test_file in test_files:
-    print(f"\nRunning tests in {BLUE}{test_file}{RESET}...")
-    passed_tests, failed_tests, failed_details = run_tests(test_file)
+    if test_file in to_run:
+      print(f"\nRunning tests in {BLUE}{test_file}{RESET}...")
+      output, passed_tests, failed_tests, failed_details = results[test_file] if test_file in results else run_isolated(test_file, engine)
+      print(output, end="")
+      if changed:
+        cache[test_file] = {"key": keys[test_file], "passed": passed_tests, "failed": failed_tests, "details": failed_details}
+    else:
+      entry = cache[test_file]
+      passed_tests, failed_tests, failed_details = entry["passed"], entry["failed"], [tuple(d) for d in entry["details"]]
+      print(f"\nSkipping unchanged {BLUE}{test_file}{RESET}: {passed_tests} passed, {failed_tests} failed when it last ran.")
     total_passed_tests += passed_tests
     total_failed_tests += failed_tests
     all_failed_tests.extend(failed_details)
 
+  if changed:
+    try:
+      with open(RESULTS_CACHE, "w") as file:
+        json.dump(cache, file)
+    except OSError:
+      pass # the cache only saves time, the results were already printed
+
   if total_failed_tests == 0:
     print({GREEN}, f"\nAll tests passed! Total tests: {total_passed_tests}", {RESET})
   else:
@@ -41,7 +137,7 @@ def run_tests_in_directory(show_failed: bool) -> None:
       for code, result, expected in all_failed_tests:
         print(RED, f"Test failed for code: {code}\n  Output: {result}\n  Expected: {expected}\n", RESET)
 
-def run_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
+def run_tests(file_name: str, interpreter: Optional[rep_module.Interpreter] = None) -> tuple[int, int, list[tuple[str, str, str]]]:
   test_file_path = os.path.join(TESTS_DIRECTORY, file_name)
   if not os.path.isfile(test_file_path):
     print(RED, f"Test file {test_file_path} does not exist.", RESET)
@@ -70,7 +166,7 @@ def run_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
 
       if expected_output.startswith(";err!"):
         try:
-          test(code)
+          test(code, interpreter)
           failed_tests += 1
           failed_details.append((code, "no error raised", "expected error"))
           print(RED, f"[failed]  {code} -> no error raised (error expected)", RESET)
@@ -80,7 +176,7 @@ def run_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
       elif expected_output.startswith(";"):
         expected_output = expected_output[1:].strip()
         try:
-          result: str = str(test(code))
+          result: str = str(test(code, interpreter))
           if result == expected_output:
             passed_tests += 1
             print(GREEN, f"[passed]  {code} -> {result} (expected: {expected_output})", RESET)
@@ -94,7 +190,7 @@ def run_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
           print(RED, f"[unexpected error]  {code} -> {repr(e)}", RESET)
       else:
         try:
-          result: str = str(test(code))
+          result: str = str(test(code, interpreter))
           print(GREEN, f"[executed]  {code} -> {result}", RESET)
           i -= 1
         except Exception as e:
@@ -105,12 +201,68 @@ def run_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
   print(f"\nSummary for {BLUE}{test_file_path}{RESET}: {passed_tests} passed, {failed_tests} failed.")
   return passed_tests, failed_tests, failed_details
 
+def run_python_tests(file_name: str) -> tuple[int, int, list[tuple[str, str, str]]]:
+  """
+    runs every `test_*` function of a python test file in the order they're defined, a test passes when it doesn't raise
+
+    the functions take no arguments and check the interpreter with plain `assert`s, so pytest can run them too
+  """
+  test_file_path = os.path.join(TESTS_DIRECTORY, file_name)
+  if not os.path.isfile(test_file_path):
+    print(RED, f"Test file {test_file_path} does not exist.", RESET)
+    return 0, 0, []
+
+  spec = importlib.util.spec_from_file_location(file_name[:-3], test_file_path)
+  module = importlib.util.module_from_spec(spec) # type: ignore
+  spec.loader.exec_module(module) # type: ignore
+
+  passed_tests: int = 0
+  failed_tests: int = 0
+  failed_details: list[tuple[str, str, str]] = []
+  for name, function in vars(module).items():
+    if not name.startswith("test_") or not callable(function):
+      continue
+    try:
+      function()
+      passed_tests += 1
+      print(GREEN, f"[passed]  {name}", RESET)
+    except Exception as e:
+      failed_tests += 1
+      failed_details.append((name, repr(e), "no error raised"))
+      print(RED, f"[failed]  {name} -> {repr(e)}", RESET)
+
+  print(f"\nSummary for {BLUE}{test_file_path}{RESET}: {passed_tests} passed, {failed_tests} failed.")
+  return passed_tests, failed_tests, failed_details
+
 def main():
-  show_failed_tests = "--show-failed" in sys.argv
-  if len(sys.argv) > 1 and not show_failed_tests:
-    run_tests(sys.argv[1])
+  arguments = sys.argv[1:]
+  if "--engine" in arguments:
+    position = arguments.index("--engine")
+    rep_module.set_default_engine(arguments[position + 1])
+    del arguments[position:position + 2]
+  jobs = 1
+  if "--jobs" in arguments:
+    position = arguments.index("--jobs")
+    value = arguments[position + 1] if position + 1 < len(arguments) else ""
+    if not value.isdecimal() or int(value) < 1:
+      print(RED, f"[invalid option]: '--jobs' expects a positive number of processes (got '{value}')", RESET)
+      sys.exit(1)
+    jobs = int(value)
+    del arguments[position:position + 2]
+  changed = "--changed" in arguments
+  if changed:
+    arguments.remove("--changed")
+  show_failed_tests = "--show-failed" in arguments
+  if len(arguments) > 0 and not show_failed_tests:
+    if jobs != 1 or changed:
+      print(RED, "[invalid option]: '--jobs' and '--changed' work only when running all test files", RESET)
+      sys.exit(1)
+    if arguments[0].endswith(".py"):
+      run_python_tests(arguments[0])
+    else:
+      run_tests(arguments[0])
   else:
-    run_tests_in_directory(show_failed_tests)
+    run_tests_in_directory(show_failed_tests, jobs, changed)
 
 if __name__ == "__main__":
   main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+  checks of `.plpc` files written by `load-file` with the "vm" engine, run by `test.py` like the `.plptest` files
+"""
+
+from lib.rep import Interpreter
+import lib.ast_cache as ast_cache
+import lib.bytecode as bytecode
+import lib.plp_types as plp
+import os
+import tempfile
+
+def write_source(directory: str, name: str) -> str:
+  path = os.path.join(directory, name)
+  with open(path, "w") as file:
+    file.write("(define answer (+ 40 2))\n")
+  return path
+
+def test_plpc_is_stored_in_plpcache():
+  with tempfile.TemporaryDirectory() as directory:
+    # a name without the `.plp` suffix used to get its `.plpc` file next to it as `libraryc`
+    path = write_source(directory, "library")
+    interpreter = Interpreter("vm")
+    interpreter.load_file(plp.String(path))
+    assert interpreter.rep("answer") == 42
+    cache_path = bytecode.cache_path_for_file(path)
+    assert cache_path == os.path.join(directory, ast_cache.DIRECTORY_NAME, f"library.{bytecode.TAG}.plpc"), cache_path
+    assert os.path.isfile(cache_path)
+    assert sorted(os.listdir(directory)) == ["__plpcache__", "library"]
+
+    stat = os.stat(path)
+    with open(cache_path, "rb") as file:
+      assert bytecode.loads(file.read(), (stat.st_mtime_ns, stat.st_size)) is not None
+    interpreter = Interpreter("vm")
+    interpreter.load_file(plp.String(path))
+    assert interpreter.rep("answer") == 42
+
+def test_unwritable_cache_directory():
+  with tempfile.TemporaryDirectory() as directory:
+    path = write_source(directory, "library.plp")
+    # the cache directory can't be created (the same as for a read-only directory, which root could write to anyway)
+    open(os.path.join(directory, ast_cache.DIRECTORY_NAME), "w").close()
+    interpreter = Interpreter("vm")
+    interpreter.load_file(plp.String(path))
+    assert interpreter.rep("answer") == 42
+    assert sorted(os.listdir(directory)) == ["__plpcache__", "library.plp"]
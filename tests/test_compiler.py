@@ -0,0 +1,33 @@
+"""
+  checks of the closure engine (`lib/compiler.py`), run by `test.py` like the `.plptest` files
+"""
+
+from lib.rep import Interpreter
+import lib.compiler as compiler
+import sys
+
+# depth of recursion that isn't a tail call the closure engine has to reach, five times what the tree engine did originally
+NON_TAIL_DEPTH = 2500
+
+def test_non_tail_recursion_depth():
+  interpreter = Interpreter("closure")
+  interpreter.rep("(define mix (fn (n) (if (< n 1) 0 (+ 1 (mix (- n 1))))))")
+  assert interpreter.rep(f"(mix {NON_TAIL_DEPTH})") == NON_TAIL_DEPTH
+
+def test_non_tail_recursion_depth_with_slot_frames():
+  interpreter = Interpreter("closure")
+  # every level reads a parameter of its own frame, one of the enclosing frame and one of a `let*` frame
+  interpreter.rep("(define outer (fn (step) (let* (inner (fn (n) (if (< n 1) 0 (let* (k (inner (- n step))) (+ k step))))) inner)))")
+  interpreter.rep("(define deep (outer 1))")
+  assert interpreter.rep(f"(deep {NON_TAIL_DEPTH})") == NON_TAIL_DEPTH
+
+def test_tail_recursion_depth():
+  interpreter = Interpreter("closure")
+  interpreter.rep("(define lp (fn (n) (if (= n 0) :done (lp (- n 1)))))")
+  assert str(interpreter.rep("(lp 100000)")) == "done"
+
+def test_recursion_limit_is_restored():
+  limit = sys.getrecursionlimit()
+  assert limit < compiler.RECURSION_LIMIT, limit
+  Interpreter("closure").rep("(+ 1 2)")
+  assert sys.getrecursionlimit() == limit
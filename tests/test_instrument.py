@@ -0,0 +1,89 @@
+"""
+  checks of the counters of `lib/instrument.py`, run by `test.py` like the `.plptest` files
+"""
+
+from lib.rep import ENGINES, Interpreter
+import lib.instrument as instrument
+import lib.printer as printer
+import lib.reader as reader
+
+def counted(interpreter: Interpreter, code: str) -> str:
+  counters = instrument.Counters()
+  interpreter.rep(code, hooks=[counters])
+  return printer.format(counters.stats())
+
+def test_counts_of_an_exact_program():
+  interpreter = Interpreter("tree")
+  interpreter.rep("(define inc (fn (n) (+ n 1)))")
+  # `(inc 2)`, `inc`, `2`, `+`, `n` and `1` by recursing, the body of `inc` by continuing the loop,
+  # the tree engine can't tell tail calls from the other calls
+  assert counted(interpreter, "(inc 2)") == '{:forms 7 :lambda-calls 1 :frames 1 :exceptions 0 :builtin-calls {"+" 1}}'
+
+def test_counts_of_tail_calls():
+  expected = {
+    # the counters an engine can't count are left out
+    "tree": '{:forms 42 :lambda-calls 4 :frames 4 :exceptions 0 :builtin-calls {"-" 3 "=" 4}}',
+    "closure": '{:forms 42 :tail-calls 3 :lambda-calls 4 :frames 4 :exceptions 0 :builtin-calls {"-" 3 "=" 4}}',
+    "vm": '{:lambda-calls 4 :frames 4 :exceptions 0 :builtin-calls {"-" 3 "=" 4}}',
+  }
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep("(define loop (fn (n) (if (= n 0) :done (loop (- n 1)))))")
+    assert counted(interpreter, "(loop 3)") == expected[engine], engine
+
+def test_missing_entry_is_reported():
+  instrument.ENTRIES[("lib.eval", "no_such_function")] = "forms"
+  try:
+    counted(Interpreter("tree"), "(+ 1 2)")
+  except RuntimeError as e:
+    assert "lib.eval.no_such_function" in str(e), str(e)
+  else:
+    raise AssertionError("counting started without a function it counts")
+  finally:
+    del instrument.ENTRIES[("lib.eval", "no_such_function")]
+  # nothing was left half enabled
+  assert instrument.counting is None
+  assert counted(Interpreter("tree"), "(+ 1 2)").startswith("{:forms 4 ")
+
+def test_counts_dont_depend_on_the_jit():
+  # `f` is called 1973 times, the JIT compiles it after 100 calls when it isn't counted
+  fib = "(define f (fn (n) (if (< n 2) n (+ (f (- n 1)) (f (- n 2))))))"
+  expected = ':lambda-calls 1973 :frames 1973 :exceptions 0 :builtin-calls {"+" 986 "-" 1972 "<" 1973}}'
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep(fib)
+    counts = counted(interpreter, "(f 15)")
+    assert counts[counts.index(":lambda-calls"):] == expected, f"{engine}: {counts}"
+    # not counted, `f` gets compiled
+    assert interpreter.rep("(f 15)") == 610, engine
+    counts = counted(interpreter, "(f 15)")
+    assert counts[counts.index(":lambda-calls"):] == expected, f"{engine}: {counts}"
+
+def test_forms_are_counted_the_same_way():
+  program = """(let* (xs [1 2] f (fn (x) (cond (< x 0) :negative (= x 0) :zero)))
+    (do (define seen (map f xs)) (if (and (f 0) (or nil 1)) {:seen seen} (quote never))))"""
+  # the vm leaves forms out
+  for engine in ["tree", "closure"]:
+    counts = counted(Interpreter(engine), program)
+    assert counts.startswith("{:forms 51 "), f"{engine}: {counts}"
+
+def test_errors_are_counted_where_they_are_raised():
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep("(define broken (fn (n) (+ n :not-a-number)))")
+    counters = instrument.Counters()
+    instrument.enable(interpreter.global_env, counters)
+    try:
+      # evaluated right by the engine, not by `rep`, and caught here
+      for _ in range(2):
+        try:
+          interpreter.evaluate(reader.read_raw_string("(+ 1 (broken 2))"))
+        except TypeError:
+          pass
+      try:
+        interpreter.rep("(fn)")
+      except SyntaxError:
+        pass
+    finally:
+      instrument.disable()
+    assert counters.exceptions == 3, f"{engine}: {counters.exceptions}"
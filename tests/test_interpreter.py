@@ -0,0 +1,115 @@
+"""
+  checks of `Interpreter` (see `lib/rep.py`) on every engine, run by `test.py` like the `.plptest` files
+"""
+
+from lib.rep import ENGINES, Interpreter
+import lib.plp_types as plp
+import lib.printer as printer
+
+# definitions whose values reach the global environment in every way `Interpreter.clone` has to copy
+DEFINITIONS = [
+  "(define x 1)",
+  "(define top (fn () x))",
+  "(define in-let (let* (y 2) (fn () (+ x y))))",
+  "(define make-adder (fn (a) (fn () (+ a x))))",
+  "(define adder (make-adder 10))",
+  "(define countdown (let* (loop (fn (n) (if (= n 0) x (loop (- n 1))))) loop))",
+  "(define memoized (memoize (fn (n) (+ n x))))",
+  "(define in-vector [top in-let])",
+  "(memoized 1)",
+]
+
+def evaluate(interpreter: Interpreter, code: str) -> str:
+  return printer.format(interpreter.rep(code))
+
+def loaded(engine: str) -> Interpreter:
+  interpreter = Interpreter(engine)
+  for definition in DEFINITIONS:
+    interpreter.rep(definition)
+  return interpreter
+
+def test_clone_sees_its_own_globals():
+  for engine in ENGINES:
+    base = loaded(engine)
+    clone = base.clone()
+    clone.rep("(define x 100)")
+    for code, in_base, in_clone in [
+      ("(top)", "1", "100"),
+      ("(in-let)", "3", "102"),
+      ("(adder)", "11", "110"),
+      ("(countdown 3)", "1", "100"),
+      ("(memoized 1)", "2", "101"),
+      ("((nth 1 in-vector))", "3", "102"),
+      ("((make-adder 0))", "1", "100"),
+    ]:
+      assert evaluate(base, code) == in_base, f"{engine}: {code} in the original"
+      assert evaluate(clone, code) == in_clone, f"{engine}: {code} in the clone"
+
+def test_clone_definitions_dont_leak():
+  for engine in ENGINES:
+    base = loaded(engine)
+    clone = base.clone()
+    clone.rep("(define only-in-clone 1)")
+    base.rep("(define only-in-base 2)")
+    base.rep("(define top (fn () :redefined))")
+    assert evaluate(clone, "only-in-clone") == "1", engine
+    assert evaluate(base, "only-in-base") == "2", engine
+    for interpreter, code in [(base, "only-in-clone"), (clone, "only-in-base")]:
+      try:
+        interpreter.rep(code)
+      except Exception:
+        continue
+      raise AssertionError(f"{engine}: {code} leaked")
+    assert evaluate(clone, "(top)") == "1", engine
+    assert evaluate(clone, "((nth 0 in-vector))") == "1", engine
+
+def test_clone_has_its_own_memo_cache():
+  for engine in ENGINES:
+    base = loaded(engine)
+    clone = base.clone()
+    # the original cached `(memoized 1)` while loading, the clone starts empty
+    assert evaluate(clone, "(memoized 1)") == "2", engine
+    clone.rep("(define x 5)")
+    assert evaluate(clone, "(memoized 2)") == "7", engine
+    assert evaluate(base, "(memoized 2)") == "3", engine
+
+def test_clone_builtins_use_the_clone():
+  for engine in ENGINES:
+    base = loaded(engine)
+    clone = base.clone()
+    clone.rep("(define x 100)")
+    assert evaluate(clone, "(eval (quote x))") == "100", engine
+    assert evaluate(base, "(eval (quote x))") == "1", engine
+
+def test_clone_copies_lazy_sequences():
+  for engine in ENGINES:
+    base = loaded(engine)
+    # the lazy sequence holds a python closure of `map` holding the lambda
+    base.rep("(define lazy (map (fn (n) (+ n x)) (range 0 3)))")
+    clone = base.clone()
+    clone.rep("(define x 100)")
+    assert evaluate(clone, "lazy") == "(100 101 102)", engine
+    assert evaluate(base, "lazy") == "(1 2 3)", engine
+
+def test_clone_of_a_clone():
+  for engine in ENGINES:
+    base = loaded(engine)
+    clone = base.clone()
+    # nothing was called in the first clone before it's cloned again
+    second = clone.clone()
+    clone.rep("(define x 10)")
+    second.rep("(define x 20)")
+    for interpreter, x in [(second, 20), (clone, 10), (base, 1)]:
+      assert evaluate(interpreter, "(countdown 2)") == str(x), engine
+      assert evaluate(interpreter, "(memoized 1)") == str(x + 1), engine
+
+def test_value_that_cant_be_copied_is_reported():
+  for engine in ENGINES:
+    base = loaded(engine)
+    base.global_env.set(plp.Symbol("opaque"), object())
+    try:
+      base.clone()
+    except TypeError as e:
+      assert "'opaque'" in str(e), f"{engine}: {e}"
+    else:
+      raise AssertionError(f"{engine}: a value that can't be copied was shared")
@@ -0,0 +1,72 @@
+"""
+  checks of the profilers (see `lib/profiler.py`), run by `test.py` like the `.plptest` files
+"""
+
+from lib.rep import ENGINES, Interpreter
+import lib.printer as printer
+import lib.profiler as profiler
+import main
+
+# deeper than python's recursion limit allows when every call nests
+TAIL_DEPTH = 20000
+
+def test_profiled_tail_calls_dont_nest():
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep("(define lp (fn (n) (if (= n 0) :done (lp (- n 1)))))")
+    session = profiler.Profiler(interpreter.global_env)
+    session.start()
+    try:
+      assert printer.format(interpreter.rep(f"(lp {TAIL_DEPTH})")) == ":done", engine
+    finally:
+      session.stop()
+    entry = session.entries["lp"]
+    assert entry.calls == TAIL_DEPTH + 1, f"{engine}: {entry.calls}"
+    assert entry.depth == 0 and entry.total_time <= session.elapsed, engine
+
+def test_profiled_mutual_recursion():
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep("(define even (fn (n) (if (= n 0) true (odd (- n 1)))))")
+    # the anonymous lambda is part of `odd`, the call of `even` it ends with is a tail call too
+    interpreter.rep("(define odd (fn (n) (if (= n 0) false ((fn (m) (even m)) (- n 1)))))")
+    session = profiler.Profiler(interpreter.global_env)
+    session.start()
+    try:
+      assert printer.format(interpreter.rep(f"(even {TAIL_DEPTH})")) == "true", engine
+      # a non-tail call of a profiled lambda runs on a trampoline of its own
+      assert interpreter.rep("(+ 1 (if (odd 3) 1 0))") == 2, engine
+    finally:
+      session.stop()
+    calls = {name: session.entries[name].calls for name in ["even", "odd"]}
+    assert calls == {"even": TAIL_DEPTH // 2 + 3, "odd": TAIL_DEPTH // 2 + 2}, f"{engine}: {calls}"
+    # the original lambdas are back
+    assert not isinstance(interpreter.global_env.data["even"], profiler.ProfiledLambda), engine
+
+def test_sampled_tail_calls_dont_nest():
+  for engine in ENGINES:
+    interpreter = Interpreter(engine)
+    interpreter.rep("(define lp (fn (n) (if (= n 0) :done (lp (- n 1)))))")
+    minus = interpreter.global_env.data["-"]
+    session = profiler.Sampler(interpreter.global_env, rate=10000)
+    session.start()
+    try:
+      # builtins are left as they are
+      assert interpreter.global_env.data["-"] is minus, engine
+      assert printer.format(interpreter.rep(f"(lp {TAIL_DEPTH})")) == ":done", engine
+    finally:
+      session.stop()
+    assert session.stack == [], f"{engine}: {session.stack}"
+    # the sampling thread may not get to run at all on a fast machine, but what it saw is a running `lp` and the builtins it calls
+    for stack in session.samples:
+      assert stack in [(), ("lp",), ("lp", "="), ("lp", "-")], f"{engine}: {stack}"
+
+def test_profilers_dont_run_together():
+  try:
+    main.parse_options(["--profile", "--sample", "-", "script.plp"])
+  except SystemExit as e:
+    assert e.code == 1, e.code
+  else:
+    raise AssertionError("both profilers were accepted")
+  finally:
+    main.profile, main.sample = False, None